@@ -12,15 +12,16 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
-from django.conf.global_settings import EMAIL_HOST_USER
 from dotenv import load_dotenv
 
-load_dotenv(override=True)
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# явный путь: без поиска .env обходом стека и каталогов при каждом старте процесса
+load_dotenv(BASE_DIR / ".env", override=True)
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -53,23 +54,65 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "service.middleware.QueryBudgetMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
 
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
+# профилирование запросов на всех запросах; иначе только по заголовку X-Profile-Queries: 1 от staff
+QUERY_PROFILING = DEBUG or os.getenv("QUERY_PROFILING") == "True"
+# под тестами превышение бюджета роняет запрос
+QUERY_BUDGET_STRICT = TESTING
+# бюджеты вьюх по имени URL: queries — число запросов, db_ms — время БД, duplicates — повторы одного запроса
+QUERY_BUDGETS = {
+    "service:home": {"queries": 10, "duplicates": 2},
+    "service:recipient_list": {"queries": 8, "duplicates": 2},
+    "service:message_list": {"queries": 8, "duplicates": 2},
+    "service:mailing_list": {"queries": 10, "duplicates": 2},
+    "service:mailing_recipients": {"queries": 12, "duplicates": 3},
+    "service:attempts": {"queries": 10, "duplicates": 2},
+    "service:list_users": {"queries": 10, "duplicates": 2},
+    "service:mailing_analytics": {"queries": 15, "duplicates": 3},
+    "service:mailing_analytics_api": {"queries": 15, "duplicates": 3},
+    "service:mailing_progress": {"queries": 6, "duplicates": 1},
+    "service:mailing_progress_api": {"queries": 6, "duplicates": 1},
+    # пакетная запись в API: вставка и удаление идут пачками, каскады удаления — отдельными запросами
+    "service:api_recipients": {"queries": 15, "duplicates": 5},
+    "service:api_messages": {"queries": 15, "duplicates": 5},
+    "service:api_mailings": {"queries": 15, "duplicates": 5},
+    "service:api_attempts": {"queries": 6, "duplicates": 1},
+    "service:api_jobs": {"queries": 6, "duplicates": 1},
+    # на каждую массовую рассылку в пачке — свой запрос разбиения на шарды
+    "service:api_send": {"queries": 30, "duplicates": 20},
+    "service:track_open": {"queries": 3},
+    "service:unsubscribe": {"queries": 6, "duplicates": 1},
+}
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [],
-        "APP_DIRS": True,
         "OPTIONS": {
+            # скомпилированные шаблоны держатся в памяти процесса; в DEBUG Django сбрасывает их при изменении файлов
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "users.context_processors.roles",
             ],
         },
     },
@@ -132,10 +175,31 @@ STATIC_URL = "static/"
 
 STATICFILES_DIRS = [BASE_DIR / "static"]
 
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# деплой обязан запускать manage.py collectstatic: он пишет файлы с хешем содержимого в имени,
+# их сжатые .gz/.br варианты и манифест. Тестам манифест не нужен — там обычное хранилище
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+            if TESTING
+            else "config.staticfiles.CompressedManifestStaticFilesStorage"
+        )
+    },
+}
+
 MEDIA_URL = "/media/"
 
 MEDIA_ROOT = BASE_DIR / "media"
 
+# загрузки больше 256 КБ сразу пишутся во временный файл на диске
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# аватары и миниатюры лежат под хешем содержимого и не меняются
+AVATAR_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -150,20 +214,39 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# доставка писем рассылок: SMTPBackend, MemoryBackend, FileBackend или HttpApiBackend из service.backends
+MAILING_BACKEND = os.getenv("MAILING_BACKEND") or "service.backends.SMTPBackend"
+MAILING_FILE_SINK_PATH = BASE_DIR / "var" / "mailing.jsonl"
+MAILING_HTTP_API_URL = os.getenv("MAILING_HTTP_API_URL") or "http://127.0.0.1:8025/send"
+
+# лимиты отправки на владельца по умолчанию (None — без ограничений); переопределяются в админке
+MAILING_HOURLY_QUOTA = int(os.getenv("MAILING_HOURLY_QUOTA") or 0) or None
+MAILING_DAILY_QUOTA = int(os.getenv("MAILING_DAILY_QUOTA") or 0) or None
+
 AUTH_USER_MODEL = "users.User"
 
+AUTHENTICATION_BACKENDS = ["users.backends.CachedModelBackend"]
+
+# сессия читается из Redis, база — только при промахе кеша и при изменении сессии
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
 LOGIN_REDIRECT_URL = "service:home"
 
 LOGOUT_REDIRECT_URL = "service:home"
 
-LOGIN_URL = "login"
+LOGIN_URL = "users:login"
 
 CACHE_ENABLED = True
 
+REDIS_URL = os.getenv("REDIS_URL") or "redis://localhost:6379/1"
+
 if CACHE_ENABLED:
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-            'LOCATION': 'redis://localhost:6379/1',
+            'LOCATION': REDIS_URL,
         }
     }
+
+# адрес сайта для ссылок в письмах (отписка, пиксель открытия)
+SITE_URL = os.getenv("SITE_URL") or "http://localhost:8000"
@@ -0,0 +1,24 @@
+"""
+Облегчённые настройки для воркеров отправки и планировщиков.
+
+Загружаются только приложения, нужные движку рассылок: без админки (и её
+autodiscover), сессий, сообщений и статики. URLconf содержит лишь маршруты,
+на которые ссылаются письма, и не импортирует представления.
+"""
+
+from config.settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "service",
+    "users",
+]
+
+MIDDLEWARE = []
+
+ROOT_URLCONF = "config.urls_worker"
+
+TEMPLATES = []
+
+QUERY_PROFILING = False
@@ -0,0 +1,98 @@
+import gzip
+import logging
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.static import serve
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен: без него собираются только .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".map", ".svg", ".json", ".txt", ".xml", ".html")
+# имя после ManifestStaticFilesStorage: style.3f2a1b9c4d5e.css
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^/]+$")
+STATIC_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Хешированные имена плюс заранее сжатые .gz/.br рядом с каждым текстовым файлом."""
+
+    # файла нет в манифесте, но он есть в STATIC_ROOT: хеш считается по самому файлу
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and hashed_name and hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(hashed_name)
+            yield name, hashed_name, processed
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            # файла нет и в STATIC_ROOT (collectstatic не запускали): обычный адрес вместо падения страницы
+            logger.warning("Нет записи манифеста статики для %s, запустите collectstatic", name)
+            return FileSystemStorage.url(self, name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            content = original.read()
+        variants = [(".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(content)))
+        for suffix, compressed in variants:
+            # сжатие, которое не экономит, только лишний запрос на диск
+            if len(compressed) < len(content):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding с ненулевым q; «*» разрешает всё, что не запрещено явно."""
+    allowed, refused = set(), set()
+    for part in header.split(","):
+        encoding, _, params = part.strip().partition(";")
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        (allowed if quality > 0 else refused).add(encoding)
+    if "*" in allowed:
+        allowed |= {"br", "gzip"} - refused
+    return allowed
+
+
+def serve_static(request, path):
+    """Раздача собранной статики приложением: сжатый вариант по Accept-Encoding и вечный кеш для хешированных имён."""
+    accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+    root = settings.STATIC_ROOT
+    response = None
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in accepted and (root / (path + suffix)).is_file():
+            response = serve(request, path + suffix, document_root=root)
+            break
+    if response is None:
+        response = serve(request, path, document_root=root)
+
+    patch_vary_headers(response, ["Accept-Encoding"])
+    if HASHED_NAME.search(path):
+        patch_cache_control(response, public=True, max_age=STATIC_CACHE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=60 * 60)
+    return response
@@ -1,8 +1,22 @@
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from django.views.decorators.cache import cache_control
+from django.views.static import serve
+
+from config.staticfiles import serve_static
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("service.urls", namespace="service")),
     path("users/", include("users.urls", namespace="users")),
+    re_path(
+        r"^media/(?P<path>users/avatars/.*)$",
+        cache_control(public=True, max_age=settings.AVATAR_CACHE_MAX_AGE, immutable=True)(serve),
+        {"document_root": settings.MEDIA_ROOT},
+    ),
 ]
+
+if not settings.DEBUG:
+    # без отдельного веб-сервера статику раздаёт приложение; в DEBUG это делает runserver
+    urlpatterns += [re_path(r"^static/(?P<path>.*)$", serve_static)]
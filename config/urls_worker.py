@@ -0,0 +1,17 @@
+from django.http import Http404
+from django.urls import include, path
+
+
+def not_served(request, *args, **kwargs):
+    raise Http404
+
+
+# воркер только строит ссылки для писем; пути совпадают с service/urls.py
+service_patterns = [
+    path("t/o/<str:token>.gif", not_served, name="track_open"),
+    path("unsubscribe/<str:token>/", not_served, name="unsubscribe"),
+]
+
+urlpatterns = [
+    path("", include((service_patterns, "service"), namespace="service")),
+]
@@ -1,8 +1,154 @@
-from django.contrib import admin
+from collections import defaultdict
 
-from .models import Recipient, Message, Mailing, SendAttempt
+from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
 
-admin.site.register(Recipient)
-admin.site.register(Mailing)
-admin.site.register(SendAttempt)
-admin.site.register(Message)
+from .models import (
+    Contact,
+    Recipient,
+    Message,
+    Mailing,
+    SendAttempt,
+    SendJob,
+    SendingQuota,
+    ScheduledRetry,
+    Suppression,
+)
+from .forms import changed_model_fields
+from .paginators import ApproximateCountPaginator
+from .retries import schedule_retries
+from .versions import bump_data_version
+
+
+class OwnerDataAdmin(admin.ModelAdmin):
+    """Удаление из админки поднимает версию данных владельцев: сигналов на удаление нет."""
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_data_version(obj.owner_id)
+
+    def delete_queryset(self, request, queryset):
+        owner_ids = set(queryset.values_list("owner_id", flat=True))
+        super().delete_queryset(request, queryset)
+        bump_data_version(*owner_ids)
+
+
+@admin.register(Contact)
+class ContactAdmin(admin.ModelAdmin):
+    list_display = ("email", "verdict", "verified_at", "created_at")
+    list_filter = ("verdict",)
+    search_fields = ("email",)
+    show_full_result_count = False
+    paginator = ApproximateCountPaginator
+
+
+@admin.register(Recipient)
+class RecipientAdmin(OwnerDataAdmin):
+    list_display = ("email", "full_name", "owner")
+    list_select_related = ("contact", "owner")
+    search_fields = ("contact__email", "full_name")
+    raw_id_fields = ("contact", "owner")
+    show_full_result_count = False
+    paginator = ApproximateCountPaginator
+
+
+@admin.register(Message)
+class MessageAdmin(OwnerDataAdmin):
+    list_display = ("subject", "owner")
+    list_select_related = ("owner",)
+    search_fields = ("subject",)
+    raw_id_fields = ("owner",)
+
+
+@admin.register(Mailing)
+class MailingAdmin(OwnerDataAdmin):
+    list_display = ("id", "message", "status", "owner", "total_sent", "successful_sends", "failed_sends")
+    list_filter = ("status",)
+    list_select_related = ("message", "owner")
+    autocomplete_fields = ("message", "recipients")
+    raw_id_fields = ("owner",)
+    readonly_fields = ("total_sent", "successful_sends", "failed_sends")
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # счётчики в форме только для чтения, но полный save записал бы их значения на начало запроса
+        obj.save(update_fields=changed_model_fields(form))
+
+
+@admin.register(SendAttempt)
+class SendAttemptAdmin(admin.ModelAdmin):
+    list_display = ("attempt_time", "status", "mailing", "recipient", "owner")
+    list_filter = ("status",)
+    list_select_related = ("mailing__message", "recipient__contact", "owner")
+    raw_id_fields = ("mailing", "recipient", "owner", "message")
+    date_hierarchy = "attempt_time"
+    show_full_result_count = False
+    paginator = ApproximateCountPaginator
+    actions = ["resend_failed"]
+
+    @admin.action(description="Повторно отправить неуспешные попытки")
+    def resend_failed(self, request, queryset):
+        """Ставит неуспешные попытки в очередь повторов: отправляет воркер process_retries, а не запрос админки."""
+        pairs = (
+            queryset.filter(status="Не успешно", recipient__isnull=False)
+            .values_list("mailing_id", "recipient_id")
+            .distinct()
+        )
+        recipients_by_mailing = defaultdict(set)
+        for mailing_id, recipient_id in pairs:
+            recipients_by_mailing[mailing_id].add(recipient_id)
+
+        mailings = Mailing.objects.select_related("owner").in_bulk(recipients_by_mailing)
+        recipients = Recipient.objects.in_bulk({pk for ids in recipients_by_mailing.values() for pk in ids})
+        now = timezone.now()
+        with transaction.atomic():
+            for mailing_id, recipient_ids in recipients_by_mailing.items():
+                mailing = mailings[mailing_id]
+                schedule_retries(
+                    mailing,
+                    mailing.owner,
+                    [(recipients[pk], "Повтор из админки") for pk in recipient_ids],
+                    resume_at=now,
+                )
+
+        queued = sum(len(recipient_ids) for recipient_ids in recipients_by_mailing.values())
+        self.message_user(request, f"Поставлено в очередь повторной отправки: {queued}.", messages.SUCCESS)
+
+
+@admin.register(ScheduledRetry)
+class ScheduledRetryAdmin(admin.ModelAdmin):
+    list_display = ("next_attempt_at", "attempt_number", "mailing", "recipient")
+    list_select_related = ("mailing__message", "recipient__contact")
+    raw_id_fields = ("mailing", "recipient", "owner")
+    show_full_result_count = False
+    paginator = ApproximateCountPaginator
+
+
+@admin.register(SendJob)
+class SendJobAdmin(admin.ModelAdmin):
+    list_display = ("mailing", "owner", "lane", "status", "processed", "total", "not_before", "created_at")
+    list_filter = ("lane", "status")
+    list_select_related = ("mailing__message", "owner")
+    raw_id_fields = ("mailing", "owner")
+
+
+@admin.register(Suppression)
+class SuppressionAdmin(admin.ModelAdmin):
+    list_display = ("email", "owner", "reason", "created_at")
+    list_filter = ("reason",)
+    list_select_related = ("owner",)
+    search_fields = ("email",)
+    raw_id_fields = ("owner",)
+    show_full_result_count = False
+    paginator = ApproximateCountPaginator
+
+
+@admin.register(SendingQuota)
+class SendingQuotaAdmin(admin.ModelAdmin):
+    list_display = ("owner", "hourly_limit", "daily_limit")
+    list_select_related = ("owner",)
+    search_fields = ("owner__email",)
+    raw_id_fields = ("owner",)
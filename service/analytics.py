@@ -0,0 +1,155 @@
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Lower, StrIndex, Substr, TruncHour
+from django.utils import timezone
+
+from .models import (
+    SendAttempt,
+    HourlyMailingStats,
+    HourlyDomainStats,
+    HourlyErrorStats,
+    StatsWatermark,
+)
+
+WATERMARK_NAME = "send_attempts"
+# id выдаются при вставке, а видны строки после коммита: попытка с меньшим id может появиться
+# позже соседних. Свежие попытки не учитываются, пока не станут старше окна
+STATS_LAG = timedelta(seconds=getattr(settings, "MAILING_STATS_LAG", 120))
+
+_SMTP_CODE = re.compile(r"(?:^|\()([45]\d\d)\b")
+
+
+def classify_error(server_response):
+    """Сводит текст ошибки к короткому классу: SMTP-код или вид сетевой ошибки."""
+    match = _SMTP_CODE.search(server_response)
+    if match:
+        return match.group(1)
+
+    text = server_response.lower()
+    if "timed out" in text or "timeout" in text:
+        return "timeout"
+    if "connection" in text or "errno" in text:
+        return "connection"
+    if "auth" in text:
+        return "auth"
+    return "other"
+
+
+def email_domain(field):
+    return Lower(Substr(field, StrIndex(field, Value("@")) + 1))
+
+
+def _merge(model, key_fields, rows, counters):
+    """Прибавляет счётчики к существующим корзинам, недостающие создаёт."""
+    if not rows:
+        return
+
+    # выборка с запасом по mailing/hour, точное совпадение ключа — в словаре
+    candidates = model.objects.select_for_update().filter(
+        mailing_id__in={row["mailing_id"] for row in rows},
+        hour__in={row["hour"] for row in rows},
+    )
+    existing = {tuple(getattr(bucket, field) for field in key_fields): bucket for bucket in candidates}
+
+    to_create, to_update = [], []
+    for row in rows:
+        key = tuple(row[field] for field in key_fields)
+        bucket = existing.get(key)
+        if bucket is None:
+            to_create.append(model(**{field: row[field] for field in key_fields + counters}))
+            continue
+        for counter in counters:
+            setattr(bucket, counter, getattr(bucket, counter) + row[counter])
+        to_update.append(bucket)
+
+    model.objects.bulk_create(to_create)
+    model.objects.bulk_update(to_update, counters)
+
+
+def aggregate_attempts(batch_size=50_000):
+    """Раскладывает новые SendAttempt по часовым корзинам; возвращает число пройденных попыток.
+
+    В число входят и «Отложено»: в корзины они не попадают, но отметку сдвигают, и пачка
+    из одних отложенных не должна выглядеть для команды как пустой журнал.
+    """
+    with transaction.atomic():
+        watermark, _ = StatsWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+        pending = SendAttempt.objects.filter(id__gt=watermark.last_id)
+        # отметка не проходит первую попытку моложе окна, даже если за ней есть старые
+        fresh = pending.filter(attempt_time__gte=timezone.now() - STATS_LAG).aggregate(Min("id"))["id__min"]
+        if fresh is not None:
+            pending = pending.filter(id__lt=fresh)
+        new_ids = pending.order_by("id").values_list("id", flat=True)
+        upper = next(iter(new_ids[batch_size - 1 : batch_size]), None)
+        if upper is None:
+            upper = pending.aggregate(Max("id"))["id__max"]
+        if upper is None or upper <= watermark.last_id:
+            return 0
+
+        attempts = SendAttempt.objects.filter(id__gt=watermark.last_id, id__lte=upper).annotate(
+            hour=TruncHour("attempt_time")
+        )
+        successful = Count("id", filter=Q(status="Успешно"))
+        failed = Count("id", filter=Q(status="Не успешно"))
+
+        mailing_rows = list(
+            attempts.values("mailing_id", "hour")
+            .annotate(successful=successful, failed=failed, total=Count("id"))
+            .order_by()
+        )
+        domain_rows = list(
+            attempts.filter(recipient__isnull=False)
+            .annotate(domain=email_domain(F("recipient__contact__email")))
+            .values("mailing_id", "hour", "domain")
+            .annotate(successful=successful, failed=failed)
+            .order_by()
+        )
+
+        errors = Counter()
+        failures = attempts.filter(status="Не успешно").values_list("mailing_id", "hour", "server_response")
+        for mailing_id, hour, server_response in failures.iterator():
+            errors[mailing_id, hour, classify_error(server_response)] += 1
+        error_rows = [
+            {"mailing_id": mailing_id, "hour": hour, "error_class": error_class, "count": count}
+            for (mailing_id, hour, error_class), count in errors.items()
+        ]
+
+        _merge(HourlyMailingStats, ["mailing_id", "hour"], mailing_rows, ["successful", "failed"])
+        _merge(HourlyDomainStats, ["mailing_id", "hour", "domain"], domain_rows, ["successful", "failed"])
+        _merge(HourlyErrorStats, ["mailing_id", "hour", "error_class"], error_rows, ["count"])
+
+        processed = sum(row["total"] for row in mailing_rows)
+        watermark.last_id = upper
+        watermark.save(update_fields=["last_id", "updated_at"])
+    return processed
+
+
+def mailing_summary(mailing, top=10):
+    """Итоги по рассылке только из корзин, без обращения к журналу попыток."""
+    totals = mailing.hourly_stats.aggregate(successful=Sum("successful"), failed=Sum("failed"))
+    errors = list(
+        mailing.hourly_error_stats.values("error_class")
+        .annotate(count=Sum("count"))
+        .order_by("-count")[:top]
+    )
+    domains = list(
+        mailing.hourly_domain_stats.values("domain")
+        .annotate(successful=Sum("successful"), failed=Sum("failed"))
+        .order_by("-failed", "domain")[:top]
+    )
+    for domain in domains:
+        total = domain["successful"] + domain["failed"]
+        domain["failure_rate"] = round(domain["failed"] / total, 4) if total else 0.0
+
+    return {
+        "successful": totals["successful"] or 0,
+        "failed": totals["failed"] or 0,
+        "errors": errors,
+        "domains": domains,
+        "events": dict(mailing.event_stats.values_list("event", "count")),
+    }
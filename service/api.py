@@ -0,0 +1,447 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils import timezone
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import generic
+from django.views.decorators.csrf import csrf_exempt
+
+from users.models import ApiToken, token_digest
+from users.roles import has_perm, is_manager
+from .jobs import enqueue_mailings
+from .models import (
+    Contact,
+    IdempotencyKey,
+    Mailing,
+    Message,
+    Recipient,
+    SendAttempt,
+    SendJob,
+    normalize_email,
+)
+from .versions import bump_data_version
+
+PAGE_SIZE = 100
+# сколько записей клиент может забрать или прислать за один вызов
+MAX_PAGE_SIZE = getattr(settings, "API_MAX_PAGE_SIZE", 10_000)
+MAX_BATCH_SIZE = getattr(settings, "API_MAX_BATCH_SIZE", 10_000)
+MAX_TRIGGER_SIZE = getattr(settings, "API_MAX_TRIGGER_SIZE", 1000)
+# сколько ключ идемпотентности защищает от повторного запуска
+IDEMPOTENCY_TTL = timedelta(hours=getattr(settings, "API_IDEMPOTENCY_TTL_HOURS", 24))
+
+
+class ApiError(Exception):
+    def __init__(self, errors, status=400):
+        super().__init__(errors)
+        self.errors = errors
+        self.status = status
+
+
+def api_user(request):
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        token = ApiToken.objects.select_related("user").filter(key_hash=token_digest(header[7:].strip())).first()
+        if token is None or not token.user.is_active or token.user.is_blocked:
+            return None
+        return token.user
+    # сессия браузера — только для чтения: изменения без CSRF-токена принимаются лишь по ключу
+    if request.method in ("GET", "HEAD") and request.user.is_authenticated:
+        return request.user
+    return None
+
+
+def _sees_all_mailings(user):
+    return is_manager(user) or has_perm(user, "mailing.can_view_all_mailing_lists")
+
+
+def _clean_field(model, name, value):
+    try:
+        return model._meta.get_field(name).clean(value, None)
+    except ValidationError as e:
+        raise ApiError({name: e.messages})
+
+
+class Resource:
+    """Описание коллекции API: поля ответа как пути для values_list и правила записи."""
+
+    model = None
+    # имя в ответе -> путь в ORM
+    fields = {}
+    # параметры запроса, по которым можно фильтровать список
+    filters = {}
+    methods = ("get", "head")
+    required = ()
+    creatable = ()
+    updatable = ()
+
+    def queryset(self, user):
+        return self.model.objects.filter(owner=user)
+
+    def writable(self, user):
+        return self.model.objects.filter(owner=user)
+
+    def clean(self, user, item, names, context=None):
+        return {name: _clean_field(self.model, name, item[name]) for name in names if name in item}
+
+    def prepare(self, user, items):
+        """Хук для проверок, которым нужна база: один запрос на весь пакет, результат уходит в clean.
+
+        Экземпляр коллекции общий для всех запросов, поэтому ничего не хранит на себе.
+        """
+        return None
+
+    def check_required(self, items):
+        for item in items:
+            missing = [name for name in self.required if name not in item]
+            if missing:
+                raise ApiError({name: ["Обязательное поле"] for name in missing})
+
+    def create(self, user, items):
+        self.check_required(items)
+        context = self.prepare(user, items)
+        objects = [self.model(owner=user, **self.clean(user, item, self.creatable, context)) for item in items]
+        self.model.objects.bulk_create(objects)
+        return [obj.pk for obj in objects]
+
+    def update(self, user, items):
+        context = self.prepare(user, items)
+        objects = self.writable(user).in_bulk([item["id"] for item in items])
+        changed = set()
+        for item in items:
+            obj = objects.get(item["id"])
+            if obj is None:
+                raise ApiError({"id": [f"Запись {item['id']} не найдена"]}, status=404)
+            for name, value in self.clean(user, item, self.updatable, context).items():
+                setattr(obj, name, value)
+                changed.add(name)
+        if changed:
+            self.model.objects.bulk_update(objects.values(), sorted(changed), batch_size=1000)
+        return len(objects)
+
+    def delete(self, user, ids):
+        # без каскадов: считаются только записи самой коллекции
+        _, deleted = self.writable(user).filter(id__in=ids).delete()
+        return deleted.get(self.model._meta.label, 0)
+
+
+class RecipientResource(Resource):
+    model = Recipient
+    fields = {
+        "id": "id",
+        "email": "contact__email",
+        "full_name": "full_name",
+        "comment": "comment",
+        "verdict": "contact__verdict",
+    }
+    methods = ("get", "head", "post", "patch", "delete")
+    required = ("email", "full_name")
+    updatable = ("full_name", "comment")
+
+    def create(self, user, items):
+        """Повторный адрес владельца не ошибка: у существующего получателя обновляются имя и комментарий."""
+        self.check_required(items)
+        emails = []
+        for item in items:
+            if not isinstance(item["email"], str):
+                raise ApiError({"email": ["Ожидается строка"]})
+            try:
+                validate_email(item["email"])
+            except ValidationError as e:
+                raise ApiError({"email": e.messages})
+            emails.append(normalize_email(item["email"]))
+        contacts = Contact.objects.get_or_create_many(emails)
+        objects = {}
+        for email, item in zip(emails, items):
+            fields = self.clean(user, item, ("full_name", "comment"))
+            objects[email] = Recipient(contact=contacts[email], owner=user, **fields)
+        Recipient.objects.bulk_create(
+            objects.values(),
+            update_conflicts=True,
+            unique_fields=["contact", "owner"],
+            update_fields=["full_name", "comment"],
+        )
+        ids = dict(
+            Recipient.objects.filter(owner=user, contact__in=[obj.contact for obj in objects.values()])
+            .values_list("contact__email", "id")
+        )
+        return [ids[email] for email in emails]
+
+
+class MessageResource(Resource):
+    model = Message
+    fields = {"id": "id", "subject": "subject", "body": "body"}
+    methods = ("get", "head", "post", "patch", "delete")
+    required = creatable = updatable = ("subject", "body")
+
+
+class MailingResource(Resource):
+    model = Mailing
+    fields = {
+        "id": "id",
+        "status": "status",
+        "message": "message_id",
+        "subject": "message__subject",
+        "end_at": "end_at",
+        "first_sent_at": "first_sent_at",
+        "total_sent": "total_sent",
+        "successful_sends": "successful_sends",
+        "failed_sends": "failed_sends",
+    }
+    filters = {"status": "status"}
+    methods = ("get", "head", "post", "patch", "delete")
+    required = ("message",)
+    creatable = updatable = ("message", "end_at")
+
+    def queryset(self, user):
+        return Mailing.objects.all() if _sees_all_mailings(user) else Mailing.objects.filter(owner=user)
+
+    def prepare(self, user, items):
+        for item in items:
+            if "message" in item:
+                item["message"] = _int(item["message"], "message")
+        ids = {item["message"] for item in items if "message" in item}
+        # сообщения владельца, на которые можно ссылаться
+        return set(Message.objects.filter(owner=user, pk__in=ids).values_list("pk", flat=True))
+
+    def clean(self, user, item, names, context=None):
+        cleaned = {}
+        if "message" in names and "message" in item:
+            if item["message"] not in context:
+                raise ApiError({"message": [f"Сообщение {item['message']} не найдено"]})
+            cleaned["message_id"] = item["message"]
+        if "end_at" in names and "end_at" in item:
+            end_at = _clean_field(Mailing, "end_at", item["end_at"])
+            if end_at is not None and timezone.is_naive(end_at):
+                # как в формах: время без зоны — в зоне сервера
+                end_at = timezone.make_aware(end_at)
+            cleaned["end_at"] = end_at
+        return cleaned
+
+
+class SendAttemptResource(Resource):
+    model = SendAttempt
+    fields = {
+        "id": "id",
+        "attempt_time": "attempt_time",
+        "status": "status",
+        "server_response": "server_response",
+        "mailing": "mailing_id",
+        "recipient": "recipient_id",
+        "email": "recipient__contact__email",
+    }
+    filters = {"mailing": "mailing_id", "status": "status"}
+
+    def queryset(self, user):
+        if _sees_all_mailings(user):
+            return SendAttempt.objects.all()
+        return SendAttempt.objects.filter(mailing__owner=user)
+
+
+class SendJobResource(Resource):
+    model = SendJob
+    fields = {
+        "id": "id",
+        "mailing": "mailing_id",
+        "lane": "lane",
+        "shard": "shard",
+        "status": "status",
+        "total": "total",
+        "processed": "processed",
+        "not_before": "not_before",
+        "created_at": "created_at",
+        "finished_at": "finished_at",
+    }
+    filters = {"mailing": "mailing_id", "status": "status"}
+
+
+def _json(data, status=200):
+    return HttpResponse(json.dumps(data, cls=DjangoJSONEncoder), content_type="application/json", status=status)
+
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError({name: ["Ожидается целое число"]})
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ResourceView(generic.View):
+    """Список с курсором по id, выбором полей (?fields=) и ETag; пакетные POST, PATCH и DELETE.
+
+    Строки читаются через values_list без создания моделей.
+    """
+
+    resource = None
+
+    def dispatch(self, request, *args, **kwargs):
+        self.user = api_user(request)
+        if self.user is None:
+            return JsonResponse({"errors": {"auth": ["Нужен API-токен"]}}, status=401)
+        if request.method.lower() not in self.resource.methods:
+            return self.http_method_not_allowed(request, *args, **kwargs)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({"errors": e.errors}, status=e.status)
+
+    def get(self, request):
+        fields = self.resource.fields
+        names = request.GET.get("fields", "")
+        names = [name for name in names.split(",") if name] or list(fields)
+        unknown = [name for name in names if name not in fields]
+        if unknown:
+            raise ApiError({"fields": [f"Неизвестные поля: {', '.join(unknown)}"]})
+        # id нужен курсору, поэтому возвращается всегда
+        names = ["id"] + [name for name in names if name != "id"]
+        limit = min(max(_int(request.GET.get("limit", PAGE_SIZE), "limit"), 1), MAX_PAGE_SIZE)
+
+        queryset = self.resource.queryset(self.user)
+        for param, lookup in self.resource.filters.items():
+            if param in request.GET:
+                try:
+                    queryset = queryset.filter(**{lookup: request.GET[param]})
+                except (ValueError, ValidationError):
+                    raise ApiError({param: ["Некорректное значение фильтра"]})
+        if request.GET.get("cursor"):
+            queryset = queryset.filter(id__gt=_int(request.GET["cursor"], "cursor"))
+
+        rows = list(queryset.order_by("id").values_list(*(fields[name] for name in names))[:limit + 1])
+        results = [dict(zip(names, row)) for row in rows[:limit]]
+        next_url = None
+        if len(rows) > limit:
+            query = request.GET.copy()
+            query["cursor"] = results[-1]["id"]
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+        response = _json({"results": results, "next": next_url})
+        # ETag по телу: клиент, у которого страница не изменилась, получает пустой 304
+        etag = f'"{hashlib.md5(response.content, usedforsecurity=False).hexdigest()}"'
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization", "Cookie"])
+        return get_conditional_response(request, etag=etag, response=response)
+
+    def _items(self, request):
+        try:
+            items = json.loads(request.body)
+        except ValueError:
+            raise ApiError({"body": ["Некорректный JSON"]})
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ApiError({"body": ["Ожидается список объектов"]})
+        if len(items) > MAX_BATCH_SIZE:
+            raise ApiError({"body": [f"Не больше {MAX_BATCH_SIZE} записей за вызов"]})
+        return items
+
+    def post(self, request):
+        items = self._items(request)
+        with transaction.atomic():
+            ids = self.resource.create(self.user, items)
+            bump_data_version(self.user.pk)
+        return _json({"ids": ids}, status=201)
+
+    def patch(self, request):
+        items = self._items(request)
+        for item in items:
+            item["id"] = _int(item.get("id"), "id")
+        with transaction.atomic():
+            updated = self.resource.update(self.user, items)
+            bump_data_version(self.user.pk)
+        return _json({"updated": updated})
+
+    def delete(self, request):
+        ids = [_int(item.get("id"), "id") for item in self._items(request)]
+        with transaction.atomic():
+            deleted = self.resource.delete(self.user, ids)
+            bump_data_version(self.user.pk)
+        return _json({"deleted": deleted})
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class SendTriggerView(generic.View):
+    """Запуск пачки рассылок: {"mailings": [id, ...]} с заголовком Idempotency-Key.
+
+    Задания ставятся одной транзакцией вместе с ключом; повтор с тем же ключом получает
+    сохранённый ответ, поэтому внешний планировщик может смело повторять запросы.
+    """
+
+    http_method_names = ["post"]
+
+    def post(self, request):
+        user = api_user(request)
+        if user is None:
+            return JsonResponse({"errors": {"auth": ["Нужен API-токен"]}}, status=401)
+        try:
+            key, ids = self._parse(request)
+            request_hash = hashlib.sha256(json.dumps(ids).encode()).hexdigest()
+            fresh = IdempotencyKey.objects.filter(
+                owner=user, key=key, created_at__gte=timezone.now() - IDEMPOTENCY_TTL
+            )
+            record = fresh.first()
+            if record is None:
+                try:
+                    return _json(self._enqueue(request, user, key, ids, request_hash), status=202)
+                except IntegrityError:
+                    # тот же ключ только что закоммитил параллельный запрос
+                    record = fresh.get()
+            return self._replay(record, request_hash)
+        except ApiError as e:
+            return JsonResponse({"errors": e.errors}, status=e.status)
+
+    def _parse(self, request):
+        key = request.headers.get("Idempotency-Key", "").strip()
+        if not key or len(key) > 255:
+            raise ApiError({"idempotency_key": ["Нужен заголовок Idempotency-Key до 255 символов"]})
+        try:
+            body = json.loads(request.body)
+        except ValueError:
+            raise ApiError({"body": ["Некорректный JSON"]})
+        if not isinstance(body, dict) or not isinstance(body.get("mailings"), list):
+            raise ApiError({"mailings": ["Ожидается список id рассылок"]})
+        ids = sorted({_int(mailing_id, "mailings") for mailing_id in body["mailings"]})
+        if not ids or len(ids) > MAX_TRIGGER_SIZE:
+            raise ApiError({"mailings": [f"От 1 до {MAX_TRIGGER_SIZE} рассылок за вызов"]})
+        return key, ids
+
+    def _enqueue(self, request, user, key, ids, request_hash):
+        jobs_url = request.build_absolute_uri(reverse("service:api_jobs"))
+        with transaction.atomic():
+            IdempotencyKey.objects.filter(owner=user, created_at__lt=timezone.now() - IDEMPOTENCY_TTL).delete()
+            record = IdempotencyKey.objects.create(owner=user, key=key, request_hash=request_hash)
+            mailings = list(Mailing.objects.filter(owner=user, pk__in=ids))
+            missing = sorted(set(ids) - {mailing.pk for mailing in mailings})
+            if missing:
+                # откат вместе с ключом: исправленный запрос можно прислать с тем же ключом
+                raise ApiError({"mailings": [f"Рассылки не найдены: {', '.join(map(str, missing))}"]}, status=404)
+            enqueued = enqueue_mailings(mailings, owner=user)
+            record.response = {
+                "jobs": [
+                    {
+                        "mailing": mailing_id,
+                        "job": job.pk,
+                        "lane": job.lane,
+                        "status": job.status,
+                        "created": created,
+                        "url": f"{jobs_url}?mailing={mailing_id}",
+                    }
+                    for mailing_id, (job, created) in sorted(enqueued.items())
+                ]
+            }
+            record.save(update_fields=["response"])
+        return record.response
+
+    def _replay(self, record, request_hash):
+        if record.request_hash != request_hash:
+            raise ApiError({"idempotency_key": ["Ключ уже использован с другим набором рассылок"]}, status=422)
+        response = _json(record.response)
+        response["Idempotent-Replayed"] = "true"
+        return response
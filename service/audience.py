@@ -0,0 +1,96 @@
+from django.db import connection, transaction
+
+from .models import Mailing, Recipient
+from .versions import bump_data_version
+
+Membership = Mailing.recipients.through
+
+
+def _columns():
+    qn = connection.ops.quote_name
+    return (
+        qn(Membership._meta.db_table),
+        qn(Membership._meta.get_field("mailing").column),
+        qn(Membership._meta.get_field("recipient").column),
+    )
+
+
+def clone_mailing(mailing, owner=None):
+    """Копия рассылки с тем же сообщением и аудиторией; получатели копируются одним INSERT ... SELECT."""
+    table, mailing_column, recipient_column = _columns()
+    with transaction.atomic():
+        clone = Mailing.objects.create(
+            message_id=mailing.message_id,
+            owner_id=owner.pk if owner is not None else mailing.owner_id,
+            end_at=mailing.end_at,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({mailing_column}, {recipient_column}) "
+                f"SELECT %s, {recipient_column} FROM {table} WHERE {mailing_column} = %s",
+                [clone.pk, mailing.pk],
+            )
+        bump_data_version(clone.owner_id)
+    return clone
+
+
+def filter_recipients(owner_id, domain="", full_name="", comment="", source_mailing=None):
+    recipients = Recipient.objects.filter(owner_id=owner_id)
+    if domain:
+        recipients = recipients.filter(contact__email__endswith="@" + domain.strip().lower().lstrip("@"))
+    if full_name:
+        recipients = recipients.filter(full_name__icontains=full_name)
+    if comment:
+        recipients = recipients.filter(comment__icontains=comment)
+    if source_mailing is not None:
+        recipients = recipients.filter(mailing=source_mailing)
+    return recipients
+
+
+def add_recipients(mailing, recipients):
+    """Добавляет в рассылку получателей из queryset без выборки их в Python; возвращает число добавленных."""
+    table, mailing_column, recipient_column = _columns()
+    subquery, params = recipients.order_by().values("id").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({mailing_column}, {recipient_column}) "
+            f"SELECT %s, selected.id FROM ({subquery}) selected "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} existing "
+            f"WHERE existing.{mailing_column} = %s AND existing.{recipient_column} = selected.id)",
+            [mailing.pk, *params, mailing.pk],
+        )
+        added = cursor.rowcount
+    bump_data_version(mailing.owner_id)
+    return added
+
+
+def remove_recipients(mailing, recipients):
+    """Убирает из рассылки получателей из queryset одним DELETE; возвращает число удалённых."""
+    deleted, _ = Membership.objects.filter(mailing=mailing, recipient__in=recipients.order_by().values("id")).delete()
+    bump_data_version(mailing.owner_id)
+    return deleted
+
+
+def shard_bounds(mailing, shards):
+    """Делит получателей рассылки на shards диапазонов id примерно поровну одним запросом.
+
+    Возвращает [(id, после которого начинается диапазон, последний id диапазона, число получателей)];
+    у последнего диапазона верхней границы нет, чтобы не потерять добавленных позже.
+    """
+    table, mailing_column, recipient_column = _columns()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT MAX(tiles.recipient_id), COUNT(*) FROM ("
+            f"SELECT {recipient_column} AS recipient_id, NTILE(%s) OVER (ORDER BY {recipient_column}) AS tile "
+            f"FROM {table} WHERE {mailing_column} = %s) tiles GROUP BY tiles.tile ORDER BY tiles.tile",
+            [shards, mailing.pk],
+        )
+        rows = cursor.fetchall()
+    bounds, after = [], 0
+    for last_id, count in rows:
+        bounds.append((after, last_id, count))
+        after = last_id
+    if not bounds:
+        return [(0, None, 0)]
+    bounds[-1] = (bounds[-1][0], None, bounds[-1][2])
+    return bounds
@@ -0,0 +1,140 @@
+import http.client
+import json
+import smtplib
+import threading
+from collections import deque
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = "service.backends.SMTPBackend"
+
+
+def get_backend(path=None):
+    return import_string(path or getattr(settings, "MAILING_BACKEND", DEFAULT_BACKEND))()
+
+
+def serialize(message):
+    """Лёгкое представление письма без сборки MIME — для стоков и HTTP-провайдера."""
+    return {
+        "from": message.from_email,
+        "to": message.to,
+        "subject": message.subject,
+        "body": message.body,
+        "html": next((content for content, mimetype in message.alternatives if mimetype == "text/html"), ""),
+        "headers": message.extra_headers,
+    }
+
+
+class BaseBackend:
+    """Доставка пачки писем.
+
+    send_messages возвращает по одному результату на письмо: None при успехе
+    или исключение, которое движок классифицирует так же, как ошибку SMTP.
+    chunk_size — сколько писем движок отдаёт за раз, чтобы между вызовами
+    успеть остановиться на отказавшем домене.
+    """
+
+    chunk_size = None
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise NotImplementedError
+
+
+class SMTPBackend(BaseBackend):
+    chunk_size = 1
+
+    def open(self):
+        self.connection = get_connection(settings.EMAIL_BACKEND)
+        self.connection.open()
+
+    def close(self):
+        self.connection.close()
+
+    def send_messages(self, messages):
+        results = []
+        for message in messages:
+            try:
+                message.connection = self.connection
+                message.send()
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class MemoryBackend(BaseBackend):
+    """Сток в памяти процесса: хранит последние письма и общий счётчик."""
+
+    lock = threading.Lock()
+    outbox = deque(maxlen=getattr(settings, "MAILING_MEMORY_OUTBOX_LIMIT", 10_000))
+    sent = 0
+
+    def send_messages(self, messages):
+        with self.lock:
+            self.outbox.extend(messages)
+            MemoryBackend.sent += len(messages)
+        return [None] * len(messages)
+
+
+class FileBackend(BaseBackend):
+    """Append-only JSONL: одна строка на письмо, одна запись в файл на пачку."""
+
+    def open(self):
+        path = Path(getattr(settings, "MAILING_FILE_SINK_PATH", "mailing.jsonl"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def close(self):
+        self.file.close()
+
+    def send_messages(self, messages):
+        self.file.write("".join(json.dumps(serialize(message), ensure_ascii=False) + "\n" for message in messages))
+        self.file.flush()
+        return [None] * len(messages)
+
+
+class HttpApiBackend(BaseBackend):
+    """HTTP-провайдер: пачка уходит одним POST по постоянному соединению.
+
+    Ответ — {"results": [{"status": "ok"} | {"status": "error", "code": 550, "message": "..."}]}.
+    Отказы с SMTP-кодом превращаются в SMTPRecipientsRefused, чтобы работали повторы и стоп-лист.
+    """
+
+    def open(self):
+        url = urlsplit(getattr(settings, "MAILING_HTTP_API_URL", "http://127.0.0.1:8025/send"))
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.path = url.path or "/"
+        self.connection = connection_class(url.hostname, url.port, timeout=10)
+        self.connection.connect()
+
+    def close(self):
+        self.connection.close()
+
+    def send_messages(self, messages):
+        payload = json.dumps({"messages": [serialize(message) for message in messages]}).encode()
+        self.connection.request("POST", self.path, payload, {"Content-Type": "application/json"})
+        response = self.connection.getresponse()
+        body = response.read()
+        if response.status >= 500:
+            raise smtplib.SMTPResponseException(451, f"HTTP {response.status}")
+        if response.status >= 400:
+            raise smtplib.SMTPResponseException(554, f"HTTP {response.status}: {body[:200]!r}")
+
+        results = []
+        for message, result in zip(messages, json.loads(body)["results"]):
+            if result["status"] == "ok":
+                results.append(None)
+            else:
+                error = (result.get("code", 554), result.get("message", ""))
+                results.append(smtplib.SMTPRecipientsRefused({address: error for address in message.to}))
+        return results
@@ -1,11 +1,36 @@
 from django import forms
-from .models import Recipient, Message, Mailing
+from users.roles import is_manager
+from .models import Contact, Recipient, Message, Mailing, normalize_email
+from .validation import needs_validation, validate_contacts
 
 
 class RecipientForm(forms.ModelForm):
+    email = forms.EmailField()
+
     class Meta:
         model = Recipient
-        fields = ["email", "full_name", "comment"]
+        fields = ["full_name", "comment"]
+
+    def __init__(self, user=None, *args, **kwargs):
+        super(RecipientForm, self).__init__(*args, **kwargs)
+        self.owner = self.instance.owner if self.instance.pk else user
+        if self.instance.pk:
+            self.fields["email"].initial = self.instance.email
+        self.order_fields(["email", "full_name", "comment"])
+
+    def clean_email(self):
+        email = normalize_email(self.cleaned_data["email"])
+        duplicates = Recipient.objects.filter(owner=self.owner, contact__email=email).exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise forms.ValidationError("Получатель с таким email уже есть в вашем списке.")
+        return email
+
+    def save(self, commit=True):
+        # адрес общий для всех владельцев, у получателя — только членство
+        self.instance.contact = Contact.objects.get_or_create_for(self.cleaned_data["email"])
+        if needs_validation(self.instance.contact):
+            validate_contacts([self.instance.contact])
+        return super(RecipientForm, self).save(commit)
 
 
 class MessageForm(forms.ModelForm):
@@ -14,6 +39,12 @@ class MessageForm(forms.ModelForm):
         fields = ["subject", "body"]
 
 
+def changed_model_fields(form):
+    """Изменённые формой поля модели для save(update_fields=...): остальные колонки строки не перезаписываются."""
+    concrete = {field.name for field in form.instance._meta.concrete_fields}
+    return [name for name in form.changed_data if name in concrete]
+
+
 class MailingForm(forms.ModelForm):
     class Meta:
         model = Mailing
@@ -30,9 +61,27 @@ class MailingForm(forms.ModelForm):
     def __init__(self, user=None, *args, **kwargs):
         super(MailingForm, self).__init__(*args, **kwargs)
 
-        if user is not None and user.groups.filter(name="manager").exists() is False:
+        if user is not None and not is_manager(user):
             # Фильтруем получателей по текущему владельцу
             self.fields["recipients"].queryset = Recipient.objects.filter(owner=user)
 
             # Фильтруем сообщения по текущему владельцу
             self.fields["message"].queryset = Message.objects.filter(owner=user)
+
+
+class MailingRecipientsForm(forms.Form):
+    ACTION_CHOICES = [("add", "Добавить"), ("remove", "Убрать")]
+
+    action = forms.ChoiceField(choices=ACTION_CHOICES, label="Действие")
+    domain = forms.CharField(required=False, label="Домен адреса")
+    full_name = forms.CharField(required=False, label="ФИО содержит")
+    comment = forms.CharField(required=False, label="Комментарий содержит")
+    source_mailing = forms.ModelChoiceField(
+        queryset=Mailing.objects.none(), required=False, label="Получатели рассылки"
+    )
+
+    def __init__(self, mailing, *args, **kwargs):
+        super(MailingRecipientsForm, self).__init__(*args, **kwargs)
+        self.fields["source_mailing"].queryset = (
+            Mailing.objects.filter(owner_id=mailing.owner_id).exclude(pk=mailing.pk).select_related("message")
+        )
@@ -0,0 +1,215 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from users.outbox import drain_outbox
+
+from .audience import shard_bounds
+from .models import Mailing, SendJob
+from .progress import ProgressTracker
+from .quotas import OwnerQuota
+from .services import send_mailing
+
+LANES = ("transactional", "small", "bulk")
+ACTIVE_STATUSES = ("Ожидает", "Выполняется")
+
+# рассылки до стольких получателей идут в полосу небольших
+SMALL_LANE_LIMIT = getattr(settings, "MAILING_SMALL_LANE_LIMIT", 1000)
+# сколько писем каждая полоса получает за один проход воркера
+LANE_QUOTAS = {
+    "transactional": 200,
+    "small": 500,
+    "bulk": 500,
+    **getattr(settings, "MAILING_LANE_QUOTAS", {}),
+}
+# задание, чей воркер не отчитался за это время, снова доступно другим
+JOB_LOCK_TIMEOUT = timedelta(seconds=getattr(settings, "MAILING_JOB_LOCK_TIMEOUT", 10 * 60))
+# на сколько шардов делится массовая рассылка: столько воркеров смогут отправлять её одновременно
+BULK_SHARDS = getattr(settings, "MAILING_BULK_SHARDS", os.cpu_count() or 1)
+
+
+def lane_for(total):
+    return "small" if total <= SMALL_LANE_LIMIT else "bulk"
+
+
+def _new_jobs(mailing, owner_id, total):
+    lane = lane_for(total)
+    bounds = shard_bounds(mailing, BULK_SHARDS) if lane == "bulk" else [(0, None, total)]
+    return [
+        SendJob(
+            mailing=mailing,
+            owner_id=owner_id,
+            lane=lane,
+            shard=shard,
+            cursor=after,
+            last_id=last_id,
+            total=count,
+        )
+        for shard, (after, last_id, count) in enumerate(bounds)
+    ]
+
+
+def enqueue_mailing(mailing, owner=None):
+    """Ставит рассылку в очередь; возвращает (первое задание, создано ли новое).
+
+    Массовая рассылка сразу делится на шарды по диапазонам id получателей.
+    """
+    active = SendJob.objects.filter(mailing=mailing, status__in=ACTIVE_STATUSES).order_by("shard")
+    job = active.first()
+    if job is not None:
+        return job, False
+
+    total = mailing.recipients.count()
+    try:
+        with transaction.atomic():
+            jobs = SendJob.objects.bulk_create(
+                _new_jobs(mailing, mailing.owner_id or getattr(owner, "pk", None), total)
+            )
+    except IntegrityError:
+        # параллельный запрос успел поставить ту же рассылку
+        return active.first(), False
+    # общий прогресс на всю рассылку: шарды продолжают его
+    ProgressTracker(mailing, total)
+    return jobs[0], True
+
+
+def enqueue_mailings(mailings, owner=None):
+    """Ставит в очередь пачку рассылок; возвращает {id рассылки: (первое задание, создано ли новое)}.
+
+    Активные задания и размеры аудиторий выбираются одним запросом на всю пачку, новые задания — одной вставкой.
+    """
+    mailings = list(mailings)
+    result = {}
+    # по убыванию шарда: для каждой рассылки остаётся её нулевой шард
+    for job in SendJob.objects.filter(mailing__in=mailings, status__in=ACTIVE_STATUSES).order_by("-shard"):
+        result[job.mailing_id] = (job, False)
+    pending = [mailing for mailing in mailings if mailing.pk not in result]
+    if not pending:
+        return result
+
+    totals = dict(
+        Mailing.recipients.through.objects.filter(mailing__in=pending)
+        .values("mailing")
+        .annotate(total=Count("id"))
+        .values_list("mailing", "total")
+    )
+    owner_id = getattr(owner, "pk", None)
+    new_jobs = {
+        mailing.pk: _new_jobs(mailing, mailing.owner_id or owner_id, totals.get(mailing.pk, 0)) for mailing in pending
+    }
+    try:
+        with transaction.atomic():
+            SendJob.objects.bulk_create([job for jobs in new_jobs.values() for job in jobs])
+    except IntegrityError:
+        # часть рассылок успели поставить параллельно — разбираем по одной
+        return {**result, **{mailing.pk: enqueue_mailing(mailing, owner) for mailing in pending}}
+
+    for mailing in pending:
+        ProgressTracker(mailing, totals.get(mailing.pk, 0))
+        result[mailing.pk] = (new_jobs[mailing.pk][0], True)
+    return result
+
+
+def claim_job(lane):
+    """Забирает задание полосы, отдавая приоритет владельцу, которого дольше всех не обслуживали."""
+    now = timezone.now()
+    owner_served_at = (
+        SendJob.objects.filter(owner=OuterRef("owner"), last_run_at__isnull=False)
+        .order_by("-last_run_at")
+        .values("last_run_at")[:1]
+    )
+    with transaction.atomic():
+        job = (
+            SendJob.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(lane=lane)
+            .filter(Q(status="Ожидает") | Q(status="Выполняется", locked_at__lt=now - JOB_LOCK_TIMEOUT))
+            .filter(Q(not_before__isnull=True) | Q(not_before__lte=now))
+            .annotate(owner_served_at=Subquery(owner_served_at))
+            .order_by(F("owner_served_at").asc(nulls_first=True), F("last_run_at").asc(nulls_first=True), "id")
+            .select_related("mailing__message")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = "Выполняется"
+        job.locked_at = now
+        job.last_run_at = now
+        job.save(update_fields=["status", "locked_at", "last_run_at"])
+    return job
+
+
+def run_job_slice(job, limit):
+    """Отправляет следующий срез получателей задания; возвращает число обработанных."""
+    mailing = job.mailing
+    recipients = mailing.recipients.filter(id__gt=job.cursor)
+    if job.last_id is not None:
+        recipients = recipients.filter(id__lte=job.last_id)
+    ids = list(recipients.order_by("id").values_list("id", flat=True)[:limit])
+    has_more = len(ids) == limit
+
+    # срез целиком резервируется в лимите владельца одним обращением к счётчику
+    quota = OwnerQuota(mailing.owner_id)
+    granted = quota.reserve(len(ids))
+    job.not_before = None
+    if granted < len(ids):
+        ids, has_more = ids[:granted], True
+        job.not_before = quota.resets_at()
+        if not ids:
+            return _pause(job, mailing)
+
+    progress = ProgressTracker(mailing, job.total, resume=True)
+    if ids:
+        send_mailing(
+            mailing,
+            recipients=mailing.recipients.filter(id__in=ids),
+            owner=job.owner,
+            progress=progress,
+            quota=quota,
+        )
+        mailing.update_status()
+        job.cursor = ids[-1]
+        job.processed += len(ids)
+
+    if has_more:
+        job.status = "Ожидает"
+    else:
+        job.status = "Готово"
+        job.finished_at = timezone.now()
+    job.locked_at = None
+    job.save(update_fields=["status", "cursor", "processed", "locked_at", "finished_at", "not_before"])
+
+    # прогресс закрывает шард, завершившийся последним; проверка идёт после сохранения своего статуса
+    others = SendJob.objects.filter(mailing=mailing, status__in=ACTIVE_STATUSES).exclude(pk=job.pk)
+    if job.status == "Готово" and not others.exists():
+        progress.finish()
+    else:
+        progress.flush()
+    return len(ids)
+
+
+def _pause(job, mailing):
+    """Лимит владельца исчерпан: задание ждёт нового окна, рассылка не считается неудачной."""
+    job.status = "Ожидает"
+    job.locked_at = None
+    job.save(update_fields=["status", "locked_at", "not_before"])
+    mailing.status = "Приостановлена"
+    mailing.save(update_fields=["status"])
+    return 0
+
+
+def run_lanes(lanes=LANES):
+    """Один проход воркера: служебные письма первыми, каждой полосе — не больше её квоты."""
+    processed = 0
+    for lane in lanes:
+        quota = LANE_QUOTAS[lane]
+        if lane == "transactional":
+            processed += drain_outbox(batch_size=quota)
+            continue
+        job = claim_job(lane)
+        if job is not None:
+            processed += run_job_slice(job, quota)
+    return processed
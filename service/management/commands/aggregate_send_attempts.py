@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from service.analytics import aggregate_attempts
+
+
+class Command(BaseCommand):
+    help = "Roll new send attempts up into hourly analytics buckets"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50_000)
+        parser.add_argument("--loop", action="store_true")
+        parser.add_argument("--interval", type=float, default=60.0)
+
+    def handle(self, *args, **kwargs):
+        while True:
+            processed = aggregate_attempts(batch_size=kwargs["batch_size"])
+            if processed:
+                self.stdout.write(f"Учтено попыток: {processed}")
+                continue
+            if not kwargs["loop"]:
+                return
+            time.sleep(kwargs["interval"])
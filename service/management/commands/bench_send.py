@@ -0,0 +1,96 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from service.models import Contact, Mailing, Message, Recipient, email_hash
+from service.services import send_mailing
+
+BENCH_EMAIL = "bench@mailing.invalid"
+
+
+class Command(BaseCommand):
+    help = "Benchmark or soak-test the send pipeline against a non-SMTP backend with synthetic recipients"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipients", type=int, default=10_000)
+        parser.add_argument("--domains", type=int, default=20)
+        parser.add_argument("--rounds", type=int, default=1, help="How many times to resend the mailing")
+        parser.add_argument("--backend", default="service.backends.MemoryBackend")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the synthetic data afterwards")
+
+    def handle(self, *args, **kwargs):
+        mailing = self.prepare(kwargs["recipients"], kwargs["domains"])
+        self.stdout.write(f"Рассылка {mailing.pk}: {kwargs['recipients']} получателей, бэкенд {kwargs['backend']}")
+
+        sent = 0
+        started_at = time.monotonic()
+        # синтетические домены не резолвятся, поэтому DNS-проверка отключается
+        with override_settings(
+            MAILING_BACKEND=kwargs["backend"],
+            MAILING_DOMAIN_RESOLVER="service.validation.offline_resolver",
+        ):
+            for round_number in range(1, kwargs["rounds"] + 1):
+                round_started_at = time.monotonic()
+                result = send_mailing(mailing)
+                elapsed = time.monotonic() - round_started_at
+                processed = result["successful"] + result["failed"] + result["deferred"]
+                sent += processed
+                self.stdout.write(
+                    f"Прогон {round_number}: {dict(result)}, {elapsed:.2f} с, {processed / elapsed * 3600:.0f} писем/ч"
+                )
+
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(
+            self.style.SUCCESS(f"Итого: {sent} писем за {elapsed:.2f} с, {sent / elapsed * 3600:.0f} писем/ч")
+        )
+
+        if kwargs["cleanup"]:
+            self.cleanup()
+
+    def prepare(self, count, domains):
+        owner, _ = get_user_model().objects.get_or_create(email=BENCH_EMAIL, defaults={"username": "bench"})
+        mailing = Mailing.objects.filter(owner=owner, message__subject=f"bench {count}").first()
+        if mailing is not None:
+            return mailing
+
+        emails = [f"user{i}@d{i % domains}.bench.invalid" for i in range(count)]
+        now = timezone.now()
+        with transaction.atomic():
+            Contact.objects.bulk_create(
+                [Contact(email=email, email_hash=email_hash(email), verdict="Корректен", verified_at=now)
+                 for email in emails],
+                batch_size=5000,
+                ignore_conflicts=True,
+            )
+            contact_ids = Contact.objects.filter(email__in=emails).values_list("id", flat=True)
+            Recipient.objects.bulk_create(
+                [Recipient(contact_id=contact_id, owner=owner, full_name="bench") for contact_id in contact_ids],
+                batch_size=5000,
+                ignore_conflicts=True,
+            )
+            message = Message.objects.create(subject=f"bench {count}", body="Benchmark message.", owner=owner)
+            mailing = Mailing.objects.create(message=message, owner=owner)
+            # у владельца могут остаться получатели прогонов другого размера — берём только этот набор
+            recipient_ids = Recipient.objects.filter(owner=owner, contact_id__in=contact_ids).values_list(
+                "id", flat=True
+            )
+            Mailing.recipients.through.objects.bulk_create(
+                [Mailing.recipients.through(mailing_id=mailing.pk, recipient_id=recipient_id)
+                 for recipient_id in recipient_ids],
+                batch_size=5000,
+            )
+        return mailing
+
+    def cleanup(self):
+        owner = get_user_model().objects.filter(email=BENCH_EMAIL).first()
+        if owner is None:
+            return
+        with transaction.atomic():
+            # попытки и членства удаляются каскадом вместе с владельцем
+            owner.delete()
+            Contact.objects.filter(email__endswith=".bench.invalid", memberships__isnull=True).delete()
+        self.stdout.write("Синтетические данные удалены.")
@@ -0,0 +1,53 @@
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# то, что делает воркер до первой пачки: настройка Django, импорт движка, ссылка для письма
+PROBE = """
+import os, sys, time
+started_at = time.perf_counter()
+os.environ["DJANGO_SETTINGS_MODULE"] = {settings!r}
+import django
+django.setup()
+if {checks!r}:
+    from django.core import checks
+    checks.run_checks()
+import service.jobs
+from django.urls import reverse
+reverse("service:track_open", kwargs={{"token": "x"}})
+print(time.perf_counter() - started_at, len(sys.modules))
+"""
+
+PROFILES = [
+    ("полные настройки + проверки", "config.settings", True),
+    ("настройки воркера", "config.settings_worker", False),
+]
+
+
+class Command(BaseCommand):
+    help = "Measure cold start of a send worker with the full and the worker settings profiles"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **kwargs):
+        for title, settings_module, checks in PROFILES:
+            code = PROBE.format(settings=settings_module, checks=checks)
+            setup_times, wall_times, modules = [], [], 0
+            for _ in range(kwargs["runs"]):
+                started_at = time.perf_counter()
+                output = subprocess.run(
+                    [sys.executable, "-c", code], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+                ).stdout.split()
+                wall_times.append(time.perf_counter() - started_at)
+                setup_times.append(float(output[0]))
+                modules = int(output[1])
+            self.stdout.write(
+                f"{title}: процесс {statistics.median(wall_times) * 1000:.0f} мс, "
+                f"Django {statistics.median(setup_times) * 1000:.0f} мс, модулей {modules}"
+            )
@@ -0,0 +1,65 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from service.versions import version_key
+
+PAGES = ["service:home", "service:recipient_list", "service:mailing_list"]
+
+
+class Command(BaseCommand):
+    help = "Compare cold and fragment-cached render times of the owner list pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            default="bench@mailing.invalid",
+            help="Email of the owner to render as; bench_send creates the default one with a large audience",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **kwargs):
+        user = get_user_model().objects.filter(email=kwargs["user"]).first()
+        if user is None:
+            raise CommandError(f"Пользователь {kwargs['user']} не найден; создайте данные через bench_send")
+
+        factory = RequestFactory()
+        for name in PAGES:
+            path = reverse(name)
+            view = resolve(path).func
+
+            def render():
+                request = factory.get(path)
+                request.user = user
+                response = view(request)
+                if hasattr(response, "render"):
+                    response.render()
+                return response
+
+            render()  # прогрев загрузчика шаблонов
+            cold = self.measure(render, kwargs["repeat"], invalidate=user.pk)
+            warm = self.measure(render, kwargs["repeat"])
+            self.stdout.write(
+                f"{name}: без кеша {cold[0]:.1f} мс / {cold[1]} запросов, "
+                f"с кешем фрагментов {warm[0]:.1f} мс / {warm[1]} запросов, "
+                f"ускорение x{cold[0] / max(warm[0], 0.001):.1f}"
+            )
+
+    def measure(self, render, repeat, invalidate=None):
+        total, queries = 0.0, 0
+        for _ in range(repeat):
+            if invalidate is not None:
+                # новая версия данных — все фрагменты владельца рендерятся заново
+                cache.delete_many([version_key(invalidate), version_key(None)])
+            with CaptureQueriesContext(connection) as captured:
+                started_at = time.perf_counter()
+                render()
+                total += time.perf_counter() - started_at
+            queries = len(captured)
+        return total / repeat * 1000, queries
@@ -0,0 +1,71 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Run a local fake HTTP mail provider for HttpApiBackend (benchmarks and soak tests)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8025)
+        parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of messages answered with 451")
+        parser.add_argument("--bounce-domain", action="append", default=[], help="Answer 550 for this domain")
+        parser.add_argument("--report-every", type=float, default=10.0)
+
+    def handle(self, *args, **kwargs):
+        fail_rate = kwargs["fail_rate"]
+        bounce_domains = {domain.lower() for domain in kwargs["bounce_domain"]}
+        stats = {"received": 0, "failed": 0}
+        lock = threading.Lock()
+
+        def result_for(message):
+            domains = {address.rsplit("@", 1)[-1].lower() for address in message["to"]}
+            if domains & bounce_domains:
+                return {"status": "error", "code": 550, "message": "Mailbox unavailable"}
+            if fail_rate and random.random() < fail_rate:
+                return {"status": "error", "code": 451, "message": "Try again later"}
+            return {"status": "ok"}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                messages = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["messages"]
+                results = [result_for(message) for message in messages]
+                with lock:
+                    stats["received"] += len(messages)
+                    stats["failed"] += sum(result["status"] != "ok" for result in results)
+
+                body = json.dumps({"results": results}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((kwargs["host"], kwargs["port"]), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.stdout.write(f"Фейковый провайдер слушает http://{kwargs['host']}:{kwargs['port']}/send")
+
+        started_at = time.monotonic()
+        try:
+            while True:
+                time.sleep(kwargs["report_every"])
+                elapsed = time.monotonic() - started_at
+                self.stdout.write(
+                    f"Принято писем: {stats['received']}, ошибок: {stats['failed']}, "
+                    f"{stats['received'] / elapsed * 3600:.0f} писем/ч"
+                )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from service.tracking import flush_events
+
+
+class Command(BaseCommand):
+    help = "Write buffered open/unsubscribe events from Redis to the database"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--loop", action="store_true")
+        parser.add_argument("--interval", type=float, default=2.0)
+
+    def handle(self, *args, **kwargs):
+        while True:
+            flushed = flush_events(batch_size=kwargs["batch_size"])
+            if flushed:
+                self.stdout.write(f"Записано событий: {flushed}")
+                continue
+            if not kwargs["loop"]:
+                return
+            time.sleep(kwargs["interval"])
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from service.retries import process_due_retries
+
+
+class Command(BaseCommand):
+    help = "Resend transient failures whose backoff delay has expired"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=200)
+        parser.add_argument("--loop", action="store_true")
+        parser.add_argument("--interval", type=float, default=5.0)
+
+    def handle(self, *args, **kwargs):
+        while True:
+            processed = process_due_retries(limit=kwargs["limit"])
+            if processed:
+                self.stdout.write(f"Обработано повторов: {processed}")
+                continue
+            if not kwargs["loop"]:
+                return
+            time.sleep(kwargs["interval"])
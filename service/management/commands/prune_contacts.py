@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from service.models import Contact
+
+
+class Command(BaseCommand):
+    help = "Delete canonical addresses that no owner references any more"
+
+    def handle(self, *args, **kwargs):
+        deleted, _ = Contact.objects.filter(memberships__isnull=True).delete()
+        self.stdout.write(self.style.SUCCESS(f"Удалено адресов: {deleted}"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from service.services import reconcile_mailing_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute mailing send counters from send attempts with one grouped query"
+    requires_system_checks = []
+
+    def handle(self, *args, **kwargs):
+        fixed = reconcile_mailing_counters()
+        self.stdout.write(f"Исправлено рассылок: {fixed}")
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from service.jobs import LANES, run_lanes
+
+
+class Command(BaseCommand):
+    help = "Process queued mail by priority lane: transactional, small mailings, bulk mailings"
+    # системные проверки импортируют URLconf и админку — воркеру они не нужны, их прогоняет деплой
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lane",
+            action="append",
+            choices=LANES,
+            help="Serve only these lanes (repeatable); by default all lanes in priority order",
+        )
+        parser.add_argument("--loop", action="store_true")
+        parser.add_argument("--interval", type=float, default=1.0)
+
+    def handle(self, *args, **kwargs):
+        lanes = [lane for lane in LANES if lane in kwargs["lane"]] if kwargs["lane"] else LANES
+        while True:
+            processed = run_lanes(lanes)
+            if processed:
+                self.stdout.write(f"Обработано писем: {processed}")
+                continue
+            if not kwargs["loop"]:
+                return
+            time.sleep(kwargs["interval"])
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from service.models import Mailing
+from service.services import send_mailing
+
+
+class Command(BaseCommand):
+    help = "Send a mailing by ID"
+
+    def add_arguments(self, parser):
+        parser.add_argument("mailing_id", type=int)
+
+    def handle(self, *args, **kwargs):
+        mailing_id = kwargs["mailing_id"]
+
+        try:
+            mailing = Mailing.objects.get(id=mailing_id)
+        except Mailing.DoesNotExist:
+            self.stdout.write(
+                self.style.ERROR(f"Рассылка с ID {mailing_id} не найдена.")
+            )
+            return
+
+        if mailing.status != "Запущена":
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Рассылка с ID {mailing_id} не запущена. Текущий статус: {mailing.status}."
+                )
+            )
+            return
+
+        result = send_mailing(mailing)
+        mailing.update_status()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Рассылка с ID {mailing_id} успешно отправлена.")
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Всего отправлено: {result['total']}, успешных отправок: {result['successful']}, "
+                f"неуспешных: {result['failed']}, отложено: {result['deferred']}, "
+                f"в стоп-листе: {result['suppressed']}, отсеяно проверкой: {result['invalid']}."
+            )
+        )
@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from service.jobs import LANES, run_lanes
+
+# воркер, упавший быстрее этого, перезапускается с паузой, чтобы не крутить падения впустую
+RESTART_BACKOFF = 5.0
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # нет на macOS
+        return os.cpu_count() or 1
+
+
+def run_worker(lanes, interval, sent):
+    """Цикл дочернего процесса: SIGTERM дожидается конца текущего прохода, а не обрывает пачку."""
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    # Ctrl+C получает вся группа процессов; дочерние останавливает супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        while not stopping:
+            processed = run_lanes(lanes)
+            sent.value += processed
+            idle_until = time.monotonic() + (0 if processed else interval)
+            while not stopping and time.monotonic() < idle_until:
+                time.sleep(0.1)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run several send worker processes, restart the ones that crash "
+        "and report total throughput; SIGTERM lets every worker finish its current batch"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Number of worker processes; by default one per available CPU",
+        )
+        parser.add_argument("--lane", action="append", choices=LANES)
+        parser.add_argument("--interval", type=float, default=1.0)
+        parser.add_argument("--report-every", type=float, default=30.0)
+
+    def handle(self, *args, **kwargs):
+        self.lanes = [lane for lane in LANES if lane in kwargs["lane"]] if kwargs["lane"] else LANES
+        self.interval = kwargs["interval"]
+        self.context = multiprocessing.get_context("fork")
+        count = kwargs["workers"] or available_cpus()
+        # счётчик у каждого воркера свой: пишет только он, супервизор читает
+        self.sent = [self.context.Value("q", 0, lock=False) for _ in range(count)]
+        self.workers = {}
+        self.stopping = False
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(count):
+            self.start_worker(index)
+        self.stdout.write(f"Запущено воркеров: {count}")
+
+        started_at = reported_at = time.monotonic()
+        reported_total = 0
+        while self.workers:
+            timeout = max(reported_at + kwargs["report_every"] - time.monotonic(), 0)
+            ready = wait([process.sentinel for process, _ in self.workers.values()], timeout)
+            for index, (process, process_started_at) in list(self.workers.items()):
+                if process.sentinel in ready:
+                    process.join()
+                    del self.workers[index]
+                    if not self.stopping:
+                        self.restart_worker(index, process, process_started_at)
+
+            now = time.monotonic()
+            if now - reported_at >= kwargs["report_every"]:
+                total = sum(value.value for value in self.sent)
+                rate = (total - reported_total) / (now - reported_at)
+                self.stdout.write(
+                    f"Отправлено: {total}, сейчас {rate * 3600:.0f} писем/ч, воркеров: {len(self.workers)}"
+                )
+                reported_at, reported_total = now, total
+
+        total = sum(value.value for value in self.sent)
+        elapsed = max(time.monotonic() - started_at, 0.001)
+        self.stdout.write(f"Остановлено. Отправлено: {total}, в среднем {total / elapsed * 3600:.0f} писем/ч")
+
+    def start_worker(self, index):
+        # соединения с БД не должны достаться дочернему процессу от родителя
+        connections.close_all()
+        process = self.context.Process(
+            target=run_worker,
+            args=(self.lanes, self.interval, self.sent[index]),
+            name=f"send-worker-{index}",
+        )
+        process.start()
+        self.workers[index] = (process, time.monotonic())
+
+    def restart_worker(self, index, process, started_at):
+        self.stderr.write(f"Воркер {process.name} завершился с кодом {process.exitcode}, перезапуск")
+        if time.monotonic() - started_at < RESTART_BACKOFF:
+            time.sleep(RESTART_BACKOFF)
+        if not self.stopping:
+            self.start_worker(index)
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        self.stdout.write("Остановка: воркеры заканчивают текущую пачку")
+        for process, _ in self.workers.values():
+            process.terminate()
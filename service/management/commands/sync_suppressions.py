@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from service.analytics import classify_error
+from service.models import SendAttempt
+from service.suppression import HARD_BOUNCE_CODES, suppress
+
+
+class Command(BaseCommand):
+    help = "Add addresses with permanent delivery failures to the global suppression list"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **kwargs):
+        hard_bounces = {str(code) for code in HARD_BOUNCE_CODES}
+        # SMTPRecipientsRefused сохраняется как repr словаря: "{'a@b.ru': (550, ...)}"
+        failures = SendAttempt.objects.filter(
+            status="Не успешно", recipient__isnull=False, server_response__startswith="{"
+        ).values_list("recipient__contact__email", "server_response")
+
+        batch, total = [], 0
+        for email, server_response in failures.iterator(chunk_size=kwargs["batch_size"]):
+            if classify_error(server_response) in hard_bounces:
+                batch.append(email)
+            if len(batch) >= kwargs["batch_size"]:
+                suppress(batch)
+                total += len(batch)
+                batch = []
+        suppress(batch)
+        total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Адресов обработано: {total}"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from service.models import Contact
+from service.validation import VERDICT_TTL, DomainChecker, validate_contacts
+
+
+class Command(BaseCommand):
+    help = "Check syntax, role accounts and domain resolvability of stored addresses in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--all", action="store_true", help="Recheck every address, not only stale ones")
+
+    def handle(self, *args, **kwargs):
+        contacts = Contact.objects.only("id", "email", "verdict", "verified_at").order_by("id")
+        if not kwargs["all"]:
+            stale_before = timezone.now() - VERDICT_TTL
+            contacts = contacts.filter(Q(verified_at__isnull=True) | Q(verified_at__lt=stale_before))
+
+        checker = DomainChecker()
+        last_id, checked = 0, 0
+        while True:
+            batch = list(contacts.filter(id__gt=last_id)[: kwargs["batch_size"]])
+            if not batch:
+                break
+            validate_contacts(batch, checker)
+            last_id = batch[-1].id
+            checked += len(batch)
+            self.stdout.write(f"Проверено адресов: {checked}")
+        self.stdout.write(self.style.SUCCESS(f"Готово, проверено адресов: {checked}"))
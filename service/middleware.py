@@ -0,0 +1,143 @@
+import logging
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "HTTP_X_PROFILE_QUERIES"
+# бюджет для вьюх, которых нет в QUERY_BUDGETS
+DEFAULT_BUDGET = {"queries": 50, "duplicates": 10}
+STACK_SAMPLES = 3
+STACK_DEPTH = 8
+
+_IN_LIST = re.compile(r"\((?:%s, )+%s\)")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Запрос без конкретных значений: одинаковые отпечатки внутри запроса — кандидаты в N+1."""
+    return _IN_LIST.sub("(...)", sql)
+
+
+def _app_stack():
+    # только кадры проекта, без Django и самой мидлвари
+    frames = [
+        frame
+        for frame in traceback.extract_stack()
+        if str(settings.BASE_DIR) in frame.filename
+        and "site-packages" not in frame.filename
+        and frame.filename not in (__file__, str(settings.BASE_DIR / "manage.py"))
+    ]
+    return "".join(traceback.format_list(frames[-STACK_DEPTH:]))
+
+
+class RequestProfile:
+    def __init__(self, budget):
+        self.budget = budget
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+        self.stacks = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started_at
+            self.queries += 1
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            # стек снимается выборочно: на первом запросе сверх бюджета и на первых повторах
+            over_budget = self.queries == self.budget.get("queries", 0) + 1
+            if len(self.stacks) < STACK_SAMPLES and (over_budget or self.fingerprints[key] == 2):
+                self.stacks.append((key, _app_stack()))
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    def violations(self):
+        found = []
+        if "queries" in self.budget and self.queries > self.budget["queries"]:
+            found.append(f"запросов {self.queries} > {self.budget['queries']}")
+        if "db_ms" in self.budget and self.db_time * 1000 > self.budget["db_ms"]:
+            found.append(f"время БД {self.db_time * 1000:.1f} мс > {self.budget['db_ms']} мс")
+        duplicated = sum(count - 1 for count in self.duplicates.values())
+        if "duplicates" in self.budget and duplicated > self.budget["duplicates"]:
+            found.append(f"повторных запросов {duplicated} > {self.budget['duplicates']}")
+        return found
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы, время БД и рендеринга шаблона на вьюху и сверяет их с QUERY_BUDGETS.
+
+    Включается настройкой QUERY_PROFILING или заголовком X-Profile-Queries от staff-пользователя;
+    при QUERY_BUDGET_STRICT превышение бюджета поднимает QueryBudgetExceeded (для тестов).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def enabled(self, request):
+        if getattr(settings, "QUERY_PROFILING", False):
+            return True
+        return request.META.get(PROFILE_HEADER) == "1" and getattr(request.user, "is_staff", False)
+
+    def __call__(self, request):
+        if not self.enabled(request):
+            return self.get_response(request)
+
+        profile = request.query_profile = RequestProfile(DEFAULT_BUDGET)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path_info
+        response["X-Query-Count"] = str(profile.queries)
+        response["X-DB-Time"] = f"{profile.db_time * 1000:.1f}"
+        response["X-Template-Time"] = f"{profile.template_time * 1000:.1f}"
+
+        violations = profile.violations()
+        if violations:
+            self.report(view_name, profile, violations)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, "query_profile", None)
+        if profile is not None:
+            budgets = getattr(settings, "QUERY_BUDGETS", {})
+            profile.budget = budgets.get(request.resolver_match.view_name, DEFAULT_BUDGET)
+
+    def process_template_response(self, request, response):
+        profile = getattr(request, "query_profile", None)
+        if profile is not None:
+            # шаблон рендерится сразу после этого хука, время замыкается post-render колбэком
+            started_at = time.perf_counter()
+
+            def rendered(response):
+                profile.template_time += time.perf_counter() - started_at
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, view_name, profile, violations):
+        top = sorted(profile.duplicates.items(), key=lambda item: -item[1])[:3]
+        message = "Бюджет вьюхи %s превышен: %s" % (view_name, "; ".join(violations))
+        details = "".join(f"\n  x{count}: {sql[:300]}" for sql, count in top)
+        stacks = "".join(f"\n--- {sql[:120]}\n{stack}" for sql, stack in profile.stacks)
+        logger.warning("%s%s%s", message, details, stacks)
+        if getattr(settings, "QUERY_BUDGET_STRICT", False):
+            raise QueryBudgetExceeded(message + details)
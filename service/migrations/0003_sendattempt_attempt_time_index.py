@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sendattempt',
+            index=models.Index(fields=['attempt_time'], name='service_sen_attempt_3ac9ba_idx'),
+        ),
+    ]
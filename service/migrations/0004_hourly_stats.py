@@ -0,0 +1,66 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0003_sendattempt_attempt_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyDomainStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('domain', models.CharField(max_length=255)),
+                ('successful', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_domain_stats', to='service.mailing')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('mailing', 'hour', 'domain'), name='uniq_hourly_domain_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyErrorStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('error_class', models.CharField(max_length=64)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_error_stats', to='service.mailing')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('mailing', 'hour', 'error_class'), name='uniq_hourly_error_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyMailingStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('successful', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='service.mailing')),
+            ],
+            options={
+                'verbose_name': 'Статистика рассылки за час',
+                'verbose_name_plural': 'Статистика рассылок по часам',
+                'ordering': ['-hour'],
+                'constraints': [models.UniqueConstraint(fields=('mailing', 'hour'), name='uniq_hourly_mailing_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0004_hourly_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sendattempt',
+            name='status',
+            field=models.CharField(choices=[('Успешно', 'Успешно'), ('Не успешно', 'Не успешно'), ('Отложено', 'Отложено')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0005_sendattempt_deferred_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledRetry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_number', models.PositiveSmallIntegerField(default=1)),
+                ('next_attempt_at', models.DateTimeField()),
+                ('last_error', models.TextField(blank=True)),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_retries', to='service.mailing')),
+                ('owner', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='service.recipient')),
+            ],
+            options={
+                'verbose_name': 'Повторная отправка',
+                'verbose_name_plural': 'Повторные отправки',
+                'indexes': [models.Index(fields=['next_attempt_at'], name='service_sch_next_at_c6283a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('mailing', 'recipient'), name='uniq_scheduled_retry')],
+            },
+        ),
+    ]
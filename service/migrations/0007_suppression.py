@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0006_scheduledretry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suppression',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(db_index=True, max_length=254)),
+                ('reason', models.CharField(choices=[('Отказ', 'Отказ'), ('Отписка', 'Отписка'), ('Вручную', 'Вручную')], default='Отказ', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Адрес в стоп-листе',
+                'verbose_name_plural': 'Стоп-лист',
+                'constraints': [models.UniqueConstraint(fields=('email', 'owner'), name='uniq_owner_suppression'), models.UniqueConstraint(condition=models.Q(('owner__isnull', True)), fields=('email',), name='uniq_global_suppression')],
+            },
+        ),
+    ]
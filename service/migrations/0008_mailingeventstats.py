@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0007_suppression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailingEventStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('open', 'Открытие'), ('unsubscribe', 'Отписка')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_stats', to='service.mailing')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('mailing', 'event'), name='uniq_mailing_event_stats')],
+            },
+        ),
+    ]
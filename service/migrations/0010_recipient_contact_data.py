@@ -0,0 +1,72 @@
+import hashlib
+
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def _normalize(email):
+    return email.strip().lower()
+
+
+def move_emails_to_contacts(apps, schema_editor):
+    Contact = apps.get_model("service", "Contact")
+    Recipient = apps.get_model("service", "Recipient")
+    Mailing = apps.get_model("service", "Mailing")
+    SendAttempt = apps.get_model("service", "SendAttempt")
+    ScheduledRetry = apps.get_model("service", "ScheduledRetry")
+    Through = Mailing.recipients.through
+
+    emails = {_normalize(email) for email in Recipient.objects.values_list("email", flat=True).iterator()}
+    Contact.objects.bulk_create(
+        [
+            Contact(email=email, email_hash=hashlib.sha256(email.encode()).hexdigest())
+            for email in emails
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    contact_ids = dict(Contact.objects.values_list("email", "id").iterator())
+
+    # один получатель на пару (владелец, адрес); дубли отличались только регистром
+    keepers, duplicates, updates = {}, {}, []
+    rows = Recipient.objects.order_by("id").values_list("id", "owner_id", "email")
+    for recipient_id, owner_id, email in rows.iterator():
+        contact_id = contact_ids[_normalize(email)]
+        keeper = keepers.setdefault((owner_id, contact_id), recipient_id)
+        if keeper == recipient_id:
+            updates.append(Recipient(id=recipient_id, contact_id=contact_id))
+        else:
+            duplicates[recipient_id] = keeper
+    Recipient.objects.bulk_update(updates, ["contact"], batch_size=BATCH_SIZE)
+
+    for duplicate, keeper in duplicates.items():
+        mailing_ids = Through.objects.filter(recipient_id=duplicate).values_list("mailing_id", flat=True)
+        Through.objects.bulk_create(
+            [Through(mailing_id=mailing_id, recipient_id=keeper) for mailing_id in mailing_ids],
+            ignore_conflicts=True,
+        )
+        Through.objects.filter(recipient_id=duplicate).delete()
+        SendAttempt.objects.filter(recipient_id=duplicate).update(recipient_id=keeper)
+        ScheduledRetry.objects.filter(recipient_id=duplicate).delete()
+    Recipient.objects.filter(id__in=duplicates).delete()
+
+
+def restore_emails(apps, schema_editor):
+    Recipient = apps.get_model("service", "Recipient")
+    updates = [
+        Recipient(id=recipient_id, email=email)
+        for recipient_id, email in Recipient.objects.values_list("id", "contact__email").iterator()
+    ]
+    Recipient.objects.bulk_update(updates, ["email"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("service", "0009_contact"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_emails_to_contacts, restore_emails),
+    ]
@@ -0,0 +1,39 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("service", "0010_recipient_contact_data"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="recipient",
+            options={
+                "ordering": ["contact__email"],
+                "verbose_name": "Получатель",
+                "verbose_name_plural": "Получатели",
+            },
+        ),
+        migrations.RemoveField(
+            model_name="recipient",
+            name="email",
+        ),
+        migrations.AlterField(
+            model_name="recipient",
+            name="contact",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="memberships",
+                to="service.contact",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="recipient",
+            constraint=models.UniqueConstraint(
+                fields=("contact", "owner"), name="uniq_recipient_contact_owner"
+            ),
+        ),
+    ]
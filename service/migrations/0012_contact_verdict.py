@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0011_remove_recipient_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='verdict',
+            field=models.CharField(choices=[('Не проверен', 'Не проверен'), ('Корректен', 'Корректен'), ('Ошибка синтаксиса', 'Ошибка синтаксиса'), ('Ролевой адрес', 'Ролевой адрес'), ('Домен не найден', 'Домен не найден')], default='Не проверен', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='verified_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0012_contact_verdict'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SendJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lane', models.CharField(choices=[('transactional', 'Служебные письма'), ('small', 'Небольшие рассылки'), ('bulk', 'Массовые рассылки')], max_length=20)),
+                ('status', models.CharField(choices=[('Ожидает', 'Ожидает'), ('Выполняется', 'Выполняется'), ('Готово', 'Готово')], default='Ожидает', max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='send_jobs', to='service.mailing')),
+                ('owner', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Задание на отправку',
+                'verbose_name_plural': 'Задания на отправку',
+                'indexes': [models.Index(fields=['lane', 'status', 'last_run_at'], name='service_sen_lane_83fa35_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'Готово'), _negated=True), fields=('mailing',), name='uniq_active_send_job')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0013_sendjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('used', models.PositiveIntegerField(default=0)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sendjob',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='mailing',
+            name='status',
+            field=models.CharField(choices=[('Создана', 'Создана'), ('Запущена', 'Запущена'), ('Приостановлена', 'Приостановлена'), ('Завершена', 'Завершена')], default='Создана', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='SendingQuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hourly_limit', models.PositiveIntegerField(blank=True, null=True)),
+                ('daily_limit', models.PositiveIntegerField(blank=True, null=True)),
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sending_quota', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Лимит отправки',
+                'verbose_name_plural': 'Лимиты отправки',
+            },
+        ),
+    ]
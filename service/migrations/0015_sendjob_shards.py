@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0014_sending_quotas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='sendjob',
+            name='uniq_active_send_job',
+        ),
+        migrations.AddField(
+            model_name='sendjob',
+            name='last_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sendjob',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='sendjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'Готово'), _negated=True), fields=('mailing', 'shard'), name='uniq_active_send_job'),
+        ),
+    ]
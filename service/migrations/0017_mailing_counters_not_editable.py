@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0016_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mailing',
+            name='failed_sends',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='mailing',
+            name='successful_sends',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='mailing',
+            name='total_sent',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
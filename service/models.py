@@ -1,22 +1,87 @@
+import hashlib
+
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
-class Recipient(models.Model):
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def email_hash(email):
+    return hashlib.sha256(normalize_email(email).encode()).hexdigest()
+
+
+class ContactManager(models.Manager):
+    def get_or_create_many(self, emails):
+        """Один bulk INSERT ... ON CONFLICT и один SELECT на пачку адресов; возвращает {email: Contact}."""
+        normalized = {normalize_email(email) for email in emails}
+        self.bulk_create(
+            [Contact(email=email, email_hash=email_hash(email)) for email in normalized],
+            ignore_conflicts=True,
+        )
+        return {contact.email: contact for contact in self.filter(email__in=normalized)}
+
+    def get_or_create_for(self, email):
+        return self.get_or_create_many([email])[normalize_email(email)]
+
+
+class Contact(models.Model):
+    VERDICT_CHOICES = [
+        ("Не проверен", "Не проверен"),
+        ("Корректен", "Корректен"),
+        ("Ошибка синтаксиса", "Ошибка синтаксиса"),
+        ("Ролевой адрес", "Ролевой адрес"),
+        ("Домен не найден", "Домен не найден"),
+    ]
+
     email = models.EmailField(unique=True)
+    email_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    verdict = models.CharField(max_length=20, choices=VERDICT_CHOICES, default="Не проверен")
+    verified_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = ContactManager()
+
+    def __str__(self):
+        return self.email
+
+    class Meta:
+        verbose_name = "Адрес"
+        verbose_name_plural = "Адреса"
+
+
+class RecipientManager(models.Manager):
+    # email хранится в Contact, поэтому получатель почти всегда нужен вместе с ним
+    def get_queryset(self):
+        return super().get_queryset().select_related("contact")
+
+
+class Recipient(models.Model):
+    contact = models.ForeignKey(Contact, on_delete=models.PROTECT, related_name="memberships")
     full_name = models.CharField(max_length=255)
     comment = models.TextField(blank=True)
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True
     )
 
+    objects = RecipientManager()
+
+    @property
+    def email(self):
+        return self.contact.email
+
     def __str__(self):
         return self.email
 
     class Meta:
         verbose_name = "Получатель"
         verbose_name_plural = "Получатели"
-        ordering = ["email"]
+        ordering = ["contact__email"]
+        constraints = [
+            models.UniqueConstraint(fields=["contact", "owner"], name="uniq_recipient_contact_owner")
+        ]
 
 
 class Message(models.Model):
@@ -39,6 +104,7 @@ class Mailing(models.Model):
     STATUS_CHOICES = [
         ("Создана", "Создана"),
         ("Запущена", "Запущена"),
+        ("Приостановлена", "Приостановлена"),
         ("Завершена", "Завершена"),
     ]
 
@@ -50,20 +116,35 @@ class Mailing(models.Model):
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True
     )
-    total_sent = models.PositiveIntegerField(default=0)
-    successful_sends = models.PositiveIntegerField(default=0)
-    failed_sends = models.PositiveIntegerField(default=0)
+    # счётчики меняются только приращениями F() из воркеров, формы их не редактируют
+    total_sent = models.PositiveIntegerField(default=0, editable=False)
+    successful_sends = models.PositiveIntegerField(default=0, editable=False)
+    failed_sends = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.message.subject} - {self.status}"
 
+    def update_status(self):
+        if self.status == "Создана":
+            self.status = "Запущена"
+            self.first_sent_at = self.first_sent_at or timezone.now()
+
+        if self.end_at and timezone.now() > self.end_at:
+            self.status = "Завершена"
+
+        self.save(update_fields=["status", "first_sent_at"])
+
     class Meta:
         verbose_name = "Рассылка"
         verbose_name_plural = "Рассылки"
 
 
 class SendAttempt(models.Model):
-    STATUS_CHOICES = [("Успешно", "Успешно"), ("Не успешно", "Не успешно")]
+    STATUS_CHOICES = [
+        ("Успешно", "Успешно"),
+        ("Не успешно", "Не успешно"),
+        ("Отложено", "Отложено"),
+    ]
 
     attempt_time = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
@@ -79,3 +160,223 @@ class SendAttempt(models.Model):
 
     def __str__(self):
         return f"Attempt: {self.attempt_time} - {self.status}"
+
+    class Meta:
+        indexes = [models.Index(fields=["attempt_time"])]
+
+
+class HourlyMailingStats(models.Model):
+    mailing = models.ForeignKey(
+        Mailing, on_delete=models.CASCADE, related_name="hourly_stats"
+    )
+    hour = models.DateTimeField()
+    successful = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Статистика рассылки за час"
+        verbose_name_plural = "Статистика рассылок по часам"
+        ordering = ["-hour"]
+        constraints = [
+            models.UniqueConstraint(fields=["mailing", "hour"], name="uniq_hourly_mailing_stats")
+        ]
+
+
+class HourlyDomainStats(models.Model):
+    mailing = models.ForeignKey(
+        Mailing, on_delete=models.CASCADE, related_name="hourly_domain_stats"
+    )
+    hour = models.DateTimeField()
+    domain = models.CharField(max_length=255)
+    successful = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["mailing", "hour", "domain"], name="uniq_hourly_domain_stats"
+            )
+        ]
+
+
+class HourlyErrorStats(models.Model):
+    mailing = models.ForeignKey(
+        Mailing, on_delete=models.CASCADE, related_name="hourly_error_stats"
+    )
+    hour = models.DateTimeField()
+    error_class = models.CharField(max_length=64)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["mailing", "hour", "error_class"], name="uniq_hourly_error_stats"
+            )
+        ]
+
+
+class StatsWatermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class ScheduledRetry(models.Model):
+    mailing = models.ForeignKey(
+        Mailing, on_delete=models.CASCADE, related_name="scheduled_retries"
+    )
+    recipient = models.ForeignKey(Recipient, on_delete=models.CASCADE)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True
+    )
+    attempt_number = models.PositiveSmallIntegerField(default=1)
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Повторная отправка"
+        verbose_name_plural = "Повторные отправки"
+        indexes = [models.Index(fields=["next_attempt_at"])]
+        constraints = [
+            models.UniqueConstraint(fields=["mailing", "recipient"], name="uniq_scheduled_retry")
+        ]
+
+
+class Suppression(models.Model):
+    REASON_CHOICES = [
+        ("Отказ", "Отказ"),
+        ("Отписка", "Отписка"),
+        ("Вручную", "Вручную"),
+    ]
+
+    email = models.EmailField(db_index=True)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True
+    )
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default="Отказ")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.email
+
+    class Meta:
+        verbose_name = "Адрес в стоп-листе"
+        verbose_name_plural = "Стоп-лист"
+        constraints = [
+            models.UniqueConstraint(fields=["email", "owner"], name="uniq_owner_suppression"),
+            models.UniqueConstraint(
+                fields=["email"],
+                condition=models.Q(owner__isnull=True),
+                name="uniq_global_suppression",
+            ),
+        ]
+
+
+class MailingEventStats(models.Model):
+    EVENT_CHOICES = [("open", "Открытие"), ("unsubscribe", "Отписка")]
+
+    mailing = models.ForeignKey(
+        Mailing, on_delete=models.CASCADE, related_name="event_stats"
+    )
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["mailing", "event"], name="uniq_mailing_event_stats")
+        ]
+
+
+class SendJob(models.Model):
+    LANE_CHOICES = [
+        ("transactional", "Служебные письма"),
+        ("small", "Небольшие рассылки"),
+        ("bulk", "Массовые рассылки"),
+    ]
+    STATUS_CHOICES = [
+        ("Ожидает", "Ожидает"),
+        ("Выполняется", "Выполняется"),
+        ("Готово", "Готово"),
+    ]
+
+    mailing = models.ForeignKey(
+        Mailing, on_delete=models.CASCADE, related_name="send_jobs"
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True
+    )
+    lane = models.CharField(max_length=20, choices=LANE_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Ожидает")
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    # массовая рассылка делится на шарды — непересекающиеся диапазоны id получателей (cursor, last_id]
+    shard = models.PositiveSmallIntegerField(default=0)
+    # id последнего обработанного получателя: задание идёт срезами по возрастанию id
+    cursor = models.BigIntegerField(default=0)
+    # граница диапазона шарда; у последнего шарда её нет
+    last_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # приостановленное по лимиту задание ждёт начала следующего окна
+    not_before = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.mailing_id} ({self.lane}) - {self.status}"
+
+    class Meta:
+        verbose_name = "Задание на отправку"
+        verbose_name_plural = "Задания на отправку"
+        indexes = [models.Index(fields=["lane", "status", "last_run_at"])]
+        constraints = [
+            # у рассылки не больше одного незавершённого задания на шард
+            models.UniqueConstraint(
+                fields=["mailing", "shard"],
+                condition=~models.Q(status="Готово"),
+                name="uniq_active_send_job",
+            ),
+        ]
+
+
+class SendingQuota(models.Model):
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="sending_quota"
+    )
+    # пустое значение — лимит по умолчанию из настроек
+    hourly_limit = models.PositiveIntegerField(null=True, blank=True)
+    daily_limit = models.PositiveIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.owner}: {self.hourly_limit or '—'}/ч, {self.daily_limit or '—'}/сут"
+
+    class Meta:
+        verbose_name = "Лимит отправки"
+        verbose_name_plural = "Лимиты отправки"
+
+
+class QuotaCounter(models.Model):
+    """Счётчик окна лимита на случай недоступности Redis."""
+
+    key = models.CharField(max_length=100, unique=True)
+    used = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class IdempotencyKey(models.Model):
+    """Ответ на запуск рассылок по API: повтор с тем же ключом получает его же, а не новые задания."""
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # отпечаток тела: тот же ключ с другим набором рассылок — ошибка клиента, а не повтор
+    request_hash = models.CharField(max_length=64)
+    response = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        indexes = [models.Index(fields=["owner", "created_at"])]
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "key"], name="uniq_idempotency_key")
+        ]
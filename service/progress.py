@@ -0,0 +1,119 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+# запись в Redis раз в столько обработанных получателей, а не на каждое письмо
+PROGRESS_EVERY = getattr(settings, "MAILING_PROGRESS_EVERY", 100)
+PROGRESS_TTL = 24 * 60 * 60
+COUNTERS = ("processed", "successful", "failed", "deferred", "suppressed", "invalid")
+
+
+def progress_key(mailing_id):
+    return f"mailing:progress:{mailing_id}"
+
+
+def _counter_key(mailing_id, name):
+    return f"{progress_key(mailing_id)}:{name}"
+
+
+def _keys(mailing_id):
+    return [progress_key(mailing_id), _counter_key(mailing_id, "updated_at")] + [
+        _counter_key(mailing_id, name) for name in COUNTERS
+    ]
+
+
+class ProgressTracker:
+    """Прогресс рассылки в кеше: описание одним ключом, счётчики — отдельными.
+
+    Части одной рассылки могут отправлять несколько воркеров сразу, поэтому счётчики
+    увеличиваются через incr, а не перезаписываются целиком.
+    """
+
+    def __init__(self, mailing, total, every=PROGRESS_EVERY, resume=False):
+        self.mailing_id = mailing.pk
+        self.every = every
+        self.pending = Counter()
+        if resume:
+            # задание из очереди идёт срезами: продолжаем общий счёт, а не начинаем заново
+            meta = cache.get(progress_key(mailing.pk))
+            if meta is not None and not meta["finished"]:
+                self.meta = meta
+                return
+        now = time.time()
+        self.meta = {
+            "mailing": mailing.pk,
+            "owner": mailing.owner_id,
+            "total": total,
+            "started_at": now,
+            "finished": False,
+        }
+        cache.set_many(
+            {
+                progress_key(mailing.pk): self.meta,
+                _counter_key(mailing.pk, "updated_at"): now,
+                **{_counter_key(mailing.pk, name): 0 for name in COUNTERS},
+            },
+            PROGRESS_TTL,
+        )
+
+    def advance(self, **counts):
+        for name, value in counts.items():
+            self.pending[name] += value
+            self.pending["processed"] += value
+        if self.pending["processed"] >= self.every:
+            self.flush()
+
+    def flush(self):
+        for name, value in self.pending.items():
+            if not value:
+                continue
+            key = _counter_key(self.mailing_id, name)
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                # счётчик истёк вместе с TTL — начинаем его заново
+                cache.set(key, value, PROGRESS_TTL)
+        self.pending.clear()
+        cache.set(_counter_key(self.mailing_id, "updated_at"), time.time(), PROGRESS_TTL)
+
+    def finish(self):
+        self.flush()
+        self.meta["finished"] = True
+        cache.set(progress_key(self.mailing_id), self.meta, PROGRESS_TTL)
+
+
+def _assemble(mailing_id, values):
+    meta = values.get(progress_key(mailing_id))
+    if meta is None:
+        return None
+    return {
+        **meta,
+        **{name: values.get(_counter_key(mailing_id, name), 0) for name in COUNTERS},
+        "updated_at": values.get(_counter_key(mailing_id, "updated_at"), meta["started_at"]),
+    }
+
+
+def describe(state):
+    """Добавляет к сырому состоянию скорость, ETA и долю ошибок."""
+    if state is None:
+        return None
+    elapsed = max(state["updated_at"] - state["started_at"], 0.001)
+    processed = state["processed"]
+    throughput = processed / elapsed
+    remaining = max(state["total"] - processed, 0)
+    return {
+        **state,
+        "throughput": round(throughput, 2),
+        "eta_seconds": round(remaining / throughput) if throughput and not state["finished"] else 0,
+        "error_rate": round(state["failed"] / processed, 4) if processed else 0.0,
+    }
+
+
+def read_progress(mailing_id):
+    return describe(_assemble(mailing_id, cache.get_many(_keys(mailing_id))))
+
+
+async def aread_progress(mailing_id):
+    return describe(_assemble(mailing_id, await cache.aget_many(_keys(mailing_id))))
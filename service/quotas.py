@@ -0,0 +1,132 @@
+import logging
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import QuotaCounter, SendingQuota
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# лимиты владельца по умолчанию; None — без ограничений
+DEFAULT_HOURLY_QUOTA = getattr(settings, "MAILING_HOURLY_QUOTA", None)
+DEFAULT_DAILY_QUOTA = getattr(settings, "MAILING_DAILY_QUOTA", None)
+# сколько писем резервируется за одно обращение к счётчику
+QUOTA_CHUNK = getattr(settings, "MAILING_QUOTA_CHUNK", 500)
+
+
+def quota_limits(owner_id):
+    quota = SendingQuota.objects.filter(owner_id=owner_id).first() if owner_id else None
+    return {
+        "hour": (quota and quota.hourly_limit) or DEFAULT_HOURLY_QUOTA,
+        "day": (quota and quota.daily_limit) or DEFAULT_DAILY_QUOTA,
+    }
+
+
+def _windows(owner_id, limits, now):
+    """[(ключ счётчика, лимит, начало следующего окна)] для заданных лимитов."""
+    local = timezone.localtime(now)
+    hour_start = local.replace(minute=0, second=0, microsecond=0)
+    day_start = hour_start.replace(hour=0)
+    windows = []
+    if limits["hour"]:
+        key = f"quota:{owner_id}:hour:{hour_start:%Y%m%d%H}"
+        windows.append((key, limits["hour"], hour_start + timedelta(hours=1)))
+    if limits["day"]:
+        key = f"quota:{owner_id}:day:{day_start:%Y%m%d}"
+        windows.append((key, limits["day"], day_start + timedelta(days=1)))
+    return windows
+
+
+def _incr_redis(windows, amount):
+    with get_redis().pipeline() as pipe:
+        for key, _, resets_at in windows:
+            pipe.incrby(key, amount)
+            pipe.expireat(key, resets_at + timedelta(hours=1))
+        return pipe.execute()[::2]
+
+
+def _incr_db(windows, amount):
+    now = timezone.now()
+    with transaction.atomic():
+        QuotaCounter.objects.filter(expires_at__lt=now).delete()
+        QuotaCounter.objects.bulk_create(
+            [QuotaCounter(key=key, expires_at=resets_at + timedelta(hours=1)) for key, _, resets_at in windows],
+            ignore_conflicts=True,
+        )
+        keys = [key for key, _, _ in windows]
+        QuotaCounter.objects.filter(key__in=keys).update(used=F("used") + amount)
+        used = dict(QuotaCounter.objects.filter(key__in=keys).values_list("key", "used"))
+    return [used[key] for key in keys]
+
+
+def _decr(windows, amount):
+    try:
+        with get_redis().pipeline() as pipe:
+            for key, _, _ in windows:
+                pipe.decrby(key, amount)
+            pipe.execute()
+    except redis.RedisError:
+        QuotaCounter.objects.filter(key__in=[key for key, _, _ in windows]).update(used=F("used") - amount)
+
+
+class OwnerQuota:
+    """Резерв писем владельца: счётчики трогаются раз на пачку, а не на каждое письмо."""
+
+    def __init__(self, owner_id, chunk=QUOTA_CHUNK):
+        self.owner_id = owner_id
+        self.chunk = chunk
+        self.limits = quota_limits(owner_id)
+        self.allowance = 0
+        self.windows = []
+        self.exhausted = []
+
+    @property
+    def unlimited(self):
+        return not (self.limits["hour"] or self.limits["day"])
+
+    def reserve(self, amount):
+        """Резервирует до amount писем во всех окнах сразу; возвращает, сколько выдано."""
+        if self.unlimited or amount <= 0:
+            self.allowance += max(amount, 0)
+            return max(amount, 0)
+
+        self.windows = _windows(self.owner_id, self.limits, timezone.now())
+        try:
+            used = _incr_redis(self.windows, amount)
+        except redis.RedisError:
+            logger.warning("Redis недоступен, лимиты владельца %s считаются в БД", self.owner_id)
+            used = _incr_db(self.windows, amount)
+
+        # сверх лимита выданное сразу возвращается; одновременные резервы могут недодать, но не передать
+        overflow = min(max(max(count - limit for count, (_, limit, _) in zip(used, self.windows)), 0), amount)
+        if overflow:
+            _decr(self.windows, overflow)
+            self.exhausted = [
+                resets_at for count, (_, limit, resets_at) in zip(used, self.windows) if count - overflow >= limit
+            ] or self.exhausted
+        granted = amount - overflow
+        self.allowance += granted
+        return granted
+
+    def take(self, amount):
+        """Берёт письма из уже зарезервированного, при нехватке дозапрашивает не меньше chunk."""
+        if self.allowance < amount:
+            self.reserve(max(amount - self.allowance, self.chunk))
+        granted = min(amount, self.allowance)
+        self.allowance -= granted
+        return granted
+
+    def release(self):
+        """Возвращает неиспользованный резерв, например, если адреса отсеялись стоп-листом."""
+        if self.allowance and not self.unlimited and self.windows:
+            _decr(self.windows, self.allowance)
+        self.allowance = 0
+
+    def resets_at(self):
+        """Когда снова появится лимит: начало ближайшего окна, которое упёрлось в лимит."""
+        return max(self.exhausted) if self.exhausted else timezone.now()
@@ -0,0 +1,119 @@
+import random
+import smtplib
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Mailing, Recipient, ScheduledRetry
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+MAX_RETRIES = getattr(settings, "MAILING_MAX_RETRIES", 6)
+RETRY_BASE_DELAY = getattr(settings, "MAILING_RETRY_BASE_DELAY", 60)
+RETRY_MAX_DELAY = getattr(settings, "MAILING_RETRY_MAX_DELAY", 6 * 60 * 60)
+# сколько повтор считается занятым обработчиком, который его забрал
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def classify_exception(exc):
+    """4xx и сетевые ошибки — временные, 5xx и битые адреса — постоянные."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in exc.recipients.values()]
+        return TRANSIENT if codes and all(400 <= code < 500 for code in codes) else PERMANENT
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return TRANSIENT if 400 <= exc.smtp_code < 500 else PERMANENT
+    # SMTPServerDisconnected, ConnectionResetError, таймауты
+    if isinstance(exc, OSError):
+        return TRANSIENT
+    return PERMANENT
+
+
+def retry_delay(attempt_number):
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt_number - 1))
+    # джиттер, чтобы отложенные письма не возвращались одной волной
+    return timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+def can_retry(attempt_number):
+    return attempt_number <= MAX_RETRIES
+
+
+def schedule_retries(mailing, owner, failures, retry_counts=None, resume_at=None):
+    """failures — список (recipient, error); номер попытки берётся из retry_counts.
+
+    resume_at — пауза до заданного времени (лимит владельца): номер попытки не растёт.
+    """
+    retry_counts = retry_counts or {}
+    now = timezone.now()
+    retries = []
+    for recipient, error in failures:
+        if resume_at is not None:
+            attempt_number = retry_counts.get(recipient.pk, 0)
+            next_attempt_at = resume_at
+        else:
+            attempt_number = retry_counts.get(recipient.pk, 0) + 1
+            next_attempt_at = now + retry_delay(attempt_number)
+        retries.append(
+            ScheduledRetry(
+                mailing=mailing,
+                recipient=recipient,
+                owner=owner,
+                attempt_number=attempt_number,
+                next_attempt_at=next_attempt_at,
+                last_error=error,
+            )
+        )
+    ScheduledRetry.objects.bulk_create(
+        retries,
+        update_conflicts=True,
+        unique_fields=["mailing", "recipient"],
+        update_fields=["attempt_number", "next_attempt_at", "last_error"],
+    )
+
+
+def process_due_retries(limit=200):
+    """Забирает созревшие повторы и отправляет их; возвращает число обработанных.
+
+    Повторы сначала арендуются короткой транзакцией: next_attempt_at сдвигается на время аренды.
+    Отправка идёт уже без блокировок; если воркер упадёт, повторы вернутся, когда аренда истечёт.
+    """
+    from .services import send_mailing
+
+    leased_until = timezone.now() + CLAIM_TIMEOUT
+    with transaction.atomic():
+        # skip_locked позволяет запускать несколько обработчиков параллельно
+        due = list(
+            ScheduledRetry.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("owner")
+            .filter(next_attempt_at__lte=timezone.now())
+            .order_by("next_attempt_at")[:limit]
+        )
+        if not due:
+            return 0
+        ScheduledRetry.objects.filter(pk__in=[retry.pk for retry in due]).update(next_attempt_at=leased_until)
+
+    by_mailing = defaultdict(dict)
+    owners = {}
+    for retry in due:
+        by_mailing[retry.mailing_id][retry.recipient_id] = retry.attempt_number
+        owners[retry.mailing_id] = retry.owner
+
+    mailings = Mailing.objects.select_related("message").in_bulk(by_mailing)
+    for mailing_id, retry_counts in by_mailing.items():
+        mailing = mailings.get(mailing_id)
+        if mailing is not None and mailing.status != "Завершена":
+            send_mailing(
+                mailing,
+                Recipient.objects.filter(pk__in=retry_counts),
+                owner=owners[mailing_id],
+                retry_counts=retry_counts,
+            )
+        # аренда снимается после отправки рассылки; заново отложенные send_mailing уже перенёс на другое время
+        ScheduledRetry.objects.filter(
+            mailing_id=mailing_id, recipient_id__in=retry_counts, next_attempt_at=leased_until
+        ).delete()
+    return len(due)
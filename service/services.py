@@ -0,0 +1,341 @@
+import smtplib
+from collections import Counter, OrderedDict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Value, When
+from django.utils.html import format_html, linebreaks
+from django.utils.safestring import mark_safe
+
+from .backends import get_backend
+from .models import Mailing, SendAttempt
+from .progress import ProgressTracker
+from .quotas import OwnerQuota
+from .retries import TRANSIENT, can_retry, classify_exception, schedule_retries
+from .suppression import SuppressionSet, is_hard_bounce, normalize_email, suppress
+from .tracking import tracking_urls
+from .validation import split_sendable
+
+# сколько писем одного домена уходит подряд через одно соединение
+DOMAIN_BATCH_SIZE = getattr(settings, "MAILING_DOMAIN_BATCH_SIZE", 50)
+# после стольких ошибок подряд домен считается отказывающим
+DOMAIN_FAILURE_THRESHOLD = getattr(settings, "MAILING_DOMAIN_FAILURE_THRESHOLD", 3)
+DOMAIN_FAILURE_TTL = getattr(settings, "MAILING_DOMAIN_FAILURE_TTL", 15 * 60)
+
+DEFERRED_RESPONSE = "Домен временно отклоняет письма, отправка отложена."
+QUOTA_RESPONSE = "Исчерпан лимит отправки владельца, отправка отложена."
+
+# коды, которыми сервер отказывает всему домену, а не конкретному адресу
+_DOMAIN_LEVEL_CODES = {421, 450, 451, 452}
+
+
+def recipient_domain(email):
+    return email.rsplit("@", 1)[-1].lower()
+
+
+def interleave_by_domain(recipients, batch_size=DOMAIN_BATCH_SIZE):
+    """Группирует получателей по домену и выдаёт пачки по кругу: домен за доменом."""
+    groups = OrderedDict()
+    for recipient in recipients:
+        groups.setdefault(recipient_domain(recipient.email), []).append(recipient)
+
+    queue = deque((domain, members, 0) for domain, members in groups.items())
+    while queue:
+        domain, members, offset = queue.popleft()
+        yield domain, members[offset : offset + batch_size]
+        if offset + batch_size < len(members):
+            queue.append((domain, members, offset + batch_size))
+
+
+def is_domain_failure(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return any(code in _DOMAIN_LEVEL_CODES for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code in _DOMAIN_LEVEL_CODES
+    # обрыв соединения, отказ в подключении, таймаут (SMTPException тоже OSError)
+    return isinstance(exc, OSError)
+
+
+class DomainHealth:
+    """Счётчик ошибок по доменам; отказавший домен помечается в кеше для всех процессов."""
+
+    def __init__(self):
+        self.failures = Counter()
+        self.down = set()
+
+    @staticmethod
+    def cache_key(domain):
+        return f"mailing:domain_down:{domain}"
+
+    def is_down(self, domain):
+        if domain in self.down:
+            return True
+        if cache.get(self.cache_key(domain)):
+            self.down.add(domain)
+            return True
+        return False
+
+    def record_success(self, domain):
+        self.failures[domain] = 0
+
+    def record_failure(self, domain):
+        self.failures[domain] += 1
+        if self.failures[domain] >= DOMAIN_FAILURE_THRESHOLD:
+            self.down.add(domain)
+            cache.set(self.cache_key(domain), True, DOMAIN_FAILURE_TTL)
+
+
+def build_email(mailing, recipient):
+    """Письмо получателю со ссылкой отписки и пикселем открытия, подписанными под него."""
+    message = mailing.message
+    urls = tracking_urls(mailing, recipient)
+    email = EmailMultiAlternatives(
+        message.subject,
+        f"{message.body}\n\nОтписаться от рассылки: {urls['unsubscribe']}",
+        settings.DEFAULT_FROM_EMAIL,
+        [recipient.email],
+        headers={
+            "List-Unsubscribe": f"<{urls['unsubscribe']}>",
+            "List-Unsubscribe-Post": "List-Unsubscribe=One-Click",
+        },
+    )
+    email.attach_alternative(
+        format_html(
+            '{}<p><a href="{}">Отписаться от рассылки</a></p><img src="{}" width="1" height="1" alt="">',
+            mark_safe(linebreaks(message.body, autoescape=True)),
+            urls["unsubscribe"],
+            urls["open"],
+        ),
+        "text/html",
+    )
+    return email
+
+
+def _attempt(mailing, recipient, owner, status, server_response):
+    return SendAttempt(
+        mailing=mailing,
+        status=status,
+        server_response=server_response,
+        recipient=recipient,
+        owner=owner,
+        message=mailing.message,
+    )
+
+
+class BatchOutcome:
+    """Попытки пачки и получатели, которых нужно поставить на повтор."""
+
+    def __init__(self, mailing, owner, retry_counts):
+        self.mailing = mailing
+        self.owner = owner
+        self.retry_counts = retry_counts
+        self.attempts = []
+        self.retries = []
+        self.paused = []
+        self.bounced = []
+
+    def success(self, recipient):
+        self.attempts.append(
+            _attempt(self.mailing, recipient, self.owner, "Успешно", "Письмо отправлено успешно.")
+        )
+
+    def failure(self, recipient, error, transient, hard_bounce=False):
+        if hard_bounce:
+            self.bounced.append(recipient.email)
+        attempt_number = self.retry_counts.get(recipient.pk, 0) + 1
+        if transient and can_retry(attempt_number):
+            self.attempts.append(_attempt(self.mailing, recipient, self.owner, "Отложено", error))
+            self.retries.append((recipient, error))
+        else:
+            self.attempts.append(_attempt(self.mailing, recipient, self.owner, "Не успешно", error))
+
+    def defer(self, recipient, response=DEFERRED_RESPONSE):
+        self.failure(recipient, response, transient=True)
+
+    def pause(self, recipient, response):
+        """Отложить без траты попытки: письмо не отправлялось, лимит повторов не расходуется."""
+        self.attempts.append(_attempt(self.mailing, recipient, self.owner, "Отложено", response))
+        self.paused.append((recipient, response))
+
+
+def _send_batch(outcome, domain, batch, health):
+    backend = get_backend()
+
+    try:
+        backend.open()
+    except Exception as e:
+        health.record_failure(domain)
+        for recipient in batch:
+            outcome.failure(recipient, str(e), classify_exception(e) == TRANSIENT)
+        return
+
+    chunk_size = backend.chunk_size or len(batch)
+    try:
+        for start in range(0, len(batch), chunk_size):
+            chunk = batch[start : start + chunk_size]
+            if domain in health.down:
+                for recipient in chunk:
+                    outcome.defer(recipient)
+                continue
+            try:
+                results = backend.send_messages([build_email(outcome.mailing, recipient) for recipient in chunk])
+            except Exception as e:
+                # провайдер не принял пачку целиком
+                results = [e] * len(chunk)
+            for recipient, error in zip(chunk, results):
+                if error is None:
+                    outcome.success(recipient)
+                    health.record_success(domain)
+                    continue
+                outcome.failure(recipient, str(error), classify_exception(error) == TRANSIENT, is_hard_bounce(error))
+                if is_domain_failure(error):
+                    health.record_failure(domain)
+    finally:
+        backend.close()
+
+
+def send_mailing(mailing, recipients=None, owner=None, retry_counts=None, progress=None, quota=None):
+    """retry_counts — {recipient_id: номер уже сделанной попытки} для повторов из планировщика.
+
+    progress — общий ProgressTracker, если рассылка отправляется по частям; завершает его вызывающий.
+    quota — OwnerQuota с заранее сделанным резервом; иначе лимит владельца резервируется по пачкам.
+    """
+    if recipients is None:
+        recipients = mailing.recipients.all()
+
+    recipients = list(recipients.only("id", "contact__email", "contact__verdict", "contact__verified_at"))
+    health = DomainHealth()
+    suppressed = SuppressionSet(mailing.owner_id)
+    own_progress = progress is None
+    if own_progress:
+        progress = ProgressTracker(mailing, len(recipients))
+    quota = quota or OwnerQuota(mailing.owner_id)
+    result = Counter(total=0, successful=0, failed=0, deferred=0, suppressed=0, invalid=0, over_quota=0)
+
+    # заведомо плохие адреса отсекаются до SMTP: синтаксис, ролевые ящики, мёртвые домены
+    recipients, rejected = split_sendable(recipients)
+    if rejected:
+        result["invalid"] = len(rejected)
+        progress.advance(invalid=len(rejected))
+
+    try:
+        for domain, batch in interleave_by_domain(recipients):
+            blocked = suppressed.filter_suppressed(recipient.email for recipient in batch)
+            if blocked:
+                allowed = [recipient for recipient in batch if normalize_email(recipient.email) not in blocked]
+                result["suppressed"] += len(batch) - len(allowed)
+                progress.advance(suppressed=len(batch) - len(allowed))
+                batch = allowed
+                if not batch:
+                    continue
+
+            outcome = BatchOutcome(mailing, owner, retry_counts or {})
+            if health.is_down(domain):
+                for recipient in batch:
+                    outcome.defer(recipient)
+            else:
+                granted = quota.take(len(batch))
+                # сверх лимита письма ждут нового окна; это пауза, а не неудачная попытка
+                for recipient in batch[granted:]:
+                    outcome.pause(recipient, QUOTA_RESPONSE)
+                result["over_quota"] += len(batch) - granted
+                if granted:
+                    _send_batch(outcome, domain, batch[:granted], health)
+
+            statuses = Counter(attempt.status for attempt in outcome.attempts)
+            batch_counts = {
+                "successful": statuses["Успешно"],
+                "failed": statuses["Не успешно"],
+                "deferred": statuses["Отложено"],
+            }
+            with transaction.atomic():
+                SendAttempt.objects.bulk_create(outcome.attempts)
+                _add_to_counters(mailing, batch_counts["successful"], batch_counts["failed"])
+            if outcome.retries:
+                schedule_retries(mailing, owner, outcome.retries, retry_counts)
+            if outcome.paused:
+                schedule_retries(mailing, owner, outcome.paused, retry_counts, resume_at=quota.resets_at())
+            if outcome.bounced:
+                # жёсткий отказ адреса касается всех владельцев
+                suppress(outcome.bounced)
+
+            result.update(batch_counts)
+            progress.advance(**batch_counts)
+    finally:
+        # резерв возвращается и прогресс закрывается, даже если пачка упала
+        quota.release()
+        if own_progress:
+            progress.finish()
+    result["total"] = result["successful"] + result["failed"]
+
+    if result["over_quota"]:
+        mailing.status = "Приостановлена"
+    elif mailing.status == "Приостановлена" and result["total"]:
+        mailing.status = "Запущена"
+    # счётчики уже в базе, сохраняется только статус: полный save затёр бы приращения других воркеров
+    mailing.save(update_fields=["status"])
+
+    return result
+
+
+def _add_to_counters(mailing, successful, failed):
+    """Приращение счётчиков рассылки на пачку; вызывается в одной транзакции со вставкой попыток."""
+    if not successful and not failed:
+        return
+    Mailing.objects.filter(pk=mailing.pk).update(
+        total_sent=F("total_sent") + successful + failed,
+        successful_sends=F("successful_sends") + successful,
+        failed_sends=F("failed_sends") + failed,
+    )
+    mailing.total_sent += successful + failed
+    mailing.successful_sends += successful
+    mailing.failed_sends += failed
+
+
+def reconcile_mailing_counters(batch_size=500):
+    """Сверяет счётчики всех рассылок с SendAttempt; возвращает число исправленных рассылок.
+
+    Попытки группируются одним запросом вместе с текущими счётчиками, поэтому расхождение
+    считается по согласованному снимку и прибавляется через F(): отправка, идущая параллельно,
+    своих приращений не теряет.
+    """
+    rows = (
+        SendAttempt.objects.order_by()
+        .values("mailing", "mailing__total_sent", "mailing__successful_sends", "mailing__failed_sends")
+        .annotate(
+            successful=Count("id", filter=Q(status="Успешно")),
+            failed=Count("id", filter=Q(status="Не успешно")),
+        )
+    )
+    drift = {}
+    for row in rows.iterator():
+        counts = (
+            row["successful"] + row["failed"] - row["mailing__total_sent"],
+            row["successful"] - row["mailing__successful_sends"],
+            row["failed"] - row["mailing__failed_sends"],
+        )
+        if any(counts):
+            drift[row["mailing"]] = counts
+
+    ids = list(drift)
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+
+        def delta(index):
+            return Case(*(When(pk=pk, then=Value(drift[pk][index])) for pk in chunk), default=Value(0))
+
+        Mailing.objects.filter(pk__in=chunk).update(
+            total_sent=F("total_sent") + delta(0),
+            successful_sends=F("successful_sends") + delta(1),
+            failed_sends=F("failed_sends") + delta(2),
+        )
+
+    # рассылки без единой попытки, но с ненулевыми счётчиками
+    reset = (
+        Mailing.objects.filter(~Exists(SendAttempt.objects.filter(mailing=OuterRef("pk"))))
+        .exclude(total_sent=0, successful_sends=0, failed_sends=0)
+        .update(total_sent=0, successful_sends=0, failed_sends=0)
+    )
+    return len(drift) + reset
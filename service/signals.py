@@ -0,0 +1,20 @@
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from service.models import Mailing, Message, Recipient
+from service.versions import bump_data_version
+
+
+# удаление версию не меняет: обработчик post_delete отключил бы быстрое каскадное удаление,
+# поэтому версию поднимают сами пути удаления (вьюхи, админка, API, audience)
+@receiver(post_save, sender=Recipient)
+@receiver(post_save, sender=Message)
+@receiver(post_save, sender=Mailing)
+def owner_data_changed(sender, instance, **kwargs):
+    bump_data_version(instance.owner_id)
+
+
+@receiver(m2m_changed, sender=Mailing.recipients.through)
+def mailing_recipients_changed(sender, instance, action, **kwargs):
+    if action.startswith("post_"):
+        bump_data_version(instance.owner_id)
@@ -0,0 +1,84 @@
+import hashlib
+import math
+import smtplib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+
+from .models import Suppression, normalize_email
+
+# до этого размера стоп-лист держим точным множеством, дальше — фильтром Блума
+SUPPRESSION_SET_LIMIT = getattr(settings, "MAILING_SUPPRESSION_SET_LIMIT", 200_000)
+BLOOM_ERROR_RATE = 0.001
+BLOOM_CACHE_TIMEOUT = 60 * 60
+
+HARD_BOUNCE_CODES = {550, 551, 553}
+
+
+def is_hard_bounce(exc):
+    if not isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return False
+    codes = [code for code, _ in exc.recipients.values()]
+    return bool(codes) and all(code in HARD_BOUNCE_CODES for code in codes)
+
+
+def suppress(emails, owner_id=None, reason="Отказ"):
+    Suppression.objects.bulk_create(
+        [Suppression(email=normalize_email(email), owner_id=owner_id, reason=reason) for email in emails],
+        ignore_conflicts=True,
+    )
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE, bits=None):
+        capacity = max(capacity, 1)
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2) + 1
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class SuppressionSet:
+    """Стоп-лист владельца (вместе с глобальным), загружается один раз на прогон рассылки."""
+
+    def __init__(self, owner_id=None):
+        self.queryset = Suppression.objects.filter(Q(owner__isnull=True) | Q(owner_id=owner_id))
+        stats = self.queryset.aggregate(count=Count("id"), last_id=Max("id"))
+        self.emails = None
+        self.bloom = None
+
+        if stats["count"] <= SUPPRESSION_SET_LIMIT:
+            self.emails = set(self.queryset.values_list("email", flat=True).iterator())
+            return
+
+        # фильтр собирается один раз и лежит в Redis, пока стоп-лист не изменился
+        cache_key = f"suppression:bloom:{owner_id}:{stats['count']}:{stats['last_id']}"
+        bits = cache.get(cache_key)
+        self.bloom = BloomFilter(stats["count"], bits=bits)
+        if bits is None:
+            for email in self.queryset.values_list("email", flat=True).iterator():
+                self.bloom.add(email)
+            cache.set(cache_key, self.bloom.bits, BLOOM_CACHE_TIMEOUT)
+
+    def filter_suppressed(self, emails):
+        """Возвращает подмножество адресов из стоп-листа; один запрос на пачку только для Блума."""
+        normalized = {normalize_email(email) for email in emails}
+        if self.emails is not None:
+            return normalized & self.emails
+
+        candidates = [email for email in normalized if email in self.bloom]
+        if not candidates:
+            return set()
+        return set(self.queryset.filter(email__in=candidates).values_list("email", flat=True))
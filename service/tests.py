@@ -0,0 +1,1082 @@
+import json
+import smtplib
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import redis
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.signals import post_delete, pre_delete
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import ApiToken, OutgoingEmail, User
+from users.roles import MANAGER_GROUP, roles_cache_key
+from .admin import MailingAdmin
+from .analytics import aggregate_attempts
+from .audience import add_recipients, clone_mailing, filter_recipients, remove_recipients
+from .backends import BaseBackend, FileBackend, HttpApiBackend, MemoryBackend, serialize
+from .jobs import claim_job, enqueue_mailing, run_job_slice, run_lanes
+from .models import (
+    Contact,
+    HourlyMailingStats,
+    Mailing,
+    Message,
+    Recipient,
+    ScheduledRetry,
+    SendAttempt,
+    SendJob,
+    SendingQuota,
+    StatsWatermark,
+    Suppression,
+)
+from .progress import ProgressTracker, read_progress
+from .retries import MAX_RETRIES, process_due_retries
+from .services import (
+    DOMAIN_FAILURE_THRESHOLD,
+    DomainHealth,
+    interleave_by_domain,
+    reconcile_mailing_counters,
+    send_mailing,
+)
+from .suppression import BloomFilter, SuppressionSet, is_hard_bounce, suppress
+from .tracking import DEAD_EVENTS_KEY, EVENTS_KEY, flush_events, make_token
+from .validation import (
+    BAD_SYNTAX,
+    DEAD_DOMAIN,
+    ROLE_ACCOUNT,
+    VALID,
+    DomainChecker,
+    get_resolver,
+    offline_resolver,
+    syntax_verdict,
+    system_resolver,
+    validate_contacts,
+)
+from .versions import data_version
+from .views import MailingUpdateView
+
+
+class TemporaryFailureBackend(BaseBackend):
+    """Сервер отвечает 451 на каждое письмо."""
+
+    def send_messages(self, messages):
+        return [smtplib.SMTPResponseException(451, "Try again later") for _ in messages]
+
+
+class FailingDomainBackend(MemoryBackend):
+    """Сток в памяти, но домен down.com отвечает 451; письма уходят по одному, как через SMTP."""
+
+    chunk_size = 1
+
+    def send_messages(self, messages):
+        super().send_messages(messages)
+        return [
+            smtplib.SMTPResponseException(451, "Try again later") if message.to[0].endswith("@down.com") else None
+            for message in messages
+        ]
+
+
+class StubHttpConnection:
+    """Соединение провайдера без сети: запоминает запросы, отвечает заданным статусом и телом."""
+
+    status, body = 200, b""
+
+    def __init__(self, host, port, timeout=None):
+        self.address = (host, port)
+        self.requests = []
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def request(self, method, path, body, headers):
+        self.requests.append((method, path, json.loads(body), headers))
+
+    def getresponse(self):
+        return SimpleNamespace(status=self.status, read=lambda: self.body)
+
+
+def dead_domain_resolver(domain):
+    """dead.com не существует, у flaky.com DNS не отвечает, остальные домены живые."""
+    return {"dead.com": False, "flaky.com": None}.get(domain, True)
+
+
+def make_user(email, manager=False):
+    user = User.objects.create_user(email=email, username=email.split("@")[0], password="secret")
+    if manager:
+        user.groups.add(Group.objects.get_or_create(name=MANAGER_GROUP)[0])
+    return user
+
+
+def make_mailing(owner, recipients=3, domain="example.com"):
+    message = Message.objects.create(subject="Тема", body="Текст", owner=owner)
+    mailing = Mailing.objects.create(message=message, owner=owner)
+    contacts = Contact.objects.get_or_create_many(
+        [f"user{index}.{mailing.pk}@{domain}" for index in range(recipients)]
+    )
+    Recipient.objects.bulk_create(
+        [Recipient(contact=contact, full_name=email, owner=owner) for email, contact in contacts.items()]
+    )
+    mailing.recipients.set(Recipient.objects.filter(owner=owner, contact__in=contacts.values()))
+    return mailing
+
+
+@override_settings(QUERY_PROFILING=True, QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """Каждая вьюха из QUERY_BUDGETS укладывается в свой бюджет; превышение роняет запрос."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user("owner@example.com")
+        cls.manager = make_user("manager@example.com", manager=True)
+        for index in range(5):
+            make_user(f"client{index}@example.com")
+        cls.mailing = make_mailing(cls.owner, recipients=20)
+        for other in range(3):
+            make_mailing(cls.owner, recipients=5, domain=f"other{other}.com")
+        recipients = list(cls.mailing.recipients.all())
+        SendAttempt.objects.bulk_create(
+            [
+                SendAttempt(
+                    mailing=cls.mailing,
+                    owner=cls.owner,
+                    recipient=recipient,
+                    message=cls.mailing.message,
+                    status="Успешно" if index % 3 else "Не успешно",
+                )
+                for index, recipient in enumerate(recipients)
+            ]
+        )
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        HourlyMailingStats.objects.bulk_create(
+            [
+                HourlyMailingStats(mailing=cls.mailing, hour=hour - timedelta(hours=shift), successful=10)
+                for shift in range(24)
+            ]
+        )
+        cls.token = make_token(cls.mailing.pk, recipients[0].pk, cls.owner.pk)
+        _, cls.api_key = ApiToken.issue(cls.owner, "tests")
+
+    def setUp(self):
+        cache.clear()
+        ProgressTracker(self.mailing, total=20).advance(successful=5)
+        # бюджет пикселя — для обычного пути через очередь Redis; без Redis буфер сбрасывается в БД по таймеру
+        self.enterContext(mock.patch("service.tracking.get_redis"))
+
+    def requests(self):
+        pk = self.mailing.pk
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {self.api_key}"}
+        batch = json.dumps([{"email": f"new{index}@example.com", "full_name": "Новый"} for index in range(50)])
+        return {
+            "service:home": ("get", self.owner, reverse("service:home"), {}),
+            "service:recipient_list": ("get", self.owner, reverse("service:recipient_list"), {}),
+            "service:message_list": ("get", self.owner, reverse("service:message_list"), {}),
+            "service:mailing_list": ("get", self.manager, reverse("service:mailing_list"), {}),
+            "service:mailing_recipients": (
+                "get", self.owner, reverse("service:mailing_recipients", args=[pk]), {}
+            ),
+            "service:attempts": ("get", self.manager, reverse("service:attempts"), {}),
+            "service:list_users": ("get", self.manager, reverse("service:list_users"), {}),
+            "service:mailing_analytics": ("get", self.owner, reverse("service:mailing_analytics", args=[pk]), {}),
+            "service:mailing_analytics_api": (
+                "get", self.owner, reverse("service:mailing_analytics_api", args=[pk]), {}
+            ),
+            "service:mailing_progress": ("get", self.owner, reverse("service:mailing_progress", args=[pk]), {}),
+            "service:mailing_progress_api": (
+                "get", self.manager, reverse("service:mailing_progress_api", args=[pk]), {}
+            ),
+            "service:api_recipients": (
+                "post", None, reverse("service:api_recipients"),
+                {"data": batch, "content_type": "application/json", **auth},
+            ),
+            "service:api_messages": ("get", self.owner, reverse("service:api_messages"), {}),
+            "service:api_mailings": ("get", self.manager, reverse("service:api_mailings"), {}),
+            "service:api_attempts": ("get", self.owner, reverse("service:api_attempts") + "?limit=10", {}),
+            "service:api_jobs": ("get", self.owner, reverse("service:api_jobs"), {}),
+            "service:api_send": (
+                "post", None, reverse("service:api_send"),
+                {
+                    "data": json.dumps({"mailings": list(Mailing.objects.values_list("pk", flat=True))}),
+                    "content_type": "application/json",
+                    "HTTP_IDEMPOTENCY_KEY": "budget",
+                    **auth,
+                },
+            ),
+            "service:track_open": ("get", None, reverse("service:track_open", args=[self.token]), {}),
+            "service:unsubscribe": ("get", None, reverse("service:unsubscribe", args=[self.token]), {}),
+        }
+
+    def test_every_budget_is_exercised(self):
+        self.assertEqual(set(self.requests()), set(settings.QUERY_BUDGETS))
+
+    def test_views_fit_their_budgets(self):
+        for view_name, (method, user, url, extra) in self.requests().items():
+            with self.subTest(view_name):
+                self.client.logout()
+                if user is not None:
+                    self.client.force_login(user)
+                # при QUERY_BUDGET_STRICT превышение поднимает QueryBudgetExceeded прямо из клиента
+                response = getattr(self.client, method)(url, **extra)
+                self.assertLess(response.status_code, 400, response.content[:500])
+                budget = settings.QUERY_BUDGETS[view_name]
+                self.assertLessEqual(int(response["X-Query-Count"]), budget["queries"])
+
+
+class AudienceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user("owner@example.com")
+        self.mailing = make_mailing(self.owner, recipients=3)
+
+    def test_clone_copies_message_end_at_and_recipients(self):
+        end_at = timezone.now() + timedelta(days=1)
+        Mailing.objects.filter(pk=self.mailing.pk).update(end_at=end_at, status="Завершена", total_sent=3)
+        self.mailing.refresh_from_db()
+
+        clone = clone_mailing(self.mailing)
+        clone.refresh_from_db()
+        self.assertNotEqual(clone.pk, self.mailing.pk)
+        self.assertEqual(
+            (clone.message_id, clone.owner_id, clone.end_at), (self.mailing.message_id, self.owner.pk, end_at)
+        )
+        # статус и счётчики у копии свои
+        self.assertEqual((clone.status, clone.total_sent), ("Создана", 0))
+        self.assertCountEqual(
+            clone.recipients.values_list("pk", flat=True), self.mailing.recipients.values_list("pk", flat=True)
+        )
+
+    def test_clone_view_copies_only_own_mailings(self):
+        manager = make_user("manager@example.com", manager=True)
+        self.client.force_login(manager)
+        response = self.client.post(reverse("service:mailing_clone", args=[self.mailing.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Mailing.objects.count(), 1)
+
+        self.client.force_login(self.owner)
+        response = self.client.post(reverse("service:mailing_clone", args=[self.mailing.pk]))
+        clone = Mailing.objects.exclude(pk=self.mailing.pk).get()
+        self.assertRedirects(
+            response, reverse("service:mailing_update", args=[clone.pk]), fetch_redirect_response=False
+        )
+        self.assertEqual((clone.owner_id, clone.recipients.count()), (self.owner.pk, 3))
+
+    def test_add_recipients_skips_existing_members(self):
+        source = make_mailing(self.owner, recipients=2, domain="other.com")
+        self.assertEqual(add_recipients(self.mailing, filter_recipients(self.owner.pk)), 2)
+        self.assertEqual(self.mailing.recipients.count(), 5)
+        # повторное добавление тех же получателей ничего не дублирует
+        self.assertEqual(add_recipients(self.mailing, filter_recipients(self.owner.pk, source_mailing=source)), 0)
+        self.assertEqual(self.mailing.recipients.count(), 5)
+
+    def test_remove_recipients_by_domain(self):
+        make_mailing(self.owner, recipients=2, domain="other.com")
+        add_recipients(self.mailing, filter_recipients(self.owner.pk))
+        self.assertEqual(remove_recipients(self.mailing, filter_recipients(self.owner.pk, domain="@Other.com")), 2)
+        self.assertEqual(
+            set(self.mailing.recipients.values_list("contact__email", flat=True)),
+            {f"user{index}.{self.mailing.pk}@example.com" for index in range(3)},
+        )
+        # получатели остаются в адресной книге, убирается только членство
+        self.assertEqual(Recipient.objects.filter(owner=self.owner).count(), 5)
+
+    def test_recipients_view_takes_only_mailing_owner_recipients(self):
+        other = make_user("other@example.com")
+        make_mailing(other, recipients=2, domain="other.com")
+        manager = make_user("manager@example.com", manager=True)
+        self.client.force_login(manager)
+
+        url = reverse("service:mailing_recipients", args=[self.mailing.pk])
+        response = self.client.post(url, {"action": "add", "domain": "other.com"})
+        self.assertEqual(response.context["changed"], 0)
+        response = self.client.post(url, {"action": "remove", "domain": "example.com"})
+        self.assertEqual(response.context["changed"], 3)
+        self.assertFalse(self.mailing.recipients.exists())
+        self.assertEqual(Recipient.objects.filter(owner=other).count(), 2)
+
+
+@override_settings(
+    MAILING_BACKEND="service.tests.FailingDomainBackend",
+    MAILING_DOMAIN_RESOLVER="service.validation.offline_resolver",
+)
+class DomainHealthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        MemoryBackend.outbox.clear()
+        self.owner = make_user("owner@example.com")
+        self.mailing = make_mailing(self.owner, recipients=2)
+        down = make_mailing(self.owner, recipients=6, domain="down.com")
+        self.mailing.recipients.add(*down.recipients.all())
+
+    def test_interleave_takes_domains_in_turn(self):
+        recipients = [
+            SimpleNamespace(email=email)
+            for email in ("a1@a.com", "a2@a.com", "a3@A.com", "b1@b.com", "a4@a.com", "c1@c.com")
+        ]
+        batches = [(domain, [r.email for r in batch]) for domain, batch in interleave_by_domain(recipients, 2)]
+        self.assertEqual(
+            batches,
+            [
+                ("a.com", ["a1@a.com", "a2@a.com"]),
+                ("b.com", ["b1@b.com"]),
+                ("c.com", ["c1@c.com"]),
+                ("a.com", ["a3@A.com", "a4@a.com"]),
+            ],
+        )
+
+    def test_failing_domain_trips_after_threshold_and_is_deferred(self):
+        result = send_mailing(self.mailing, owner=self.owner)
+        self.assertEqual((result["successful"], result["failed"], result["deferred"]), (2, 0, 6))
+
+        # после MAILING_DOMAIN_FAILURE_THRESHOLD отказов подряд остаток домена не отправляется
+        attempted = [message.to[0] for message in MemoryBackend.outbox if message.to[0].endswith("@down.com")]
+        self.assertEqual(len(attempted), DOMAIN_FAILURE_THRESHOLD)
+        self.assertTrue(cache.get(DomainHealth.cache_key("down.com")))
+        self.assertEqual(ScheduledRetry.objects.filter(recipient__contact__email__endswith="@down.com").count(), 6)
+
+        # другой прогон видит отметку в кеше и не трогает домен вовсе
+        MemoryBackend.outbox.clear()
+        result = send_mailing(self.mailing, owner=self.owner)
+        self.assertEqual(result["deferred"], 6)
+        self.assertFalse(any(message.to[0].endswith("@down.com") for message in MemoryBackend.outbox))
+
+    def test_deferred_attempts_leave_failed_sends_untouched(self):
+        send_mailing(self.mailing, owner=self.owner)
+        self.assertEqual(SendAttempt.objects.filter(status="Отложено").count(), 6)
+        counters = Mailing.objects.values_list("total_sent", "successful_sends", "failed_sends")
+        self.assertEqual(counters.get(pk=self.mailing.pk), (2, 2, 0))
+
+
+class ValidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        MemoryBackend.outbox.clear()
+
+    def make_contacts(self, *emails):
+        contacts = Contact.objects.get_or_create_many(emails)
+        return [contacts[email] for email in emails]
+
+    def test_syntax_verdict(self):
+        self.assertEqual(syntax_verdict("user@"), BAD_SYNTAX)
+        self.assertEqual(syntax_verdict("no spaces@example.com"), BAD_SYNTAX)
+        self.assertEqual(syntax_verdict("postmaster@example.com"), ROLE_ACCOUNT)
+        self.assertIsNone(syntax_verdict("user@example.com"))
+
+    def test_validate_contacts_sets_verdicts_and_caches_domains(self):
+        resolver = mock.Mock(side_effect=dead_domain_resolver)
+        contacts = self.make_contacts(
+            "user@example.com", "user@dead.com", "user@flaky.com", "noreply@example.com", "user@"
+        )
+        validate_contacts(contacts, DomainChecker(resolver))
+        verdicts = dict(Contact.objects.values_list("email", "verdict"))
+        self.assertEqual(
+            [verdicts[contact.email] for contact in contacts],
+            # DNS не ответил — адрес не отбрасываем
+            [VALID, DEAD_DOMAIN, VALID, ROLE_ACCOUNT, BAD_SYNTAX],
+        )
+        self.assertFalse(Contact.objects.filter(verified_at__isnull=True).exists())
+        resolved = [call.args[0] for call in resolver.call_args_list]
+        self.assertCountEqual(resolved, ["example.com", "dead.com", "flaky.com"])
+
+        # известные ответы берутся из кеша, неопределённый домен спрашивается снова
+        resolver.reset_mock()
+        DomainChecker(resolver).check_many(["example.com", "dead.com", "flaky.com"])
+        resolver.assert_called_once_with("flaky.com")
+
+    @override_settings(MAILING_BACKEND="service.backends.MemoryBackend")
+    def test_send_skips_rejected_recipients(self):
+        owner = make_user("owner@example.com")
+        mailing = make_mailing(owner, recipients=2)
+        contacts = self.make_contacts("user@dead.com", "postmaster@example.com", "user@")
+        Recipient.objects.bulk_create([Recipient(contact=contact, owner=owner) for contact in contacts])
+        mailing.recipients.add(*Recipient.objects.filter(contact__in=contacts))
+
+        with override_settings(MAILING_DOMAIN_RESOLVER="service.tests.dead_domain_resolver"):
+            result = send_mailing(mailing, owner=owner)
+        self.assertEqual((result["successful"], result["invalid"]), (2, 3))
+        self.assertEqual(len(MemoryBackend.outbox), 2)
+        self.assertFalse(SendAttempt.objects.filter(recipient__contact__in=contacts).exists())
+
+        # свежие вердикты не перепроверяются на следующем прогоне
+        with mock.patch("service.validation.validate_contacts") as validate:
+            send_mailing(mailing, owner=owner)
+        validate.assert_not_called()
+
+    def test_resolver_comes_from_settings(self):
+        self.assertTrue(offline_resolver("dead.com"))
+        with override_settings(MAILING_DOMAIN_RESOLVER="service.validation.offline_resolver"):
+            self.assertIs(get_resolver(), offline_resolver)
+        with override_settings(MAILING_DOMAIN_RESOLVER=None):
+            self.assertIs(get_resolver(), system_resolver)
+
+
+class BackendTests(TestCase):
+    def make_message(self, to):
+        message = EmailMultiAlternatives("Тема", "Текст", "from@example.com", [to], headers={"X-Test": "1"})
+        message.attach_alternative("<p>Текст</p>", "text/html")
+        return message
+
+    def test_file_backend_appends_jsonl(self):
+        messages = [self.make_message("one@example.com"), self.make_message("two@example.com")]
+        with tempfile.TemporaryDirectory() as root:
+            path = Path(root) / "sink" / "mail.jsonl"
+            with override_settings(MAILING_FILE_SINK_PATH=str(path)):
+                for message in messages:
+                    backend = FileBackend()
+                    backend.open()
+                    self.assertEqual(backend.send_messages([message]), [None])
+                    backend.close()
+            lines = path.read_text(encoding="utf-8").splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [serialize(message) for message in messages])
+        self.assertEqual(json.loads(lines[0])["html"], "<p>Текст</p>")
+
+    def open_http_backend(self, status, results=None):
+        self.enterContext(mock.patch("http.client.HTTPConnection", StubHttpConnection))
+        self.enterContext(mock.patch.multiple(StubHttpConnection, status=status, body=json.dumps(results).encode()))
+        backend = HttpApiBackend()
+        with override_settings(MAILING_HTTP_API_URL="http://mail.local:8080/v1/send"):
+            backend.open()
+        return backend
+
+    def test_http_backend_maps_results_to_smtp_errors(self):
+        backend = self.open_http_backend(
+            200,
+            {
+                "results": [
+                    {"status": "ok"},
+                    {"status": "error", "code": 550, "message": "No such user"},
+                    {"status": "error"},
+                ]
+            },
+        )
+        messages = [self.make_message(f"user{index}@example.com") for index in range(3)]
+        ok, bounced, rejected = backend.send_messages(messages)
+
+        self.assertEqual(backend.connection.address, ("mail.local", 8080))
+        method, path, payload, _ = backend.connection.requests[0]
+        self.assertEqual((method, path), ("POST", "/v1/send"))
+        self.assertEqual(payload["messages"], [serialize(message) for message in messages])
+
+        self.assertIsNone(ok)
+        self.assertIsInstance(bounced, smtplib.SMTPRecipientsRefused)
+        self.assertEqual(bounced.recipients, {"user1@example.com": (550, "No such user")})
+        self.assertTrue(is_hard_bounce(bounced))
+        self.assertEqual(rejected.recipients, {"user2@example.com": (554, "")})
+
+    def test_http_backend_maps_status_codes(self):
+        # 5xx провайдера — временная ошибка всей пачки, 4xx — постоянная
+        for status, smtp_code in ((503, 451), (400, 554)):
+            with self.subTest(status=status):
+                backend = self.open_http_backend(status)
+                with self.assertRaises(smtplib.SMTPResponseException) as raised:
+                    backend.send_messages([self.make_message("user@example.com")])
+                self.assertEqual(raised.exception.smtp_code, smtp_code)
+
+
+class SuppressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user("owner@example.com")
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        emails = [f"user{index}@example.com" for index in range(1000)]
+        bloom = BloomFilter(len(emails))
+        for email in emails:
+            bloom.add(email)
+        self.assertTrue(all(email in bloom for email in emails))
+        # с тем же массивом бит (из кеша) фильтр отвечает так же
+        restored = BloomFilter(len(emails), bits=bloom.bits)
+        self.assertTrue(all(email in restored for email in emails))
+        misses = sum(f"other{index}@example.com" in bloom for index in range(1000))
+        self.assertLess(misses, 10)
+
+    def test_small_list_uses_exact_set(self):
+        suppress(["Blocked@Example.com"], owner_id=self.owner.pk)
+        suppress(["global@example.com"])
+        suppressed = SuppressionSet(self.owner.pk)
+        self.assertIsNone(suppressed.bloom)
+        self.assertEqual(
+            suppressed.filter_suppressed(["blocked@example.com", "GLOBAL@example.com", "ok@example.com"]),
+            {"blocked@example.com", "global@example.com"},
+        )
+
+    def test_large_list_uses_bloom_and_rebuilds_on_change(self):
+        self.enterContext(mock.patch("service.suppression.SUPPRESSION_SET_LIMIT", 2))
+        blocked = [f"blocked{index}@example.com" for index in range(5)]
+        suppress(blocked, owner_id=self.owner.pk)
+        checked = blocked + [f"ok{index}@example.com" for index in range(50)]
+
+        suppressed = SuppressionSet(self.owner.pk)
+        self.assertIsNone(suppressed.emails)
+        self.assertIn(blocked[0], suppressed.bloom)
+        # ложные срабатывания фильтра отсекает точный запрос
+        self.assertEqual(suppressed.filter_suppressed(checked), set(blocked))
+        # второй прогон берёт биты из кеша и не читает стоп-лист заново
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(SuppressionSet(self.owner.pk).bloom)
+
+        suppress(["late@example.com"], owner_id=self.owner.pk)
+        rebuilt = SuppressionSet(self.owner.pk)
+        self.assertEqual(rebuilt.filter_suppressed([*checked, "late@example.com"]), {*blocked, "late@example.com"})
+
+
+class AggregateAttemptsTests(TestCase):
+    def setUp(self):
+        self.owner = make_user("owner@example.com")
+        self.mailing = make_mailing(self.owner, recipients=4)
+
+    def attempt(self, recipient, status="Успешно", age=timedelta(minutes=10)):
+        attempt = SendAttempt.objects.create(
+            mailing=self.mailing, owner=self.owner, recipient=recipient, status=status
+        )
+        SendAttempt.objects.filter(pk=attempt.pk).update(attempt_time=timezone.now() - age)
+        return attempt
+
+    def test_watermark_stops_before_fresh_attempts(self):
+        first, second, third, fourth = self.mailing.recipients.order_by("id")
+        old = self.attempt(first)
+        fresh = self.attempt(second, age=timedelta(0))
+        # старая попытка за свежей ещё не учитывается: перед ней могла быть незакоммиченная строка
+        self.attempt(third, status="Не успешно")
+
+        self.assertEqual(aggregate_attempts(), 1)
+        self.assertEqual(StatsWatermark.objects.get().last_id, old.pk)
+
+        SendAttempt.objects.filter(pk=fresh.pk).update(attempt_time=timezone.now() - timedelta(minutes=10))
+        self.attempt(fourth)
+        self.assertEqual(aggregate_attempts(), 3)
+        totals = HourlyMailingStats.objects.filter(mailing=self.mailing).aggregate(
+            successful=Sum("successful"), failed=Sum("failed")
+        )
+        self.assertEqual(totals, {"successful": 3, "failed": 1})
+
+    def test_deferred_only_batch_counts_as_progress(self):
+        first, second, third, _ = self.mailing.recipients.order_by("id")
+        self.attempt(first, status="Отложено")
+        last = self.attempt(second, status="Отложено")
+        self.attempt(third)
+
+        # пачка из одних «Отложено» не пустая: команда должна продолжить, а не уснуть
+        self.assertEqual(aggregate_attempts(batch_size=2), 2)
+        self.assertEqual(StatsWatermark.objects.get().last_id, last.pk)
+        self.assertFalse(HourlyMailingStats.objects.filter(successful__gt=0).exists())
+        self.assertEqual(aggregate_attempts(batch_size=2), 1)
+        self.assertEqual(aggregate_attempts(batch_size=2), 0)
+
+
+class DataVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user("owner@example.com")
+        self.mailing = make_mailing(self.owner)
+        self.client.force_login(self.owner)
+
+    def test_delete_view_bumps_owner_version(self):
+        before = data_version(self.owner.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("service:message_delete", args=[self.mailing.message_id]))
+        self.assertRedirects(response, reverse("service:message_list"), fetch_redirect_response=False)
+        self.assertFalse(Mailing.objects.exists())
+        self.assertNotEqual(data_version(self.owner.pk), before)
+
+    def test_cascade_delete_has_no_signal_listeners(self):
+        # обработчик pre/post_delete на модели отключает быстрое каскадное удаление
+        for model in (Recipient, Message, Mailing):
+            self.assertFalse(post_delete.has_listeners(model), model)
+            self.assertFalse(pre_delete.has_listeners(model), model)
+
+
+class ResendFailedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_resend_enqueues_retries_instead_of_sending(self):
+        owner = make_user("owner@example.com")
+        admin_user = User.objects.create_superuser(email="admin@example.com", username="admin", password="secret")
+        mailing = make_mailing(owner)
+        first, second, _ = mailing.recipients.order_by("id")
+        for recipient, status in ((first, "Не успешно"), (first, "Не успешно"), (second, "Успешно")):
+            SendAttempt.objects.create(mailing=mailing, owner=owner, recipient=recipient, status=status)
+
+        self.client.force_login(admin_user)
+        selected = list(SendAttempt.objects.values_list("pk", flat=True))
+        with mock.patch("service.services.send_mailing") as send:
+            response = self.client.post(
+                reverse("admin:service_sendattempt_changelist"),
+                {"action": "resend_failed", "_selected_action": selected},
+            )
+        self.assertEqual(response.status_code, 302)
+        send.assert_not_called()
+        retry = ScheduledRetry.objects.get()
+        self.assertEqual((retry.mailing_id, retry.recipient_id, retry.owner_id), (mailing.pk, first.pk, owner.pk))
+        self.assertLessEqual(retry.next_attempt_at, timezone.now())
+
+
+class HomeViewTests(TestCase):
+    def test_unique_recipients_skips_unused_contacts(self):
+        owner = make_user("owner@example.com")
+        other = make_user("other@example.com")
+        mailing = make_mailing(owner, recipients=3)
+        # тот же адрес у второго владельца — один уникальный получатель
+        Recipient.objects.create(contact=mailing.recipients.first().contact, owner=other, full_name="Другой")
+        Contact.objects.get_or_create_for("orphan@example.com")
+
+        response = self.client.get(reverse("service:home"))
+        self.assertEqual(response.context["unique_recipients"](), 3)
+
+
+@override_settings(
+    MAILING_BACKEND="service.backends.MemoryBackend",
+    MAILING_DOMAIN_RESOLVER="service.validation.offline_resolver",
+)
+class SendQuotaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user("owner@example.com")
+        self.mailing = make_mailing(self.owner, recipients=5)
+        SendingQuota.objects.create(owner=self.owner, hourly_limit=2)
+        # счётчики лимита без Redis ведутся в БД — тест не зависит от его состояния
+        self.enterContext(mock.patch("service.quotas.get_redis", side_effect=redis.ConnectionError))
+        self.enterContext(self.assertLogs("service.quotas", "WARNING"))
+
+    def test_over_quota_recipients_are_paused_until_next_window(self):
+        recipients = list(self.mailing.recipients.order_by("id"))
+        retry_counts = {recipient.pk: 2 for recipient in recipients}
+        result = send_mailing(
+            self.mailing, self.mailing.recipients.all(), owner=self.owner, retry_counts=retry_counts
+        )
+
+        self.assertEqual((result["successful"], result["over_quota"], result["failed"]), (2, 3, 0))
+        self.mailing.refresh_from_db()
+        self.assertEqual(self.mailing.status, "Приостановлена")
+        self.assertEqual((self.mailing.successful_sends, self.mailing.failed_sends), (2, 0))
+
+        next_hour = timezone.localtime().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        retries = ScheduledRetry.objects.all()
+        self.assertEqual(len(retries), 3)
+        for retry in retries:
+            # пауза по лимиту не тратит попытку
+            self.assertEqual(retry.attempt_number, 2)
+            self.assertEqual(retry.next_attempt_at, next_hour)
+
+    def test_quota_is_shared_between_runs(self):
+        send_mailing(self.mailing, owner=self.owner)
+        result = send_mailing(self.mailing, owner=self.owner)
+        self.assertEqual((result["successful"], result["over_quota"]), (0, 5))
+
+
+@override_settings(
+    MAILING_BACKEND="service.tests.TemporaryFailureBackend",
+    MAILING_DOMAIN_RESOLVER="service.validation.offline_resolver",
+)
+class RetryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user("owner@example.com")
+        self.mailing = make_mailing(self.owner, recipients=2)
+
+    def test_transient_failure_schedules_retry_with_backoff(self):
+        result = send_mailing(self.mailing, owner=self.owner)
+        self.assertEqual((result["deferred"], result["failed"]), (2, 0))
+        retries = ScheduledRetry.objects.all()
+        self.assertEqual([retry.attempt_number for retry in retries], [1, 1])
+        for retry in retries:
+            self.assertGreater(retry.next_attempt_at, timezone.now())
+
+    def test_last_retry_fails_for_good(self):
+        retry_counts = {pk: MAX_RETRIES for pk in self.mailing.recipients.values_list("pk", flat=True)}
+        result = send_mailing(self.mailing, owner=self.owner, retry_counts=retry_counts)
+        self.assertEqual((result["deferred"], result["failed"]), (0, 2))
+        self.assertFalse(ScheduledRetry.objects.exists())
+        self.mailing.refresh_from_db()
+        self.assertEqual(self.mailing.failed_sends, 2)
+
+    def schedule_due(self):
+        for recipient in self.mailing.recipients.all():
+            ScheduledRetry.objects.create(
+                mailing=self.mailing,
+                recipient=recipient,
+                owner=self.owner,
+                next_attempt_at=timezone.now() - timedelta(seconds=1),
+            )
+
+    @override_settings(MAILING_BACKEND="service.backends.MemoryBackend")
+    def test_due_retries_are_sent_after_the_claim_commits(self):
+        self.schedule_due()
+        depth = len(connection.atomic_blocks)
+        depths = []
+
+        def sending(*args, **kwargs):
+            depths.append(len(connection.atomic_blocks))
+            return send_mailing(*args, **kwargs)
+
+        with mock.patch("service.services.send_mailing", side_effect=sending):
+            self.assertEqual(process_due_retries(), 2)
+        # отправка не внутри транзакции захвата
+        self.assertEqual(depths, [depth])
+        self.assertFalse(ScheduledRetry.objects.exists())
+        self.assertEqual(SendAttempt.objects.filter(status="Успешно").count(), 2)
+
+    def test_failed_retry_is_rescheduled_not_dropped(self):
+        self.schedule_due()
+        self.assertEqual(process_due_retries(), 2)
+        retries = ScheduledRetry.objects.all()
+        self.assertEqual([retry.attempt_number for retry in retries], [2, 2])
+        self.assertEqual(SendAttempt.objects.filter(status="Отложено").count(), 2)
+
+    def test_crash_during_send_leaves_retries_leased(self):
+        self.schedule_due()
+        with mock.patch("service.services.send_mailing", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                process_due_retries()
+        # строки остались, но до конца аренды их не берёт никто
+        self.assertEqual(ScheduledRetry.objects.filter(next_attempt_at__gt=timezone.now()).count(), 2)
+        self.assertEqual(process_due_retries(), 0)
+
+
+@override_settings(
+    MAILING_BACKEND="service.backends.MemoryBackend",
+    MAILING_DOMAIN_RESOLVER="service.validation.offline_resolver",
+)
+class JobLaneTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_enqueue_is_idempotent_while_job_is_active(self):
+        owner = make_user("owner@example.com")
+        mailing = make_mailing(owner)
+        job, created = enqueue_mailing(mailing)
+        self.assertTrue(created)
+        self.assertEqual((job.lane, job.total), ("small", 3))
+        self.assertEqual(enqueue_mailing(mailing), (job, False))
+
+    def test_claim_prefers_least_recently_served_owner(self):
+        busy, idle = make_user("busy@example.com"), make_user("idle@example.com")
+        busy_job, _ = enqueue_mailing(make_mailing(busy))
+        SendJob.objects.filter(pk=busy_job.pk).update(last_run_at=timezone.now() - timedelta(seconds=1))
+        second_busy_job, _ = enqueue_mailing(make_mailing(busy))
+        idle_job, _ = enqueue_mailing(make_mailing(idle))
+
+        self.assertEqual(claim_job("small"), idle_job)
+        self.assertIn(claim_job("small"), {busy_job, second_busy_job})
+
+    def test_worker_pass_sends_transactional_mail_first(self):
+        owner = make_user("owner@example.com")
+        enqueue_mailing(make_mailing(owner))
+        OutgoingEmail.objects.create(subject="Тема", body="Текст", to=["user@example.com"])
+
+        with mock.patch.dict("service.jobs.LANE_QUOTAS", {"transactional": 1, "small": 2}):
+            self.assertEqual(run_lanes(("transactional", "small")), 3)
+        self.assertEqual(OutgoingEmail.objects.get().status, "Отправлено")
+        self.assertEqual(SendAttempt.objects.count(), 2)
+        self.assertEqual(SendJob.objects.get().status, "Ожидает")
+
+
+@override_settings(
+    MAILING_BACKEND="service.backends.MemoryBackend",
+    MAILING_DOMAIN_RESOLVER="service.validation.offline_resolver",
+)
+class ShardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.enterContext(mock.patch("service.jobs.SMALL_LANE_LIMIT", 5))
+        self.enterContext(mock.patch("service.jobs.BULK_SHARDS", 3))
+        self.owner = make_user("owner@example.com")
+        self.mailing = make_mailing(self.owner, recipients=10)
+
+    def test_bulk_mailing_is_split_into_disjoint_shards(self):
+        enqueue_mailing(self.mailing)
+        jobs = list(SendJob.objects.order_by("shard"))
+        self.assertEqual([(job.lane, job.shard) for job in jobs], [("bulk", 0), ("bulk", 1), ("bulk", 2)])
+        self.assertEqual(sum(job.total for job in jobs), 10)
+        self.assertIsNone(jobs[-1].last_id)
+        for previous, job in zip(jobs, jobs[1:]):
+            self.assertEqual(job.cursor, previous.last_id)
+
+    def test_each_recipient_is_sent_once_and_progress_closes_with_last_shard(self):
+        enqueue_mailing(self.mailing)
+        for job in SendJob.objects.order_by("shard"):
+            self.assertFalse(read_progress(self.mailing.pk)["finished"])
+            while job.status != "Готово":
+                run_job_slice(job, limit=2)
+
+        sent = SendAttempt.objects.values_list("recipient_id", flat=True)
+        self.assertCountEqual(sent, self.mailing.recipients.values_list("pk", flat=True))
+        progress = read_progress(self.mailing.pk)
+        self.assertTrue(progress["finished"])
+        self.assertEqual(progress["successful"], 10)
+
+
+@override_settings(
+    MAILING_BACKEND="service.backends.MemoryBackend",
+    MAILING_DOMAIN_RESOLVER="service.validation.offline_resolver",
+)
+class MailingCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user("owner@example.com")
+        self.mailing = make_mailing(self.owner, recipients=4)
+
+    def test_send_updates_counters_per_batch(self):
+        send_mailing(self.mailing, owner=self.owner)
+        counters = Mailing.objects.values_list("total_sent", "successful_sends", "failed_sends")
+        self.assertEqual(counters.get(pk=self.mailing.pk), (4, 4, 0))
+
+    def test_reconcile_fixes_drift_and_resets_mailings_without_attempts(self):
+        send_mailing(self.mailing, owner=self.owner)
+        Mailing.objects.filter(pk=self.mailing.pk).update(total_sent=1, successful_sends=0, failed_sends=1)
+        idle = make_mailing(self.owner)
+        Mailing.objects.filter(pk=idle.pk).update(total_sent=7, successful_sends=7)
+
+        self.assertEqual(reconcile_mailing_counters(), 2)
+        self.assertEqual(
+            dict(Mailing.objects.values_list("pk", "total_sent")), {self.mailing.pk: 4, idle.pk: 0}
+        )
+        self.mailing.refresh_from_db()
+        self.assertEqual((self.mailing.successful_sends, self.mailing.failed_sends), (4, 0))
+        self.assertEqual(reconcile_mailing_counters(), 0)
+
+    def stale_save(self, url, view, data):
+        # объект загружен до того, как воркер закоммитил приращения
+        stale = Mailing.objects.get(pk=self.mailing.pk)
+        Mailing.objects.filter(pk=self.mailing.pk).update(total_sent=5, successful_sends=4, failed_sends=1)
+        with mock.patch.object(view, "get_object", return_value=stale):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.mailing.refresh_from_db()
+        self.assertEqual(
+            (self.mailing.total_sent, self.mailing.successful_sends, self.mailing.failed_sends), (5, 4, 1)
+        )
+
+    def test_update_view_keeps_worker_increments(self):
+        self.client.force_login(self.owner)
+        data = {
+            "end_at": "2030-01-01 10:00",
+            "message": self.mailing.message_id,
+            "recipients": list(self.mailing.recipients.values_list("pk", flat=True)),
+        }
+        self.stale_save(reverse("service:mailing_update", args=[self.mailing.pk]), MailingUpdateView, data)
+        self.assertEqual((self.mailing.status, self.mailing.end_at.year), ("Запущена", 2030))
+
+    def test_admin_change_keeps_worker_increments(self):
+        self.client.force_login(
+            User.objects.create_superuser(email="admin@example.com", username="admin", password="secret")
+        )
+        data = {
+            "status": "Приостановлена",
+            "message": self.mailing.message_id,
+            "recipients": list(self.mailing.recipients.values_list("pk", flat=True)),
+            "owner": self.owner.pk,
+        }
+        url = reverse("admin:service_mailing_change", args=[self.mailing.pk])
+        self.stale_save(url, MailingAdmin, data)
+        self.assertEqual(self.mailing.status, "Приостановлена")
+
+
+class TrackingFlushTests(TestCase):
+    def setUp(self):
+        self.owner = make_user("owner@example.com")
+        self.mailing = make_mailing(self.owner, recipients=2)
+        self.first, self.second = self.mailing.recipients.order_by("id")
+
+    def events(self):
+        return [
+            ["open", self.mailing.pk, self.first.pk, self.owner.pk],
+            ["open", self.mailing.pk, self.second.pk, self.owner.pk],
+            ["unsubscribe", self.mailing.pk, self.first.pk, self.owner.pk],
+            # рассылку удалили после отправки
+            ["open", self.mailing.pk + 1000, self.first.pk, self.owner.pk],
+        ]
+
+    def test_flush_writes_stats_and_dead_letters_orphans(self):
+        raw = [json.dumps(event) for event in self.events()]
+        client = mock.MagicMock()
+        client.pipeline.return_value.__enter__.return_value.execute.return_value = (raw, True)
+
+        with mock.patch("service.tracking.get_redis", return_value=client), self.assertLogs("service.tracking"):
+            self.assertEqual(flush_events(), 4)
+
+        self.assertEqual(dict(self.mailing.event_stats.values_list("event", "count")), {"open": 2, "unsubscribe": 1})
+        self.assertEqual(
+            list(Suppression.objects.values_list("email", "owner_id", "reason")),
+            [(self.first.email, self.owner.pk, "Отписка")],
+        )
+        client.rpush.assert_called_once_with(DEAD_EVENTS_KEY, raw[-1])
+
+    def test_failed_batch_goes_back_to_the_queue(self):
+        raw = [json.dumps(event) for event in self.events()[:1]]
+        client = mock.MagicMock()
+        client.pipeline.return_value.__enter__.return_value.execute.return_value = (raw, True)
+
+        failing = mock.patch("service.tracking.apply_events", side_effect=RuntimeError)
+        with mock.patch("service.tracking.get_redis", return_value=client), failing:
+            with self.assertRaises(RuntimeError):
+                flush_events()
+        client.rpush.assert_called_once_with(EVENTS_KEY, *raw)
+
+
+class ProgressStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user("owner@example.com")
+        self.mailing = make_mailing(self.owner)
+        progress = ProgressTracker(self.mailing, total=3)
+        progress.advance(successful=3)
+        progress.finish()
+        self.url = reverse("service:mailing_progress_stream", args=[self.mailing.pk])
+
+    async def stream(self, user):
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(self.url)
+        if response.status_code != 200:
+            return response, []
+        return response, [chunk async for chunk in response.streaming_content]
+
+    async def test_owner_receives_final_state(self):
+        response, chunks = await self.stream(self.owner)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        state = json.loads(b"".join(chunks).decode().removeprefix("data: "))
+        self.assertEqual((state["successful"], state["finished"]), (3, True))
+
+    async def test_manager_with_cold_roles_cache_is_allowed(self):
+        manager = await sync_to_async(make_user)("manager@example.com", manager=True)
+        # роли не в кеше: проверка группы идёт в БД и не должна выполняться в event loop
+        await cache.adelete(roles_cache_key(manager.pk))
+        response, _ = await self.stream(manager)
+        self.assertEqual(response.status_code, 200)
+
+    async def test_other_owner_gets_404(self):
+        stranger = await sync_to_async(make_user)("stranger@example.com")
+        response, _ = await self.stream(stranger)
+        self.assertEqual(response.status_code, 404)
+
+
+class ResourceApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user("owner@example.com")
+        self.stranger = make_user("stranger@example.com")
+        self.mailing = make_mailing(self.owner, recipients=5)
+        self.foreign = make_mailing(self.stranger)
+        _, key = ApiToken.issue(self.owner, "tests")
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {key}"}
+
+    def post(self, name, data, method="post"):
+        return getattr(self.client, method)(
+            reverse(name), json.dumps(data), content_type="application/json", **self.auth
+        )
+
+    def test_cursor_pagination_walks_every_row_once(self):
+        url = reverse("service:api_recipients") + "?limit=2&fields=email"
+        ids = []
+        while url:
+            response = self.client.get(url, **self.auth)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertLessEqual(len(body["results"]), 2)
+            ids += [row["id"] for row in body["results"]]
+            url = body["next"]
+        own = Recipient.objects.filter(owner=self.owner).order_by("id")
+        self.assertEqual(ids, list(own.values_list("pk", flat=True)))
+
+    def test_etag_returns_not_modified(self):
+        url = reverse("service:api_messages")
+        etag = self.client.get(url, **self.auth)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.auth).status_code, 304)
+
+    def test_owner_sees_and_changes_only_own_rows(self):
+        response = self.client.get(reverse("service:api_mailings"), **self.auth)
+        self.assertEqual([row["id"] for row in response.json()["results"]], [self.mailing.pk])
+
+        response = self.post("service:api_mailings", [{"id": self.foreign.pk, "end_at": None}], method="patch")
+        self.assertEqual(response.status_code, 404)
+        response = self.post("service:api_mailings", [{"message": self.foreign.message_id}])
+        self.assertEqual(response.status_code, 400)
+        response = self.post("service:api_messages", [{"id": self.foreign.message_id}], method="delete")
+        self.assertEqual(response.json(), {"deleted": 0})
+        self.assertTrue(Message.objects.filter(pk=self.foreign.message_id).exists())
+
+    def test_manager_sees_every_mailing(self):
+        manager = make_user("manager@example.com", manager=True)
+        self.client.force_login(manager)
+        response = self.client.get(reverse("service:api_mailings"))
+        self.assertEqual({row["id"] for row in response.json()["results"]}, {self.mailing.pk, self.foreign.pk})
+
+    def test_session_is_read_only(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse("service:api_messages")).status_code, 200)
+        data = json.dumps([{"subject": "Тема", "body": "Текст"}])
+        response = self.client.post(reverse("service:api_messages"), data, content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_bad_input_is_a_400(self):
+        response = self.client.get(reverse("service:api_attempts") + "?mailing=abc", **self.auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("mailing", response.json()["errors"])
+        response = self.post("service:api_recipients", [{"email": 42, "full_name": "Число"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"], {"email": ["Ожидается строка"]})
+
+    def test_recipient_upsert_keeps_one_row_per_address(self):
+        email = self.mailing.recipients.first().email
+        response = self.post("service:api_recipients", [{"email": email.upper(), "full_name": "Новое имя"}])
+        self.assertEqual(response.status_code, 201)
+        recipient = Recipient.objects.get(owner=self.owner, contact__email=email)
+        self.assertEqual(response.json(), {"ids": [recipient.pk]})
+        self.assertEqual(recipient.full_name, "Новое имя")
+
+
+class SendTriggerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user("owner@example.com")
+        self.mailings = [make_mailing(self.owner), make_mailing(self.owner)]
+        _, key = ApiToken.issue(self.owner, "tests")
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {key}"}
+
+    def trigger(self, ids, key="nightly-1"):
+        return self.client.post(
+            reverse("service:api_send"),
+            json.dumps({"mailings": ids}),
+            content_type="application/json",
+            HTTP_IDEMPOTENCY_KEY=key,
+            **self.auth,
+        )
+
+    def test_repeat_with_same_key_replays_the_response(self):
+        ids = [mailing.pk for mailing in self.mailings]
+        first = self.trigger(ids)
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(SendJob.objects.count(), 2)
+
+        replay = self.trigger(list(reversed(ids)))
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(SendJob.objects.count(), 2)
+
+    def test_same_key_with_other_mailings_is_rejected(self):
+        self.trigger([self.mailings[0].pk])
+        self.assertEqual(self.trigger([self.mailings[1].pk]).status_code, 422)
+
+    def test_missing_mailing_rolls_back_the_key(self):
+        foreign = make_mailing(make_user("stranger@example.com"))
+        self.assertEqual(self.trigger([self.mailings[0].pk, foreign.pk]).status_code, 404)
+        self.assertFalse(SendJob.objects.exists())
+        # исправленный запрос с тем же ключом проходит
+        self.assertEqual(self.trigger([self.mailings[0].pk]).status_code, 202)
+
+    def test_key_header_is_required(self):
+        self.assertEqual(self.trigger([self.mailings[0].pk], key="").status_code, 400)
@@ -0,0 +1,143 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+import redis
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+
+from .models import Mailing, MailingEventStats, Recipient
+from .redis_client import get_redis
+from .suppression import suppress
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = "service.tracking"
+EVENTS_KEY = "tracking:events"
+DEAD_EVENTS_KEY = "tracking:events:dead"
+
+# если Redis недоступен, события копятся в памяти процесса и пишутся в БД пачкой
+LOCAL_FLUSH_SIZE = 500
+LOCAL_FLUSH_INTERVAL = 5.0
+
+_local_events = []
+_local_lock = threading.Lock()
+_local_flushed_at = time.monotonic()
+
+
+def make_token(mailing_id, recipient_id, owner_id):
+    return signing.Signer(salt=TOKEN_SALT).sign(f"{mailing_id}.{recipient_id}.{owner_id or 0}")
+
+
+def read_token(token):
+    """Проверяет подпись без обращения к БД; возвращает (mailing_id, recipient_id, owner_id) или None."""
+    try:
+        value = signing.Signer(salt=TOKEN_SALT).unsign(token)
+        mailing_id, recipient_id, owner_id = (int(part) for part in value.split("."))
+    except (signing.BadSignature, ValueError):
+        return None
+    return mailing_id, recipient_id, owner_id or None
+
+
+def tracking_urls(mailing, recipient):
+    token = make_token(mailing.pk, recipient.pk, mailing.owner_id)
+    return {
+        "open": settings.SITE_URL + reverse("service:track_open", kwargs={"token": token}),
+        "unsubscribe": settings.SITE_URL + reverse("service:unsubscribe", kwargs={"token": token}),
+    }
+
+
+def record_event(event, mailing_id, recipient_id, owner_id):
+    payload = [event, mailing_id, recipient_id, owner_id]
+    try:
+        get_redis().rpush(EVENTS_KEY, json.dumps(payload))
+        return
+    except redis.RedisError:
+        logger.warning("Redis недоступен, событие %s буферизуется в памяти", event)
+
+    global _local_flushed_at
+    with _local_lock:
+        _local_events.append(payload)
+        due = (
+            len(_local_events) >= LOCAL_FLUSH_SIZE
+            or time.monotonic() - _local_flushed_at >= LOCAL_FLUSH_INTERVAL
+        )
+        if not due:
+            return
+        events = _local_events[:]
+        _local_events.clear()
+        _local_flushed_at = time.monotonic()
+    apply_events(events)
+
+
+def apply_events(events):
+    """Пишет пачку событий: счётчики по рассылкам и отписки в стоп-лист; возвращает отброшенные события.
+
+    Рассылка или получатель могли быть удалены после отправки — такие события отбрасываются,
+    иначе одно из них ломало бы внешним ключом запись всей пачки.
+    """
+    mailing_ids = {mailing_id for _, mailing_id, _, _ in events}
+    recipient_ids = {recipient_id for _, _, recipient_id, _ in events}
+    existing_mailings = set(Mailing.objects.filter(pk__in=mailing_ids).values_list("pk", flat=True))
+    # адрес и владелец берутся у самого получателя, а не из токена
+    recipients = {
+        pk: (owner_id, email)
+        for pk, owner_id, email in Recipient.objects.filter(pk__in=recipient_ids).values_list(
+            "pk", "owner_id", "contact__email"
+        )
+    }
+
+    counts = Counter()
+    unsubscribed = defaultdict(set)
+    dropped = []
+    for payload in events:
+        event, mailing_id, recipient_id, _ = payload
+        if mailing_id not in existing_mailings or recipient_id not in recipients:
+            dropped.append(payload)
+            continue
+        counts[mailing_id, event] += 1
+        if event == "unsubscribe":
+            owner_id, email = recipients[recipient_id]
+            unsubscribed[owner_id].add(email)
+
+    with transaction.atomic():
+        for (mailing_id, event), count in counts.items():
+            updated = MailingEventStats.objects.filter(mailing_id=mailing_id, event=event).update(
+                count=F("count") + count
+            )
+            if not updated:
+                MailingEventStats.objects.create(mailing_id=mailing_id, event=event, count=count)
+
+        for owner_id, emails in unsubscribed.items():
+            suppress(emails, owner_id=owner_id, reason="Отписка")
+
+    if dropped:
+        logger.warning("Отброшено событий удалённых рассылок и получателей: %s", len(dropped))
+    return dropped
+
+
+def flush_events(batch_size=10_000):
+    """Забирает события из очереди Redis и пишет их одной транзакцией; возвращает их число."""
+    client = get_redis()
+    with client.pipeline() as pipe:
+        pipe.lrange(EVENTS_KEY, 0, batch_size - 1)
+        pipe.ltrim(EVENTS_KEY, batch_size, -1)
+        raw, _ = pipe.execute()
+
+    events = [json.loads(item) for item in raw]
+    if events:
+        try:
+            dropped = apply_events(events)
+        except Exception:
+            # возвращаем пачку в очередь, чтобы не потерять события
+            client.rpush(EVENTS_KEY, *raw)
+            raise
+        if dropped:
+            # отброшенные не теряются бесследно, но и не возвращаются в рабочую очередь
+            client.rpush(DEAD_EVENTS_KEY, *(json.dumps(payload) for payload in dropped))
+    return len(events)
@@ -1,5 +1,14 @@
 from django.urls import path
 from service.apps import ServiceConfig
+from .api import (
+    MailingResource,
+    MessageResource,
+    RecipientResource,
+    ResourceView,
+    SendAttemptResource,
+    SendJobResource,
+    SendTriggerView,
+)
 from .views import (
     HomeView,
     SendMailingView,
@@ -15,8 +24,17 @@ from .views import (
     MailingCreateView,
     MailingUpdateView,
     MailingDeleteView,
+    MailingCloneView,
+    MailingRecipientsView,
     UsersView,
     UserActionView, MailListViewStatus,
+    MailingAnalyticsView,
+    MailingAnalyticsApiView,
+    TrackOpenView,
+    UnsubscribeView,
+    MailingProgressView,
+    MailingProgressApiView,
+    MailingProgressStreamView,
 )
 
 
@@ -52,6 +70,14 @@ urlpatterns = [
     path(
         "mailings/delete/<int:pk>/", MailingDeleteView.as_view(), name="mailing_delete"
     ),
+    path(
+        "mailings/<int:pk>/clone/", MailingCloneView.as_view(), name="mailing_clone"
+    ),
+    path(
+        "mailings/<int:pk>/recipients/",
+        MailingRecipientsView.as_view(),
+        name="mailing_recipients",
+    ),
     path(
         "send-mailing/<int:mailing_id>/", SendMailingView.as_view(), name="send_mailing"
     ),
@@ -61,5 +87,39 @@ urlpatterns = [
         UserActionView.as_view(),
         name="user_action",
     ),
-    path("attempts/", MailListViewStatus.as_view(), name="attempts")
+    path("attempts/", MailListViewStatus.as_view(), name="attempts"),
+    path(
+        "mailings/<int:pk>/analytics/",
+        MailingAnalyticsView.as_view(),
+        name="mailing_analytics",
+    ),
+    path(
+        "api/mailings/<int:pk>/analytics/",
+        MailingAnalyticsApiView.as_view(),
+        name="mailing_analytics_api",
+    ),
+    path(
+        "mailings/<int:pk>/progress/",
+        MailingProgressView.as_view(),
+        name="mailing_progress",
+    ),
+    path(
+        "api/mailings/<int:pk>/progress/",
+        MailingProgressApiView.as_view(),
+        name="mailing_progress_api",
+    ),
+    path(
+        "api/mailings/<int:pk>/progress/stream/",
+        MailingProgressStreamView.as_view(),
+        name="mailing_progress_stream",
+    ),
+    path("api/recipients/", ResourceView.as_view(resource=RecipientResource()), name="api_recipients"),
+    path("api/messages/", ResourceView.as_view(resource=MessageResource()), name="api_messages"),
+    path("api/mailings/", ResourceView.as_view(resource=MailingResource()), name="api_mailings"),
+    path("api/attempts/", ResourceView.as_view(resource=SendAttemptResource()), name="api_attempts"),
+    path("api/jobs/", ResourceView.as_view(resource=SendJobResource()), name="api_jobs"),
+    path("api/send/", SendTriggerView.as_view(), name="api_send"),
+    # маршруты из писем продублированы в config/urls_worker.py для воркеров
+    path("t/o/<str:token>.gif", TrackOpenView.as_view(), name="track_open"),
+    path("unsubscribe/<str:token>/", UnsubscribeView.as_view(), name="unsubscribe"),
 ]
@@ -0,0 +1,153 @@
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Contact
+
+VALID = "Корректен"
+UNCHECKED = "Не проверен"
+BAD_SYNTAX = "Ошибка синтаксиса"
+ROLE_ACCOUNT = "Ролевой адрес"
+DEAD_DOMAIN = "Домен не найден"
+
+# вердикты, с которыми движок не тратит SMTP-вызов
+SKIPPED_VERDICTS = {BAD_SYNTAX, DEAD_DOMAIN}
+if getattr(settings, "MAILING_SKIP_ROLE_ACCOUNTS", True):
+    SKIPPED_VERDICTS.add(ROLE_ACCOUNT)
+
+ROLE_LOCAL_PARTS = {
+    "abuse",
+    "admin",
+    "hostmaster",
+    "mailer-daemon",
+    "no-reply",
+    "noreply",
+    "postmaster",
+    "root",
+    "webmaster",
+}
+
+VERDICT_TTL = timedelta(days=getattr(settings, "MAILING_VERDICT_TTL_DAYS", 7))
+DOMAIN_OK_TTL = 24 * 60 * 60
+DOMAIN_DEAD_TTL = 60 * 60
+
+
+def system_resolver(domain):
+    """True — домен принимает почту, False — не существует, None — не удалось выяснить."""
+    try:
+        # импорт здесь, а не в модуле: старт воркера не платит за dnspython, пока нет непроверенных адресов
+        import dns.exception
+        import dns.resolver
+    except ImportError:  # dnspython не обязателен: без него проверяем только A/AAAA
+        dns = None
+    if dns is not None:
+        try:
+            dns.resolver.resolve(domain, "MX", lifetime=3)
+            return True
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoNameservers):
+            return False
+        except dns.resolver.NoAnswer:
+            pass  # без MX почта идёт на A-запись
+        except dns.exception.DNSException:
+            return None
+    try:
+        socket.getaddrinfo(domain, 25, proto=socket.IPPROTO_TCP)
+        return True
+    except socket.gaierror as e:
+        return False if e.errno in (socket.EAI_NONAME, getattr(socket, "EAI_NODATA", None)) else None
+    except OSError:
+        return None
+
+
+def offline_resolver(domain):
+    """Резолвер для тестов и офлайн-окружений: все домены считаются живыми."""
+    return True
+
+
+def get_resolver():
+    path = getattr(settings, "MAILING_DOMAIN_RESOLVER", None)
+    return import_string(path) if path else system_resolver
+
+
+class DomainChecker:
+    """Проверка доменов с кешем: в памяти на прогон и в Redis с TTL на домен."""
+
+    def __init__(self, resolver=None):
+        self.resolver = resolver or get_resolver()
+        self.known = {}
+
+    @staticmethod
+    def cache_key(domain):
+        return f"validation:domain:{domain}"
+
+    def check_many(self, domains):
+        pending = [domain for domain in set(domains) if domain not in self.known]
+        if pending:
+            cached = cache.get_many([self.cache_key(domain) for domain in pending])
+            for domain in pending:
+                key = self.cache_key(domain)
+                if key in cached:
+                    self.known[domain] = cached[key]
+                    continue
+                alive = self.resolver(domain)
+                self.known[domain] = alive
+                if alive is not None:
+                    cache.set(key, alive, DOMAIN_OK_TTL if alive else DOMAIN_DEAD_TTL)
+        return {domain: self.known[domain] for domain in domains}
+
+
+def syntax_verdict(email):
+    try:
+        validate_email(email)
+    except ValidationError:
+        return BAD_SYNTAX
+    if email.split("@", 1)[0] in ROLE_LOCAL_PARTS:
+        return ROLE_ACCOUNT
+    return None
+
+
+def validate_contacts(contacts, checker=None):
+    """Выставляет вердикты пачке адресов и сохраняет их одним bulk_update."""
+    checker = checker or DomainChecker()
+    now = timezone.now()
+
+    verdicts = {}
+    for contact in contacts:
+        verdicts[contact] = syntax_verdict(contact.email)
+
+    domains = {contact.email.rsplit("@", 1)[-1] for contact, verdict in verdicts.items() if verdict is None}
+    alive = checker.check_many(domains)
+
+    for contact, verdict in verdicts.items():
+        if verdict is None:
+            domain_alive = alive[contact.email.rsplit("@", 1)[-1]]
+            verdict = DEAD_DOMAIN if domain_alive is False else VALID
+        contact.verdict = verdict
+        contact.verified_at = now
+
+    Contact.objects.bulk_update(list(verdicts), ["verdict", "verified_at"], batch_size=1000)
+    return contacts
+
+
+def needs_validation(contact, now=None):
+    now = now or timezone.now()
+    return contact.verified_at is None or contact.verified_at < now - VERDICT_TTL
+
+
+def split_sendable(recipients, checker=None):
+    """Перепроверяет устаревшие вердикты и делит получателей на годных и заведомо плохих."""
+    now = timezone.now()
+    stale = {recipient.contact for recipient in recipients if needs_validation(recipient.contact, now)}
+    if stale:
+        validate_contacts(list(stale), checker)
+
+    sendable, rejected = [], []
+    for recipient in recipients:
+        (rejected if recipient.contact.verdict in SKIPPED_VERDICTS else sendable).append(recipient)
+    return sendable, rejected
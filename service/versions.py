@@ -0,0 +1,30 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from users.roles import is_manager
+
+# версия данных владельца входит в ключи фрагментов шаблонов: смена версии делает их неактуальными
+GLOBAL_VERSION = "all"
+
+
+def version_key(owner_id):
+    return f"data_version:{owner_id or GLOBAL_VERSION}"
+
+
+def data_version(owner_id=None):
+    # время как значение: после вытеснения из кеша версия всё равно будет новой
+    return cache.get_or_set(version_key(owner_id), time.time_ns, None)
+
+
+def bump_data_version(*owner_ids):
+    """Новая версия для владельцев и общая (её видят менеджеры); применяется после коммита."""
+    keys = {version_key(owner_id) for owner_id in owner_ids if owner_id} | {version_key(None)}
+    transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, None))
+
+
+def version_for(user):
+    if not user.is_authenticated or is_manager(user):
+        return data_version()
+    return data_version(user.pk)
@@ -1,22 +1,54 @@
-import os
-
+import asyncio
+import base64
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Count
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, Http404, StreamingHttpResponse
+from django.utils.cache import add_never_cache_headers
+from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import redirect, get_object_or_404, render
 from django.views import generic
 from django.urls import reverse_lazy
-from django.core.mail import send_mail
-from django.utils import timezone
 
 from users.models import User
-from .models import Recipient, Message, Mailing, SendAttempt
-from .forms import RecipientForm, MessageForm, MailingForm
+from users.roles import is_manager, has_perm
+from .analytics import mailing_summary
+from .models import Contact, Recipient, Message, Mailing, SendAttempt
+from .audience import add_recipients, clone_mailing, filter_recipients, remove_recipients
+from .forms import RecipientForm, MessageForm, MailingForm, MailingRecipientsForm, changed_model_fields
+from .jobs import enqueue_mailing
+from .progress import read_progress, aread_progress
+from .tracking import read_token, record_event
+from .versions import bump_data_version, version_for
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
 from django.views.generic import ListView
 
 
+class DataVersionMixin:
+    """Версия данных владельца для ключей {% cache %} в шаблоне."""
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["data_version"] = version_for(self.request.user)
+        return context
+
+
+class OwnerDataDeleteMixin:
+    """Удаление поднимает версию данных владельца один раз, а не сигналом на каждую строку каскада."""
+
+    def form_valid(self, form):
+        owner_id = self.object.owner_id
+        response = super().form_valid(form)
+        bump_data_version(owner_id)
+        return response
+
+
 @method_decorator(cache_page(0), name="dispatch")
-class RecipientListView(LoginRequiredMixin, generic.ListView):
+class RecipientListView(LoginRequiredMixin, DataVersionMixin, generic.ListView):
     model = Recipient
     template_name = "recipient_list.html"
     context_object_name = "recipients"
@@ -31,6 +63,11 @@ class RecipientCreateView(generic.CreateView):
     template_name = "recipient_form.html"
     success_url = reverse_lazy("service:recipient_list")
 
+    def get_form_kwargs(self):
+        kwargs = super(RecipientCreateView, self).get_form_kwargs()
+        kwargs["user"] = self.request.user
+        return kwargs
+
     def form_valid(self, form):
         recipient = form.save(commit=False)
         recipient.owner = self.request.user
@@ -45,7 +82,7 @@ class RecipientUpdateView(generic.UpdateView):
     success_url = reverse_lazy("service:recipient_list")
 
 
-class RecipientDeleteView(generic.DeleteView):
+class RecipientDeleteView(OwnerDataDeleteMixin, generic.DeleteView):
     model = Recipient
     template_name = "recipient_confirm_delete.html"
     success_url = reverse_lazy("service:recipient_list")
@@ -81,24 +118,31 @@ class MessageUpdateView(generic.UpdateView):
     success_url = reverse_lazy("service:message_list")
 
 
-class MessageDeleteView(generic.DeleteView):
+class MessageDeleteView(OwnerDataDeleteMixin, generic.DeleteView):
     model = Message
     template_name = "servicemessage_confirm_delete.html"
     success_url = reverse_lazy("service:message_list")
 
 
 @method_decorator(cache_page(0), name="dispatch")
-class MailingListView(LoginRequiredMixin, generic.ListView):
+class MailingListView(LoginRequiredMixin, DataVersionMixin, generic.ListView):
     model = Mailing
     template_name = "mailing_list.html"
-    context_object_name = "service"
+    context_object_name = "mailings"
+    paginate_by = 50
 
     def get_queryset(self):
         user = self.request.user
-        if user.groups.filter(name="manager").exists():
-            return Mailing.objects.all()
+        if is_manager(user):
+            mailings = Mailing.objects.all()
         else:
-            return Mailing.objects.filter(owner=user)
+            mailings = Mailing.objects.filter(owner=user)
+        # число получателей вместо их списка: аудитория может быть в сотни тысяч адресов
+        return (
+            mailings.select_related("message", "owner")
+            .annotate(recipients_count=Count("recipients"))
+            .order_by("-id")
+        )
 
 
 class MailingCreateView(generic.CreateView):
@@ -133,102 +177,110 @@ class MailingUpdateView(generic.UpdateView):
     def form_valid(self, form):
         mailing = form.save(commit=False)
         mailing.owner = self.request.user
-        existing_end_at = self.get_object().end_at
-        new_end_at = form.cleaned_data.get("end_at")
+        fields = changed_model_fields(form) + ["owner"]
 
-        if existing_end_at != new_end_at:
+        if "end_at" in form.changed_data:
             mailing.status = "Запущена"
+            fields.append("status")
 
-        mailing.save()
-        return super().form_valid(form)
+        # только поля формы: полный save затёр бы счётчики, которые воркеры приращивают через F()
+        mailing.save(update_fields=fields)
+        form.save_m2m()
+        return HttpResponseRedirect(self.get_success_url())
 
 
-class MailingDeleteView(generic.DeleteView):
+class MailingDeleteView(OwnerDataDeleteMixin, generic.DeleteView):
     model = Mailing
     template_name = "mailing_confirm_delete.html"
     success_url = reverse_lazy("service:mailing_list")
 
 
+class MailingCloneView(LoginRequiredMixin, generic.View):
+    def post(self, request, pk):
+        # копия переносит аудиторию рассылки: чужих получателей себе не скопировать, даже менеджеру
+        mailing = get_object_or_404(Mailing.objects.filter(owner=request.user), pk=pk)
+        clone = clone_mailing(mailing, owner=request.user)
+        return redirect("service:mailing_update", pk=clone.pk)
+
+
+class MailingRecipientsView(LoginRequiredMixin, generic.FormView):
+    form_class = MailingRecipientsForm
+    template_name = "mailing_recipients.html"
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            self.mailing = get_object_or_404(
+                visible_mailings(request.user).select_related("message"), pk=kwargs["pk"]
+            )
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["mailing"] = self.mailing
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["mailing"] = self.mailing
+        context["recipients_count"] = self.mailing.recipients.count()
+        return context
+
+    def form_valid(self, form):
+        data = form.cleaned_data
+        recipients = filter_recipients(
+            self.mailing.owner_id,
+            domain=data["domain"],
+            full_name=data["full_name"],
+            comment=data["comment"],
+            source_mailing=data["source_mailing"],
+        )
+        if data["action"] == "add":
+            changed = add_recipients(self.mailing, recipients)
+        else:
+            changed = remove_recipients(self.mailing, recipients)
+        return self.render_to_response(self.get_context_data(form=form, changed=changed))
+
+
 class SendMailingView(generic.View):
     def get_object(self, mailing_id):
         return get_object_or_404(Mailing, id=mailing_id)
 
     def post(self, request, mailing_id):
         mailing = self.get_object(mailing_id)
-        recipients = mailing.recipients.all()
-
-        total_sent = 0
-        successful_sends = 0
-        failed_sends = 0
-
-        for recipient in recipients:
-            try:
-                send_mail(
-                    mailing.message.subject,
-                    mailing.message.body,
-                    os.getenv("EMAIL_HOST_USER"),
-                    [recipient.email],
-                    fail_silently=False,
-                )
-                status = "Успешно"
-                server_response = "Письмо отправлено успешно."
-                successful_sends += 1
-            except Exception as e:
-                status = "Не успешно"
-                server_response = str(e)
-                failed_sends += 1
-
-            total_sent += 1
-
-            SendAttempt.objects.create(
-                mailing=mailing,
-                status=status,
-                server_response=server_response,
-                recipient=recipient,
-                owner=request.user,
-                message=mailing.message,
-            )
+        # отправкой занимается воркер очереди, страница сразу показывает задание
+        job, _ = enqueue_mailing(mailing, owner=request.user)
 
-        mailing.total_sent += total_sent
-        mailing.successful_sends += successful_sends
-        mailing.failed_sends += failed_sends
-        mailing.save()
-
-        if mailing.status == "Создана":
-            mailing.status = "Запущена"
-            mailing.first_sent_at = timezone.now()
-            mailing.save()
+        recent_attempts = mailing.send_attempts.select_related("recipient").order_by("-id")[:20]
+        return render(
+            request,
+            "mailing_status.html",
+            {"mailing": mailing, "job": job, "recent_attempts": recent_attempts},
+        )
 
-        if mailing.end_at and timezone.now() > mailing.end_at:
-            mailing.status = "Завершена"
-            mailing.save()
 
-        return render(request, "mailing_status.html", {"service": mailing})
-
-
-class HomeView(generic.TemplateView):
+class HomeView(DataVersionMixin, generic.TemplateView):
     template_name = "home.html"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
 
-        if not user.is_authenticated or user.groups.filter(name="manager").exists():
-            context["total_mailings"] = Mailing.objects.count()
+        # счётчики передаются методами: шаблон вызывает их, только когда фрагмент не в кеше
+        if not user.is_authenticated or is_manager(user):
+            context["total_mailings"] = Mailing.objects.count
             context["active_mailings"] = Mailing.objects.filter(
                 status="Запущена"
-            ).count()
-            context["unique_recipients"] = (
-                Recipient.objects.values("email").distinct().count()
-            )
+            ).count
+            # адреса, которые хоть у кого-то в получателях; контакты без получателей ждут prune_contacts
+            context["unique_recipients"] = Contact.objects.filter(memberships__isnull=False).distinct().count
         else:
             context["successful_attempts"] = SendAttempt.objects.filter(
                 owner=user, status="Успешно"
-            ).count()
+            ).count
             context["failed_attempts"] = SendAttempt.objects.filter(
                 owner=user, status="Не успешно"
-            ).count()
-            context["sent_messages"] = SendAttempt.objects.filter(owner=user).count()
+            ).count
+            context["sent_messages"] = SendAttempt.objects.filter(owner=user).count
 
         return context
 
@@ -238,7 +290,9 @@ class UsersView(generic.TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["users"] = User.objects.exclude(groups__name="manager")
+        context["users"] = User.objects.exclude(groups__name="manager").only(
+            "id", "email", "is_blocked", "avatar_hash"
+        )
         return context
 
 
@@ -253,12 +307,132 @@ class UserActionView(generic.View):
         user.save()
         return redirect("service:list_users")
 
-class MailListViewStatus(LoginRequiredMixin,generic.ListView):
+
+def visible_mailings(user):
+    if is_manager(user) or has_perm(user, "mailing.can_view_all_mailing_lists"):
+        return Mailing.objects.all()
+    return Mailing.objects.filter(owner=user)
+
+
+class MailListViewStatus(LoginRequiredMixin, generic.ListView):
     model = Mailing
     template_name = "attempts.html"
-    context_object_name = "mailing"
+    context_object_name = "mailings"
+    paginate_by = 50
+
+    def get_queryset(self):
+        return visible_mailings(self.request.user).select_related("message").order_by("-id")
+
+
+class MailingAnalyticsView(LoginRequiredMixin, generic.ListView):
+    template_name = "mailing_analytics.html"
+    context_object_name = "buckets"
+    paginate_by = 48
 
     def get_queryset(self):
-        if self.request.user.has_perm("mailing.can_view_all_mailing_lists"):
-            return Mailing.objects.all()
-        return Mailing.objects.filter(created_by=self.request.user)
\ No newline at end of file
+        self.mailing = get_object_or_404(
+            visible_mailings(self.request.user).select_related("message"), pk=self.kwargs["pk"]
+        )
+        return self.mailing.hourly_stats.all()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["mailing"] = self.mailing
+        context["summary"] = mailing_summary(self.mailing)
+        return context
+
+
+class MailingAnalyticsApiView(LoginRequiredMixin, generic.View):
+    paginate_by = 168
+
+    def get(self, request, pk):
+        mailing = get_object_or_404(visible_mailings(request.user), pk=pk)
+        paginator = Paginator(
+            mailing.hourly_stats.values("hour", "successful", "failed"), self.paginate_by
+        )
+        try:
+            page = paginator.page(request.GET.get("page", 1))
+        except InvalidPage:
+            raise Http404("Нет такой страницы")
+
+        return JsonResponse(
+            {
+                "mailing": mailing.pk,
+                "page": page.number,
+                "num_pages": paginator.num_pages,
+                "buckets": list(page.object_list),
+                **mailing_summary(mailing),
+            }
+        )
+
+
+def _can_see_progress(user, state):
+    return state is not None and (state["owner"] == user.pk or is_manager(user))
+
+
+class MailingProgressView(LoginRequiredMixin, generic.TemplateView):
+    template_name = "mailing_progress.html"
+
+
+class MailingProgressApiView(LoginRequiredMixin, generic.View):
+    # читает только Redis: опрос страницы не нагружает базу
+    def get(self, request, pk):
+        state = read_progress(pk)
+        if not _can_see_progress(request.user, state):
+            raise Http404("Прогресс не найден")
+        return JsonResponse(state)
+
+
+class MailingProgressStreamView(generic.View):
+    """Server-sent events; под ASGI поток не занимает воркер."""
+
+    interval = 1.0
+
+    async def get(self, request, pk):
+        user = await request.auser()
+        state = await aread_progress(pk)
+        # is_manager при холодном кеше ролей ходит в БД — только из синхронного кода
+        if not user.is_authenticated or not await sync_to_async(_can_see_progress)(user, state):
+            raise Http404("Прогресс не найден")
+
+        async def events():
+            current = state
+            while True:
+                yield f"data: {json.dumps(current)}\n\n"
+                if current is None or current["finished"]:
+                    return
+                await asyncio.sleep(self.interval)
+                current = await aread_progress(pk)
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        return response
+
+
+PIXEL_GIF = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+
+
+class TrackOpenView(generic.View):
+    # подпись проверяется без БД, событие уходит в буфер — запрос не пишет в базу
+    def get(self, request, token):
+        data = read_token(token)
+        if data is not None:
+            record_event("open", *data)
+        response = HttpResponse(PIXEL_GIF, content_type="image/gif")
+        add_never_cache_headers(response)
+        return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class UnsubscribeView(generic.View):
+    def get(self, request, token):
+        if read_token(token) is None:
+            raise Http404("Ссылка недействительна")
+        return render(request, "unsubscribe.html", {"token": token})
+
+    def post(self, request, token):
+        data = read_token(token)
+        if data is None:
+            raise Http404("Ссылка недействительна")
+        record_event("unsubscribe", *data)
+        return render(request, "unsubscribe.html", {"done": True})
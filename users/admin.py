@@ -1,5 +1,18 @@
 from django.contrib import admin
 
-from .models import User
+from .models import ApiToken, User, OutgoingEmail
 
 admin.site.register(User)
+admin.site.register(OutgoingEmail)
+
+
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    list_display = ("user", "name", "created_at")
+    raw_id_fields = ("user",)
+    # ключ выдаёт команда create_api_token, в админке токен можно только отозвать
+    fields = ("user", "name", "created_at")
+    readonly_fields = ("user", "name", "created_at")
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,83 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+AVATAR_DIR = "users/avatars"
+THUMBNAIL_DIR = f"{AVATAR_DIR}/thumbs"
+THUMBNAIL_SIZES = (64, 256)
+THUMBNAIL_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+# один поток: задачи для одного и того же хеша не гоняются за exists()/save()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="avatars")
+
+
+def file_digest(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def store_avatar(file):
+    """Сохраняет оригинал под именем по хешу содержимого; одинаковые файлы хранятся один раз."""
+    digest = file_digest(file)
+    ext = os.path.splitext(file.name)[1].lower() or ".jpg"
+    name = f"{AVATAR_DIR}/{digest}{ext}"
+    if not default_storage.exists(name):
+        # storage пишет файл по chunks(), целиком в память он не читается
+        name = default_storage.save(name, file)
+    return name, digest
+
+
+def thumbnail_name(digest, size, ext):
+    return f"{THUMBNAIL_DIR}/{digest}_{size}.{ext}"
+
+
+def thumbnail_url(digest, size, ext="webp"):
+    return default_storage.url(thumbnail_name(digest, size, ext))
+
+
+def generate_thumbnails(name, digest):
+    pending = [
+        (size, ext, fmt)
+        for size in THUMBNAIL_SIZES
+        for ext, fmt in THUMBNAIL_FORMATS.items()
+        if not default_storage.exists(thumbnail_name(digest, size, ext))
+    ]
+    if not pending:
+        return
+
+    with default_storage.open(name, "rb") as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image = image.convert("RGB")
+
+    for size, ext, fmt in pending:
+        thumb = image.copy()
+        thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        thumb.save(buffer, fmt, quality=85)
+        default_storage.save(thumbnail_name(digest, size, ext), ContentFile(buffer.getvalue()))
+
+
+def _generate_safely(name, digest):
+    try:
+        generate_thumbnails(name, digest)
+    except Exception:
+        logger.exception("Не удалось построить миниатюры аватара %s", name)
+
+
+def schedule_thumbnails(user):
+    if not user.avatar_hash:
+        return
+    name, digest = user.avatar.name, user.avatar_hash
+    transaction.on_commit(lambda: _executor.submit(_generate_safely, name, digest))
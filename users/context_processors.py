@@ -0,0 +1,5 @@
+from users.roles import is_manager
+
+
+def roles(request):
+    return {"is_manager": is_manager(getattr(request, "user", None))}
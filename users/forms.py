@@ -1,5 +1,9 @@
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import UserCreationForm, PasswordResetForm
+from django.core.files.uploadedfile import UploadedFile
+from django.template import loader
+from users.avatars import store_avatar, schedule_thumbnails
 from users.models import User
+from users.outbox import enqueue_email
 from django import forms
 
 
@@ -13,3 +17,35 @@ class UserProfileForm(forms.ModelForm):
     class Meta:
         model = User
         fields = ["username", "email", "phone", "avatar", "country"]
+
+    def save(self, commit=True):
+        upload = self.cleaned_data.get("avatar")
+        if isinstance(upload, UploadedFile):
+            # оригинал кладём под хешем сами, чтобы одинаковые загрузки не дублировались
+            self.instance.avatar, self.instance.avatar_hash = store_avatar(upload)
+        elif upload is False:
+            self.instance.avatar_hash = ""
+
+        user = super().save(commit)
+        if commit and isinstance(upload, UploadedFile):
+            schedule_thumbnails(user)
+        return user
+
+
+class OutboxPasswordResetForm(PasswordResetForm):
+    def send_mail(
+        self,
+        subject_template_name,
+        email_template_name,
+        context,
+        from_email,
+        to_email,
+        html_email_template_name=None,
+    ):
+        subject = loader.render_to_string(subject_template_name, context)
+        subject = "".join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_body = ""
+        if html_email_template_name is not None:
+            html_body = loader.render_to_string(html_email_template_name, context)
+        enqueue_email(subject, body, [to_email], html_body=html_body, from_email=from_email)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from users.avatars import store_avatar, generate_thumbnails
+from users.backends import invalidate_users
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Move existing avatars to content-hashed names and build thumbnails"
+
+    def handle(self, *args, **kwargs):
+        users = User.objects.exclude(avatar="").exclude(avatar__isnull=True).only("id", "avatar", "avatar_hash")
+        processed = 0
+
+        for user in users.iterator():
+            if not user.avatar_hash:
+                with user.avatar.open("rb") as file:
+                    name, digest = store_avatar(file)
+                User.objects.filter(pk=user.pk).update(avatar=name, avatar_hash=digest)
+                # update() не шлёт post_save: закешированный для сессий пользователь сбрасывается вручную
+                invalidate_users([user.pk])
+                user.avatar.name, user.avatar_hash = name, digest
+
+            generate_thumbnails(user.avatar.name, user.avatar_hash)
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Обработано аватаров: {processed}"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import ApiToken, User
+
+
+class Command(BaseCommand):
+    help = "Issue an API token for a user and print its key once"
+
+    def add_arguments(self, parser):
+        parser.add_argument("email")
+        parser.add_argument("--name", default="")
+
+    def handle(self, *args, **kwargs):
+        try:
+            user = User.objects.get(email=kwargs["email"])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {kwargs['email']} не найден")
+        token, key = ApiToken.issue(user, kwargs["name"])
+        self.stdout.write(f"Токен {token.pk} для {user}: {key}")
+        self.stdout.write("Сохраните ключ: повторно он показан не будет.")
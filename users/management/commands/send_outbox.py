@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued transactional emails from the outbox"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true")
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--interval", type=float, default=2.0)
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs["batch_size"]
+        interval = kwargs["interval"]
+
+        while True:
+            try:
+                sent = drain_outbox(batch_size=batch_size)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"Ошибка отправки outbox: {e}"))
+                sent = 0
+
+            if sent:
+                self.stdout.write(f"Обработано писем: {sent}")
+            if kwargs["once"] and not sent:
+                return
+            if not sent:
+                time.sleep(interval)
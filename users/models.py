@@ -1,5 +1,10 @@
+import hashlib
+import secrets
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -15,6 +20,7 @@ class User(AbstractUser):
     avatar = models.ImageField(
         upload_to="users/avatars/", verbose_name="Аватар", null=True, blank=True
     )
+    avatar_hash = models.CharField(max_length=64, blank=True, db_index=True)
     country = models.CharField(
         max_length=100, verbose_name="Страна", blank=True, null=True
     )
@@ -29,3 +35,59 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.email
+
+
+class OutgoingEmail(models.Model):
+    STATUS_CHOICES = [
+        ("Ожидает", "Ожидает"),
+        ("Отправлено", "Отправлено"),
+        ("Ошибка", "Ошибка"),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Ожидает")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # письмо берётся не раньше этого времени: пауза между попытками и аренда на время отправки
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Исходящее письмо"
+        verbose_name_plural = "Исходящие письма"
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+
+def token_digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class ApiToken(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="api_tokens"
+    )
+    name = models.CharField(max_length=100, blank=True)
+    # хранится только хеш ключа: из дампа базы токен не восстановить
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "API-токен"
+        verbose_name_plural = "API-токены"
+
+    def __str__(self):
+        return f"{self.user} - {self.name}"
+
+    @classmethod
+    def issue(cls, user, name=""):
+        """Создаёт токен; ключ возвращается один раз и больше нигде не виден."""
+        key = secrets.token_urlsafe(32)
+        return cls.objects.create(user=user, name=name, key_hash=token_digest(key)), key
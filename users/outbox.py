@@ -0,0 +1,105 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from users.models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 60
+RETRY_MAX_DELAY = 60 * 60
+# сколько письмо считается занятым отправителем, который его забрал
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def enqueue_email(subject, body, to, html_body="", from_email=None):
+    """Кладёт письмо в outbox; вызывать внутри той же транзакции, что и запись данных."""
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body or "",
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or "",
+        to=list(to),
+    )
+
+
+def _build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject,
+        email.body,
+        email.from_email or None,
+        email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1)))
+
+
+def drain_outbox(batch_size=50, max_attempts=MAX_ATTEMPTS):
+    """Отправляет пачку ожидающих писем, возвращает число обработанных.
+
+    Письма сначала забираются короткой транзакцией: попытка засчитывается, а next_attempt_at
+    сдвигается на время аренды. SMTP идёт уже без блокировок; если отправитель упадёт,
+    письма вернутся в очередь, когда аренда истечёт.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked позволяет запускать несколько отправителей параллельно
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status="Ожидает", next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        if not emails:
+            return 0
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            attempts=F("attempts") + 1, next_attempt_at=now + CLAIM_TIMEOUT
+        )
+
+    for email in emails:
+        email.attempts += 1
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # сервер недоступен: вся пачка ждёт следующей попытки
+        for email in emails:
+            _failed(email, e, max_attempts)
+    else:
+        try:
+            for email in emails:
+                try:
+                    _build_message(email, connection).send()
+                    email.status = "Отправлено"
+                    email.sent_at = timezone.now()
+                    email.last_error = ""
+                except Exception as e:
+                    _failed(email, e, max_attempts)
+        finally:
+            connection.close()
+
+    OutgoingEmail.objects.bulk_update(
+        emails, ["status", "attempts", "last_error", "sent_at", "next_attempt_at"]
+    )
+    return len(emails)
+
+
+def _failed(email, error, max_attempts):
+    logger.warning("Не удалось отправить письмо %s: %s", email.pk, error)
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = "Ошибка"
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+
+MANAGER_GROUP = "manager"
+
+ROLES_CACHE_TIMEOUT = 60 * 60
+
+_EMPTY_ROLES = {"groups": frozenset(), "permissions": frozenset()}
+
+
+def roles_cache_key(user_id):
+    return f"users:roles:{user_id}"
+
+
+def invalidate_roles(user_ids):
+    cache.delete_many([roles_cache_key(user_id) for user_id in user_ids])
+
+
+def get_roles(user):
+    """Группы и права пользователя: один раз за запрос, между запросами — из кеша."""
+    if user is None or not user.is_authenticated:
+        return _EMPTY_ROLES
+
+    roles = getattr(user, "_roles_cache", None)
+    if roles is not None:
+        return roles
+
+    key = roles_cache_key(user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        roles = {
+            "groups": frozenset(user.groups.values_list("name", flat=True)),
+            "permissions": frozenset(user.get_all_permissions()),
+        }
+        cache.set(key, roles, ROLES_CACHE_TIMEOUT)
+
+    # request.user живёт весь запрос, поэтому повторные вызовы не ходят даже в кеш
+    user._roles_cache = roles
+    return roles
+
+
+def in_group(user, name):
+    return name in get_roles(user)["groups"]
+
+
+def is_manager(user):
+    return in_group(user, MANAGER_GROUP)
+
+
+def has_perm(user, perm):
+    if user is None or not user.is_active:
+        return False
+    if user.is_superuser:
+        return True
+    return perm in get_roles(user)["permissions"]
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.backends import invalidate_users
+from users.models import User
+from users.roles import invalidate_roles
+
+_CHANGE_ACTIONS = {"post_add", "post_remove", "post_clear", "pre_clear"}
+
+
+def _affected_user_ids(instance, reverse, pk_set):
+    if not reverse:
+        return [instance.pk]
+    if pk_set:
+        return list(pk_set)
+    # clear() со стороны группы/права: pk_set пуст, берём всех участников
+    return list(instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in _CHANGE_ACTIONS:
+        invalidate_roles(_affected_user_ids(instance, reverse, pk_set))
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in _CHANGE_ACTIONS:
+        invalidate_roles(_affected_user_ids(instance, reverse, pk_set))
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in _CHANGE_ACTIONS:
+        return
+    if reverse:
+        # instance — Permission, pk_set — группы
+        group_ids = pk_set or instance.group_set.values_list("pk", flat=True)
+        user_ids = User.objects.filter(groups__in=group_ids).values_list("pk", flat=True)
+    else:
+        user_ids = instance.user_set.values_list("pk", flat=True)
+    invalidate_roles(set(user_ids))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    # переименование группы меняет имена в закешированных ролях участников
+    if not created:
+        invalidate_roles(list(instance.user_set.values_list("pk", flat=True)))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # после удаления участников уже не найти; сбрасываем после коммита, чтобы не закешировать старые роли
+    user_ids = list(instance.user_set.values_list("pk", flat=True))
+    transaction.on_commit(lambda: invalidate_roles(user_ids))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # is_superuser / is_active влияют на набор прав
+    if not created:
+        # профиль, блокировка, смена пароля: закешированный для сессий пользователь устарел;
+        # сбрасываем после коммита, иначе параллельный запрос закеширует ещё старую строку
+        user_ids = [instance.pk]
+        transaction.on_commit(lambda: invalidate_roles(user_ids))
+        transaction.on_commit(lambda: invalidate_users(user_ids))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_ids = [instance.pk]
+    transaction.on_commit(lambda: invalidate_users(user_ids))
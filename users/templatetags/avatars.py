@@ -0,0 +1,20 @@
+from django import template
+from django.utils.html import format_html
+
+from users.avatars import thumbnail_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(user, size=64):
+    if not user.avatar_hash:
+        return ""
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp">'
+        '<img src="{}" width="{}" height="{}" loading="lazy" alt=""></picture>',
+        thumbnail_url(user.avatar_hash, size, "webp"),
+        thumbnail_url(user.avatar_hash, size, "jpg"),
+        size,
+        size,
+    )
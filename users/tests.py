@@ -0,0 +1,122 @@
+import re
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .backends import CachedModelBackend, user_cache_key
+from .models import OutgoingEmail, User
+from .outbox import drain_outbox
+from .roles import MANAGER_GROUP, get_roles, is_manager
+
+
+class RolesCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name=MANAGER_GROUP)
+        self.user = User.objects.create_user(email="user@example.com", username="user", password="secret")
+
+    def fresh_user(self):
+        # request.user на каждый запрос новый: роли берутся из кеша, а не с объекта
+        return User.objects.get(pk=self.user.pk)
+
+    def test_adding_to_group_invalidates_roles(self):
+        self.assertFalse(is_manager(self.fresh_user()))
+        self.user.groups.add(self.group)
+        self.assertTrue(is_manager(self.fresh_user()))
+
+    def test_group_delete_invalidates_member_roles(self):
+        self.user.groups.add(self.group)
+        self.assertTrue(is_manager(self.fresh_user()))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.delete()
+        self.assertFalse(is_manager(self.fresh_user()))
+
+    def test_group_rename_invalidates_member_roles(self):
+        self.user.groups.add(self.group)
+        self.assertEqual(get_roles(self.fresh_user())["groups"], {MANAGER_GROUP})
+        self.group.name = "support"
+        self.group.save()
+        self.assertEqual(get_roles(self.fresh_user())["groups"], {"support"})
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="user@example.com", username="user", password="secret")
+        CachedModelBackend().get_user(self.user.pk)
+
+    def test_user_save_invalidates_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = "Иван"
+            self.user.save()
+            # до коммита другой запрос ещё видит старую строку — кеш не трогаем
+            self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(CachedModelBackend().get_user(self.user.pk).first_name, "Иван")
+
+    def test_avatar_command_invalidates_cached_user(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            name = default_storage.save("users/avatars/old.jpg", ContentFile(b"avatar", name="old.jpg"))
+            User.objects.filter(pk=self.user.pk).update(avatar=name)
+            with mock.patch("users.management.commands.build_avatar_thumbnails.generate_thumbnails"):
+                call_command("build_avatar_thumbnails", stdout=mock.Mock())
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertTrue(CachedModelBackend().get_user(self.user.pk).avatar_hash)
+
+
+class OutboxTests(TestCase):
+    def test_password_reset_is_sent_through_outbox(self):
+        user = User.objects.create_user(email="user@example.com", username="user", password="old-secret")
+        response = self.client.post(reverse("users:password_reset"), {"email": user.email})
+        self.assertRedirects(response, reverse("users:password_reset_done"))
+        # запрос только кладёт письмо в outbox, отправляет воркер
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(drain_outbox(), 1)
+        self.assertEqual(OutgoingEmail.objects.get().status, "Отправлено")
+        self.assertEqual(mail.outbox[0].to, [user.email])
+
+        link = re.search(r"https?://[^/\s]+(/users/reset/\S+)", mail.outbox[0].body).group(1)
+        response = self.client.get(link, follow=True)
+        form_url = response.redirect_chain[-1][0]
+        response = self.client.post(form_url, {"new_password1": "n3w-Secret!", "new_password2": "n3w-Secret!"})
+        self.assertRedirects(response, reverse("users:password_reset_complete"))
+        user.refresh_from_db()
+        self.assertTrue(user.check_password("n3w-Secret!"))
+
+    def test_registration_enqueues_activation_email(self):
+        response = self.client.post(
+            reverse("users:register"),
+            {"email": "new@example.com", "password1": "n3w-Secret!", "password2": "n3w-Secret!"},
+        )
+        self.assertRedirects(response, reverse("users:login"), fetch_redirect_response=False)
+        self.assertEqual(list(OutgoingEmail.objects.values_list("to", flat=True)), [["new@example.com"]])
+
+    def test_failed_send_backs_off_then_gives_up(self):
+        email = OutgoingEmail.objects.create(subject="Тема", body="Текст", to=["user@example.com"])
+        connection = mock.Mock()
+        connection.open.side_effect = OSError("Connection refused")
+
+        patched = mock.patch("users.outbox.get_connection", return_value=connection)
+        with patched, self.assertLogs("users.outbox", "WARNING"):
+            started_at = timezone.now()
+            self.assertEqual(drain_outbox(max_attempts=2), 1)
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ("Ожидает", 1))
+            self.assertGreaterEqual(email.next_attempt_at, started_at + timedelta(seconds=60))
+            # до конца паузы письмо не берётся
+            self.assertEqual(drain_outbox(max_attempts=2), 0)
+
+            OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(drain_outbox(max_attempts=2), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ("Ошибка", 2, "Connection refused"))
@@ -1,9 +1,10 @@
-from django.urls import path
+from django.urls import path, reverse_lazy
 from django.contrib.auth.views import LogoutView
 from users.views import UserCreateView, UserProfileUpdateView
 from .views import CustomLoginView, ActivateView
 from django.contrib.auth import views as auth_views
 from .apps import UsersConfig
+from .forms import OutboxPasswordResetForm
 
 app_name = UsersConfig.name
 
@@ -15,27 +16,35 @@ urlpatterns = [
     path("profile/", UserProfileUpdateView.as_view(), name="profile_form"),
     path(
         "password_reset/",
-        auth_views.PasswordResetView.as_view(template_name="users/password_reset.html"),
+        auth_views.PasswordResetView.as_view(
+            template_name="password_reset.html",
+            # стандартные шаблоны письма ссылаются на имена без пространства users:
+            email_template_name="password_reset_email.html",
+            subject_template_name="password_reset_subject.txt",
+            form_class=OutboxPasswordResetForm,
+            success_url=reverse_lazy("users:password_reset_done"),
+        ),
         name="password_reset",
     ),
     path(
         "password_reset/done/",
         auth_views.PasswordResetDoneView.as_view(
-            template_name="users/password_reset_done.html"
+            template_name="password_reset_done.html"
         ),
         name="password_reset_done",
     ),
     path(
         "reset/<uidb64>/<token>/",
         auth_views.PasswordResetConfirmView.as_view(
-            template_name="users/password_reset_confirm.html"
+            template_name="password_reset_confirm.html",
+            success_url=reverse_lazy("users:password_reset_complete"),
         ),
         name="password_reset_confirm",
     ),
     path(
         "reset/done/",
         auth_views.PasswordResetCompleteView.as_view(
-            template_name="users/password_reset_complete.html"
+            template_name="password_reset_complete.html"
         ),
         name="password_reset_complete",
     ),
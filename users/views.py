@@ -8,28 +8,31 @@ from django.views.generic import UpdateView
 from django.contrib.sites.shortcuts import get_current_site
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
-from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_decode
 from django.shortcuts import render
 
 from users.forms import UserRegistrationForm, UserProfileForm
 from users.models import User
+from users.outbox import enqueue_email
 
 
 class UserCreateView(CreateView):
     model = User
     form_class = UserRegistrationForm
     template_name = "register_form.html"
-    success_url = reverse_lazy("login")
+    success_url = reverse_lazy("users:login")
 
     def form_valid(self, form):
-        user = form.save(commit=False)
-        user.is_active = False
-        user.save()
+        # письмо попадает в outbox в той же транзакции, что и пользователь
+        with transaction.atomic():
+            user = form.save(commit=False)
+            user.is_active = False
+            user.save()
 
-        token = default_token_generator.make_token(user)
-        self.send_confirmation_email(user, token)
+            token = default_token_generator.make_token(user)
+            self.send_confirmation_email(user, token)
 
         messages.success(
             self.request,
@@ -45,7 +48,7 @@ class UserCreateView(CreateView):
 
         activation_link = (
             f"http://{current_site.domain}"
-            f"{reverse('activate', kwargs={'uidb64': uid, 'token': token})}"
+            f"{reverse('users:activate', kwargs={'uidb64': uid, 'token': token})}"
         )
 
         message = render_to_string(
@@ -55,8 +58,7 @@ class UserCreateView(CreateView):
                 "activation_link": activation_link,
             },
         )
-        email = EmailMultiAlternatives(mail_subject, message, to=[user.email])
-        email.send()
+        enqueue_email(mail_subject, message, [user.email])
 
 
 class ActivateView(View):
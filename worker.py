@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+"""Entry point for send workers: lean settings, no admin or URLconf loading.
+
+Usage: python worker.py [command] [options]; the command defaults to run_send_worker.
+"""
+import os
+import sys
+
+
+def main():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings_worker")
+    from django.core.management import execute_from_command_line
+
+    argv = sys.argv[1:]
+    if not argv or argv[0].startswith("-"):
+        argv = ["run_send_worker", *argv]
+    execute_from_command_line([sys.argv[0], *argv])
+
+
+if __name__ == "__main__":
+    main()